@@ -1,6 +1,7 @@
 from fastapi import APIRouter
-from app.api.endpoints import repository
+from app.api.endpoints import metrics, repository
 
 api_router = APIRouter()
 api_router.include_router(
     repository.router, prefix='/repo', tags=['repository'])
+api_router.include_router(metrics.router, tags=['metrics'])
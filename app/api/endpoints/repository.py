@@ -1,98 +1,334 @@
-import os
-from fastapi import APIRouter, HTTPException
-from app.services.repo_utils import clone_repo, clean_up_repo
-from app.schema.api_schema import ParseRequestModel, APISpecification
-from app.services.repo_utils import clone_repo, clean_up_repo
-from app.parsers.Parser import Parser
-from app.database.database import api_collection
-from app.test_case_gen import generate_test_cases_for_endpoint
-from typing import Dict, List, Any
-import traceback
+import json
+import logging
+import base64
+import hashlib
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.schema.api_schema import (
+    ParseRequestModel, LocalParseRequestModel, APISpecification, JobSubmittedModel,
+    TestRunRequestModel, TestRunSubmittedModel
+)
+from app.services.pipeline import PipelineError, run_source_pipeline, stream_parse_pipeline
+from app.services.ingest import IngestError, extracted_archive, local_source
+from app.services.coalescer import get_parse_coalescer
+from app.services.jobs import get_job_manager
+from app.services.repo_utils import check_repo_url
+from app.services.spec_table import SpecTable
+from app.services.spec_store import get_spec_store
+from app.services.test_runner import get_test_run_manager
+from config import settings
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+LAYOUT_QUERY = Query("expanded", pattern="^(expanded|normalized)$")
+
+
+def _validate_parse_request(request_data: ParseRequestModel) -> None:
+    # Ensure necessary data is provided
+    if not request_data.repo_url or not request_data.framework_type:
+        raise HTTPException(
+            status_code=400,
+            detail="Missing repo_url or framework_type"
+        )
+    # before anything, the coalescer included, hands the URL to git
+    try:
+        check_repo_url(request_data.repo_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
-async def find_routes_directory(repo_path: str) -> str:
+def _layout_specs(api_specs: List[Dict[str, Any]], layout: str,
+                  skipped_files: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Find the directory containing route definitions in the repository
+    Specs either expanded, one self-contained object per route, or normalized
+    into shared file/middleware/code tables that routes refer to by index,
+    along with the files that were not parsed
     """
-    common_route_paths = [
-        'routes',
-        'api/routes',
-        'src/routes',
-        'app/routes',
-        'api',
-        'endpoints',
-        'app/api',
-        'app/endpoints'
-    ]
+    if layout == "normalized":
+        specs = SpecTable.from_specs(api_specs).to_payload()
+    else:
+        specs = {"api_specs": api_specs}
+    return {**specs, "skipped_files": skipped_files}
 
-    for route_path in common_route_paths:
-        full_path = os.path.join(repo_path, route_path)
-        if os.path.exists(full_path):
-            return full_path
 
-    return repo_path
+def _pipeline_http_error(e: PipelineError, source: str) -> HTTPException:
+    if isinstance(e.error, IngestError):
+        return HTTPException(status_code=e.error.status_code, detail=str(e))
+    if e.stage == 'clone':
+        logger.error("Error cloning repository %s:\n%s", source, e.trace)
+        detail = f"Error cloning repository: {str(e)}"
+    else:
+        logger.error("Error processing repository %s:\n%s", source, e.trace)
+        detail = f"Error processing repository: {str(e)}"
+    return HTTPException(status_code=500, detail=detail)
 
 
 @router.post("/parse")
-async def process_repo_endpoint(request_data: ParseRequestModel):
-    repo_url = request_data.repo_url
-    framework_type = request_data.framework_type
+async def process_repo_endpoint(
+    request_data: ParseRequestModel,
+    layout: str = LAYOUT_QUERY,
+):
+    _validate_parse_request(request_data)
 
-    # Ensure necessary data is provided
-    if not repo_url or not framework_type:
-        raise HTTPException(
-            status_code=400,
-            detail="Missing repo_url or framework_type"
+    try:
+        # concurrent requests for the same repository and commit share a run
+        result = await get_parse_coalescer().run(
+            request_data.repo_url, request_data.framework_type
+        )
+        return _layout_specs(result["api_specs"], layout, result["skipped_files"])
+
+    except PipelineError as e:
+        raise _pipeline_http_error(e, request_data.repo_url)
+
+
+@router.post("/parse/archive")
+async def process_archive_endpoint(
+    framework_type: str = Form(...),
+    archive: UploadFile = File(...),
+    name: Optional[str] = Form(None, description="names the source in stored specs"),
+    layout: str = LAYOUT_QUERY,
+):
+    """
+    Same pipeline as /parse over an uploaded tar or zip archive instead of a
+    clone. Only the files the parser reads are extracted.
+    """
+    if archive.size is not None and archive.size > settings.ARCHIVE_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Archive is too large")
+    source = f"archive:{name or archive.filename or 'upload'}"
+
+    try:
+        result = await run_source_pipeline(
+            source, framework_type, extracted_archive(archive.file, framework_type)
         )
+        return _layout_specs(result["api_specs"], layout, result["skipped_files"])
+    except PipelineError as e:
+        raise _pipeline_http_error(e, source)
+
 
+@router.post("/parse/local")
+async def process_local_path_endpoint(
+    request_data: LocalParseRequestModel,
+    layout: str = LAYOUT_QUERY,
+):
+    """
+    Same pipeline as /parse over a source tree already on the server, which
+    is parsed in place
+    """
+    source = f"path:{request_data.path}"
     try:
-        # Clone the repository temporarily
-        repo_path = await clone_repo(repo_url)
-        print(f"Repository cloned at: {repo_path}")
-
-        try:
-            # Find the routes directory
-            routes_path = await find_routes_directory(repo_path)
-            print(f"Routes directory identified at: {routes_path}")
-
-            # Initialize the API Parser
-            parser = Parser(
-                repo_path=repo_path, framework_type=framework_type, routes_path=routes_path
-            )
-
-            # Extract API specifications
-            api_specs = parser.parse()
-
-            # Generate test cases for each endpoint
-            for endpoint_spec in api_specs:
-                test_cases = generate_test_cases_for_endpoint(endpoint_spec)
-                endpoint_spec['test_cases'] = test_cases
-
-            # Optionally store in database
-            # if api_collection is not None:
-            #     await api_collection.insert_many(api_specs)
-
-            return {"api_specs": api_specs}
-
-        except Exception as e:
-            error_trace = traceback.format_exc()
-            print(f"Error processing repository: {error_trace}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error processing repository: {str(e)}"
-            )
-
-        finally:
-            pass
-            # Clean up cloned repository
-            # await clean_up_repo(repo_path)
-
-    except Exception as e:
-        error_trace = traceback.format_exc()
-        print(f"Error cloning repository: {error_trace}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error cloning repository: {str(e)}"
+        result = await run_source_pipeline(
+            source, request_data.framework_type,
+            local_source(request_data.path, request_data.framework_type)
+        )
+        return _layout_specs(result["api_specs"], layout, result["skipped_files"])
+    except PipelineError as e:
+        raise _pipeline_http_error(e, source)
+
+
+@router.post("/parse/stream")
+async def stream_repo_endpoint(
+    request_data: ParseRequestModel,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+):
+    """
+    Same pipeline as /parse, but each spec is sent as soon as it is parsed
+    and again when its test cases are ready, as NDJSON or server-sent events
+    """
+    _validate_parse_request(request_data)
+
+    async def events():
+        async for event, data in stream_parse_pipeline(
+            request_data.repo_url, request_data.framework_type
+        ):
+            payload = json.dumps(data, default=str)
+            if format == "sse":
+                yield f"event: {event}\ndata: {payload}\n\n"
+            else:
+                yield json.dumps({"event": event, **data}, default=str) + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+
+@router.post("/jobs", status_code=202, response_model=JobSubmittedModel)
+async def submit_parse_job(request_data: ParseRequestModel):
+    """
+    Queue the parse pipeline in the background and return the job id at once
+    """
+    _validate_parse_request(request_data)
+
+    job_id = await get_job_manager().submit(
+        request_data.repo_url, request_data.framework_type
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_parse_job(job_id: str):
+    """
+    Status and per-stage progress of a parse job
+    """
+    job = await get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job["job_id"] = job.pop("_id")
+    return job
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_parse_job_result(job_id: str, layout: str = LAYOUT_QUERY):
+    """
+    Final result of a finished job, or the partial result of a running one
+    (specs are available once parsing is done, before test cases are)
+    """
+    job_manager = get_job_manager()
+    job = await job_manager.get(job_id, include_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    table = job_manager.result_table(job)
+    specs = table.to_payload() if layout == "normalized" else {"api_specs": table.expanded()}
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "stage": job["stage"],
+        "partial": job["status"] != "succeeded",
+        **specs,
+        "skipped_files": (job.get("result") or {}).get("skipped_files", []),
+    }
+
+
+# fields of a stored spec a read can project
+STORED_SPEC_FIELDS = set(APISpecification.model_fields) | {
+    'repo_url', 'commit', 'created_at', 'updated_at',
+}
+
+
+def _field_list(value: Optional[str]) -> List[str]:
+    fields = [field.strip() for field in (value or '').split(',') if field.strip()]
+    unknown = sorted(set(fields) - STORED_SPEC_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _spec_projection(fields: Optional[str], exclude: Optional[str]) -> Optional[Dict[str, int]]:
+    include, omit = _field_list(fields), _field_list(exclude)
+    if include and omit:
+        raise HTTPException(status_code=400, detail="Use either fields or exclude, not both")
+    if include:
+        # the endpoint is needed for the next page cursor
+        return {field: 1 for field in include + ['endpoint']}
+    if omit:
+        if 'endpoint' in omit:
+            raise HTTPException(status_code=400, detail="endpoint cannot be excluded")
+        return {field: 0 for field in omit}
+    return None
+
+
+def _encode_cursor(spec: Dict[str, Any]) -> str:
+    raw = json.dumps([spec['endpoint'], spec['_id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        endpoint, spec_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(endpoint), str(spec_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+@router.get("/specs")
+async def list_specs(
+    request: Request,
+    repo_url: str,
+    commit: Optional[str] = None,
+    method: Optional[str] = None,
+    path_prefix: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="comma-separated fields to return"),
+    exclude: Optional[str] = Query(None, description="comma-separated fields to leave out"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """
+    Stored specs of a repository at a commit (the most recently written one
+    by default), a page at a time in endpoint order. Pass next_cursor back
+    as cursor for the following page. Responses carry an ETag that changes
+    whenever the commit's specs are written, so polls with If-None-Match
+    get a 304 until then.
+    """
+    spec_store = get_spec_store()
+    projection = _spec_projection(fields, exclude)
+    after = _decode_cursor(cursor) if cursor else None
+
+    commit = commit or await spec_store.latest_commit(repo_url)
+    last_updated = await spec_store.last_updated(repo_url, commit) if commit else None
+    if last_updated is None:
+        raise HTTPException(status_code=404, detail="No specs stored for this repository")
+
+    version = json.dumps([repo_url, commit, last_updated.isoformat(), method, path_prefix,
+                          fields, exclude, limit, cursor])
+    etag = '"' + hashlib.sha256(version.encode('utf-8')).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    specs = await spec_store.find_page(
+        repo_url, commit, limit, after=after, method=method,
+        path_prefix=path_prefix, projection=projection,
+    )
+    next_cursor = _encode_cursor(specs[-1]) if len(specs) == limit else None
+    for spec in specs:
+        spec["spec_id"] = spec.pop("_id")
+    return JSONResponse(jsonable_encoder({
+        "repo_url": repo_url,
+        "commit": commit,
+        "specs": specs,
+        "next_cursor": next_cursor,
+    }), headers=headers)
+
+
+@router.post("/test-runs", status_code=202, response_model=TestRunSubmittedModel)
+async def submit_test_run(request_data: TestRunRequestModel):
+    """
+    Send the generated test cases of a repository's stored specs to the
+    service at base_url in the background, and return the run id at once
+    """
+    try:
+        run_id = await get_test_run_manager().submit(
+            request_data.repo_url, request_data.base_url, commit=request_data.commit,
+            concurrency=request_data.concurrency, rate_limit=request_data.rate_limit,
+            timeout=request_data.timeout,
         )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"run_id": run_id, "status": "running"}
+
+
+@router.get("/test-runs/{run_id}")
+async def get_test_run(run_id: str, include_results: bool = False):
+    """
+    Status and pass/fail and latency summary of a test run, with the
+    per-case results on request
+    """
+    run = await get_test_run_manager().get(run_id, include_results=include_results)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    run["run_id"] = run.pop("_id")
+    run.pop("kind", None)
+    return jsonable_encoder(run)
@@ -1,12 +1,19 @@
 import motor.motor_asyncio
 from bson.objectid import ObjectId
 from config import settings
+from app.database.memory import InMemoryClient
 
 MONGO_URL = settings.MONGO_URI
 
-# establish a connection with mongodb
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL)
+# establish a connection with mongodb, or use the in-process stand-in
+if MONGO_URL.startswith('memory://'):
+    client = InMemoryClient()
+else:
+    client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL)
 
 database = client['orbit_api']
 api_collection = database['api_specs']
 report_collection = database['report']
+test_case_cache_collection = database['test_case_cache']
+spec_snapshot_collection = database['spec_snapshots']
+job_collection = database['jobs']
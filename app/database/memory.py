@@ -0,0 +1,370 @@
+"""
+In-process stand-in for the subset of the motor API the app uses. Selected
+with MONGO_URI=memory:// for local runs, tests and benchmarks; data lives only
+as long as the process.
+"""
+import copy
+import itertools
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from bson.objectid import ObjectId
+
+
+def _get_field(document: Dict[str, Any], key: str) -> Tuple[bool, Any]:
+    value: Any = document
+    for part in key.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        else:
+            return False, None
+    return True, value
+
+
+def _compare(value: Any, other: Any, op) -> bool:
+    try:
+        return value is not None and other is not None and op(value, other)
+    except TypeError:
+        return False
+
+
+def _matches_condition(found: bool, value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+        for op, operand in condition.items():
+            if op == '$eq' and not (found and value == operand):
+                return False
+            if op == '$ne' and found and value == operand:
+                return False
+            if op == '$gt' and not _compare(value, operand, lambda a, b: a > b):
+                return False
+            if op == '$gte' and not _compare(value, operand, lambda a, b: a >= b):
+                return False
+            if op == '$lt' and not _compare(value, operand, lambda a, b: a < b):
+                return False
+            if op == '$lte' and not _compare(value, operand, lambda a, b: a <= b):
+                return False
+            if op == '$in' and not (found and (value in operand or (
+                    isinstance(value, list) and any(v in operand for v in value)))):
+                return False
+            if op == '$nin' and found and value in operand:
+                return False
+            if op == '$exists' and found != bool(operand):
+                return False
+            if op == '$regex' and not (found and isinstance(value, str)
+                                       and re.search(operand, value)):
+                return False
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return found and value == condition
+
+
+def matches(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        else:
+            found, value = _get_field(document, key)
+            if not _matches_condition(found, value, condition):
+                return False
+    return True
+
+
+def _set_field(document: Dict[str, Any], key: str, value: Any) -> None:
+    parts = key.split('.')
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def _unset_field(document: Dict[str, Any], key: str) -> None:
+    parts = key.split('.')
+    for part in parts[:-1]:
+        document = document.get(part, {})
+    document.pop(parts[-1], None)
+
+
+def apply_update(document: Dict[str, Any], update: Dict[str, Any], inserting: bool) -> None:
+    for op, fields in update.items():
+        for key, value in fields.items():
+            if op == '$set':
+                _set_field(document, key, copy.deepcopy(value))
+            elif op == '$setOnInsert':
+                if inserting:
+                    _set_field(document, key, copy.deepcopy(value))
+            elif op == '$unset':
+                _unset_field(document, key)
+            elif op == '$inc':
+                found, current = _get_field(document, key)
+                _set_field(document, key, (current if found else 0) + value)
+            elif op == '$push':
+                found, current = _get_field(document, key)
+                items = list(current) if found else []
+                if isinstance(value, dict) and '$each' in value:
+                    items += copy.deepcopy(value['$each'])
+                else:
+                    items.append(copy.deepcopy(value))
+                _set_field(document, key, items)
+            else:
+                raise NotImplementedError(f"update operator {op}")
+
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    include = {k for k, v in projection.items() if v and k != '_id'}
+    if include:
+        result = {k: document[k] for k in include if k in document}
+        if projection.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        return result
+    for key, value in projection.items():
+        if not value:
+            document.pop(key, None)
+    return document
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    # None sorts first like in Mongo; mixed types are grouped by type name
+    if value is None:
+        return (0, '')
+    return (1, (type(value).__name__, value))
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+
+class DeleteResult:
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+        self.deleted_count = 0
+
+
+class InMemoryCursor:
+    def __init__(self, documents: List[Dict[str, Any]], projection):
+        self._documents = documents
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._iterator = None
+
+    def sort(self, key_or_list, direction: int = 1) -> "InMemoryCursor":
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list)
+        return self
+
+    def skip(self, count: int) -> "InMemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "InMemoryCursor":
+        self._limit = count
+        return self
+
+    def _results(self) -> List[Dict[str, Any]]:
+        documents = list(self._documents)
+        for key, direction in reversed(self._sort):
+            documents.sort(key=lambda d: _sort_key(_get_field(d, key)[1]),
+                           reverse=direction < 0)
+        documents = documents[self._skip:]
+        if self._limit:
+            documents = documents[:self._limit]
+        return [project(d, self._projection) for d in documents]
+
+    def __aiter__(self):
+        self._iterator = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = self._results()
+        return results[:length] if length else results
+
+
+class InMemoryCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self._documents: Dict[Any, Dict[str, Any]] = {}
+        self._counter = itertools.count()
+        self.indexes: List[Any] = []
+
+    def _matching(self, query) -> Iterable[Dict[str, Any]]:
+        if query and '_id' in query and not isinstance(query['_id'], dict):
+            document = self._documents.get(query['_id'])
+            if document is not None and matches(document, query):
+                yield document
+            return
+        for document in list(self._documents.values()):
+            if matches(document, query):
+                yield document
+
+    async def create_index(self, keys, **kwargs) -> str:
+        self.indexes.append((keys, kwargs))
+        return kwargs.get('name') or str(keys)
+
+    async def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        document.setdefault('_id', ObjectId())
+        if document['_id'] in self._documents:
+            raise ValueError(f"duplicate key {document['_id']}")
+        self._documents[document['_id']] = copy.deepcopy(document)
+        return InsertOneResult(document['_id'])
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True):
+        for document in documents:
+            await self.insert_one(document)
+
+    async def find_one(self, query=None, projection=None, sort=None,
+                       **kwargs) -> Optional[Dict[str, Any]]:
+        if sort:
+            documents = await self.find(query, projection).sort(sort).limit(1).to_list()
+            return documents[0] if documents else None
+        for document in self._matching(query):
+            return project(document, projection)
+        return None
+
+    def find(self, query=None, projection=None) -> InMemoryCursor:
+        return InMemoryCursor(list(self._matching(query)), projection)
+
+    async def count_documents(self, query) -> int:
+        return sum(1 for _ in self._matching(query))
+
+    async def estimated_document_count(self) -> int:
+        return len(self._documents)
+
+    def _upsert_document(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        document = {
+            key: value for key, value in query.items()
+            if not key.startswith('$') and not isinstance(value, dict)
+        }
+        document.setdefault('_id', ObjectId())
+        return document
+
+    async def update_one(self, query, update, upsert: bool = False) -> UpdateResult:
+        for document in self._matching(query):
+            apply_update(document, update, inserting=False)
+            return UpdateResult(1, 1)
+        if upsert:
+            document = self._upsert_document(query)
+            apply_update(document, update, inserting=True)
+            self._documents[document['_id']] = document
+            return UpdateResult(0, 0, document['_id'])
+        return UpdateResult(0, 0)
+
+    async def update_many(self, query, update) -> UpdateResult:
+        count = 0
+        for document in self._matching(query):
+            apply_update(document, update, inserting=False)
+            count += 1
+        return UpdateResult(count, count)
+
+    async def replace_one(self, query, replacement, upsert: bool = False) -> UpdateResult:
+        for document in self._matching(query):
+            new_document = copy.deepcopy(replacement)
+            new_document['_id'] = document['_id']
+            self._documents[document['_id']] = new_document
+            return UpdateResult(1, 1)
+        if upsert:
+            document = self._upsert_document(query)
+            document.update(copy.deepcopy(replacement))
+            self._documents[document['_id']] = document
+            return UpdateResult(0, 0, document['_id'])
+        return UpdateResult(0, 0)
+
+    async def find_one_and_update(self, query, update, upsert: bool = False,
+                                  return_document: bool = False, projection=None):
+        for document in self._matching(query):
+            before = project(document, projection)
+            apply_update(document, update, inserting=False)
+            return project(document, projection) if return_document else before
+        if upsert:
+            await self.update_one(query, update, upsert=True)
+        return None
+
+    async def delete_one(self, query) -> DeleteResult:
+        for document in self._matching(query):
+            del self._documents[document['_id']]
+            return DeleteResult(1)
+        return DeleteResult(0)
+
+    async def delete_many(self, query) -> DeleteResult:
+        stale = [document['_id'] for document in self._matching(query)]
+        for document_id in stale:
+            del self._documents[document_id]
+        return DeleteResult(len(stale))
+
+    async def bulk_write(self, requests, ordered: bool = True) -> BulkWriteResult:
+        """
+        Accepts pymongo's InsertOne, UpdateOne, ReplaceOne and DeleteOne
+        """
+        result = BulkWriteResult()
+        for request in requests:
+            kind = type(request).__name__
+            document = getattr(request, '_doc', None)
+            query = getattr(request, '_filter', None)
+            upsert = bool(getattr(request, '_upsert', False))
+            if kind == 'InsertOne':
+                await self.insert_one(document)
+                result.inserted_count += 1
+            elif kind in ('UpdateOne', 'ReplaceOne'):
+                if kind == 'UpdateOne':
+                    outcome = await self.update_one(query, document, upsert=upsert)
+                else:
+                    outcome = await self.replace_one(query, document, upsert=upsert)
+                result.matched_count += outcome.matched_count
+                result.modified_count += outcome.modified_count
+                result.upserted_count += outcome.upserted_id is not None
+            elif kind == 'DeleteOne':
+                result.deleted_count += (await self.delete_one(query)).deleted_count
+            else:
+                raise NotImplementedError(f"bulk operation {kind}")
+        return result
+
+
+class InMemoryDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name)
+        return self._collections[name]
+
+
+class InMemoryClient:
+    def __init__(self, *args, **kwargs):
+        self._databases: Dict[str, InMemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = InMemoryDatabase(name)
+        return self._databases[name]
@@ -1,6 +1,64 @@
+import contextvars
+import json
 import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+from config import settings
+
+# id of the request or job the current task works for; asyncio tasks and
+# asyncio.to_thread inherit it
+trace_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    'trace_id', default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_trace_id() -> Optional[str]:
+    return trace_id_var.get()
+
+
+class TraceIdFilter(logging.Filter):
+    """
+    Stamps every record with the trace id of the current context
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Arguments are still only interpolated for
+    records that pass the level check.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'trace_id': getattr(record, 'trace_id', '-'),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
 
 
 def setup_logging():
-    logging.basicConfig(level=logging.INFO,
-                        format='%(asctime)s - %(levelname)s - %(message)s')
+    handler = logging.StreamHandler()
+    handler.addFilter(TraceIdFilter())
+    if settings.LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(name)s - [%(trace_id)s] - %(message)s'))
+
+    root = logging.getLogger()
+    # replace, not add to, handlers installed by an earlier call
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
@@ -0,0 +1,81 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from prometheus_client import Counter, Histogram
+
+# buckets from a millisecond (a controller lookup) to ten minutes (a clone)
+DURATION_BUCKETS = (
+    0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600,
+)
+
+STAGE_DURATION = Histogram(
+    'orbitapi_stage_duration_seconds',
+    'Duration of pipeline stages: clone, parse, generate, store',
+    ['stage'], buckets=DURATION_BUCKETS,
+)
+STAGE_FAILURES = Counter(
+    'orbitapi_stage_failures_total', 'Pipeline stages that raised', ['stage'],
+)
+FILE_PARSE_DURATION = Histogram(
+    'orbitapi_file_parse_duration_seconds', 'Time to parse one route file',
+    ['framework'], buckets=DURATION_BUCKETS,
+)
+FILE_PARSE_ABORTED = Counter(
+    'orbitapi_file_parse_aborted_total',
+    'Route files whose supervised parse was killed or failed', ['reason'],
+)
+ROUTES_EXTRACTED = Counter(
+    'orbitapi_routes_extracted_total', 'API specifications extracted', ['framework'],
+)
+CONTROLLER_RESOLUTION_DURATION = Histogram(
+    'orbitapi_controller_resolution_duration_seconds',
+    'Time to resolve a route handler to its controller code',
+    buckets=DURATION_BUCKETS,
+)
+LLM_CALL_DURATION = Histogram(
+    'orbitapi_llm_call_duration_seconds', 'Latency of a single model call',
+    ['model', 'outcome'], buckets=DURATION_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    'orbitapi_llm_tokens_total', 'Tokens sent to and received from the model',
+    ['model', 'kind'],
+)
+PARSE_CACHE_LOOKUPS = Counter(
+    'orbitapi_parse_cache_lookups_total', 'Per-file parse cache lookups',
+    ['kind', 'outcome'],
+)
+PARSE_REQUESTS = Counter(
+    'orbitapi_parse_requests_total',
+    'Parse requests by how they were served: a pipeline run of their own '
+    '(leader), a run already in flight (joined) or a cached result (cached)',
+    ['outcome'],
+)
+PERSIST_DURATION = Histogram(
+    'orbitapi_persist_duration_seconds', 'Time to write one batch of specs',
+    buckets=DURATION_BUCKETS,
+)
+SPECS_PERSISTED = Counter(
+    'orbitapi_specs_persisted_total', 'Specs written to the database', ['outcome'],
+)
+TEST_CASE_REQUEST_DURATION = Histogram(
+    'orbitapi_test_case_request_duration_seconds',
+    'Latency of a generated test case sent to the service under test',
+    ['outcome'], buckets=DURATION_BUCKETS,
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'orbitapi_http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status'], buckets=DURATION_BUCKETS,
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """
+    Observe the duration of the block, whether or not it raises
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric = histogram.labels(**labels) if labels else histogram
+        metric.observe(time.perf_counter() - start)
@@ -0,0 +1,171 @@
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from app.schema.api_schema import APISpecification
+from app.parsers.django_index import (
+    DjangoProjectIndex,
+    PythonModule,
+    describe_handler,
+    index_django_project,
+    join_routes,
+)
+from app.parsers.file_access import DEFAULT_MAX_FILE_BYTES, FileReader
+from app.metrics import (
+    CONTROLLER_RESOLUTION_DURATION,
+    FILE_PARSE_DURATION,
+    ROUTES_EXTRACTED,
+    timed,
+)
+
+
+class DjangoParser:
+    """
+    Extracts API specifications from a Django project as joins over a
+    project index: url patterns -> views -> serializers. The index reads
+    every Python file once, however many url confs reference the same views.
+    """
+
+    # url confs nested through include() deeper than this are ignored
+    MAX_INCLUDE_DEPTH = 8
+
+    def __init__(self, project_root: str, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES):
+        self.project_root = str(project_root)
+        self.index: Optional[DjangoProjectIndex] = None
+        self.reader = FileReader(max_file_bytes, root=self.project_root)
+        # urls file -> files its specs were joined against
+        self.file_dependencies: Dict[str, List[str]] = {}
+
+    def _load_index(self) -> DjangoProjectIndex:
+        if self.index is None:
+            self.index = index_django_project(self.project_root, self.reader)
+        return self.index
+
+    def _prefixes(self) -> Dict[str, List[Tuple[str, List[str]]]]:
+        """
+        For each urls module, the route prefixes it is mounted at and the
+        url confs that mount it. Modules no other url conf includes are
+        mounted at the root.
+        """
+        index = self._load_index()
+        included: Set[str] = set()
+        for urls in index.url_modules():
+            for pattern in urls.urlpatterns:
+                if pattern.include is None:
+                    continue
+                target = index.find_module(pattern.include)
+                if target is not None and target is not urls:
+                    included.add(target.module)
+
+        prefixes: Dict[str, List[Tuple[str, List[str]]]] = {}
+
+        def mount(module: str, prefix: str, parents: List[str]) -> None:
+            if len(parents) > self.MAX_INCLUDE_DEPTH or module in parents:
+                return
+            prefixes.setdefault(module, []).append((prefix, parents))
+            for pattern in index.modules[module].urlpatterns:
+                if pattern.include is None:
+                    continue
+                target = index.find_module(pattern.include)
+                if target is not None:
+                    mount(target.module, join_routes(prefix, pattern.route),
+                          parents + [module])
+
+        for urls in index.url_modules():
+            if urls.module not in included:
+                mount(urls.module, '', [])
+        return prefixes
+
+    def _build_specs(self, urls: PythonModule, prefix: str,
+                     parents: List[str]) -> List[APISpecification]:
+        index = self._load_index()
+        dependencies: Set[str] = {index.modules[parent].path for parent in parents}
+        api_specifications = []
+        for pattern in urls.urlpatterns:
+            if pattern.include is not None:
+                continue
+            route = join_routes(prefix, pattern.route)
+            with timed(CONTROLLER_RESOLUTION_DURATION):
+                view = index.resolve_view(urls, pattern)
+            if view is None:
+                view_name = pattern.view_attr or pattern.view
+                api_specifications.append(APISpecification(
+                    endpoint=route,
+                    method='GET',
+                    controller_signature=view_name,
+                    controller_code='',
+                    request_data={},
+                    expected_response=[],
+                    test_cases="",
+                    files=urls.path,
+                    middleware=[],
+                ))
+                continue
+
+            dependencies.add(view.file)
+            for method in view.methods:
+                facts = view.handlers[method]
+                for name in facts.serializers:
+                    if name in index.serializers:
+                        dependencies.add(index.serializers[name].file)
+                request_data, expected_response = describe_handler(
+                    facts, index.serializers, route)
+                api_specifications.append(APISpecification(
+                    endpoint=route,
+                    method=method,
+                    controller_signature=f"{view.name} (HTTP Methods: {', '.join(view.methods)})",
+                    controller_code=view.code,
+                    request_data=request_data,
+                    expected_response=expected_response,
+                    auth_required=view.auth_required,
+                    test_cases="",
+                    files=urls.path,
+                    middleware=[],
+                    controller_location={'file': view.file, 'start': view.start,
+                                         'end': view.end},
+                ))
+
+        dependencies.discard(urls.path)
+        existing = set(self.file_dependencies.get(urls.path, []))
+        self.file_dependencies[urls.path] = sorted(existing | dependencies)
+        return api_specifications
+
+    def _parse_urls(self, urls_files: Optional[Set[str]] = None) -> Iterator[APISpecification]:
+        index = self._load_index()
+        prefixes = self._prefixes()
+        for urls in index.url_modules():
+            if urls_files is not None and urls.path not in urls_files:
+                continue
+            start = time.perf_counter()
+            api_specifications = [
+                api_spec
+                for prefix, parents in prefixes.get(urls.module, [])
+                for api_spec in self._build_specs(urls, prefix, parents)
+            ]
+            FILE_PARSE_DURATION.labels(framework='django').observe(time.perf_counter() - start)
+            ROUTES_EXTRACTED.labels(framework='django').inc(len(api_specifications))
+            yield from api_specifications
+
+    def list_route_files(self) -> List[Path]:
+        """
+        The url conf files, in the order extract_apis processes them
+        """
+        return [Path(urls.path) for urls in self._load_index().url_modules()]
+
+    def skipped_files(self) -> List[Dict[str, Any]]:
+        return self.reader.skipped()
+
+    def parse_files(self, file_paths: Iterable[Path]) -> List[Dict[str, Any]]:
+        """
+        Extract API specifications from the given url conf files only. The
+        views they point at are still resolved against the whole project.
+        """
+        urls_files = {str(path) for path in file_paths}
+        return [api_spec.model_dump() for api_spec in self._parse_urls(urls_files)]
+
+    def iter_apis(self) -> Iterator[Dict[str, Any]]:
+        for api_spec in self._parse_urls():
+            yield api_spec.model_dump()
+
+    def extract_apis(self) -> List[Dict[str, Any]]:
+        return list(self.iter_apis())
+
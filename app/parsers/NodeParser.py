@@ -1,31 +1,92 @@
 from pathlib import Path
 import re
 import os
-from typing import Optional, Dict, Any, List
+import time
+import logging
+from collections import defaultdict
+from itertools import chain, islice
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
 from app.schema.api_schema import APISpecification
+from app.parsers.controller_index import byte_offsets, get_controller_index
+from app.parsers.discovery import RouteFileScanner
+from app.parsers.file_access import DEFAULT_MAX_FILE_BYTES, FileReader
+from app.parsers.parse_cache import ParseCache, get_parse_cache
+from app.parsers.js_scanner import JSScan, find_middleware_calls, find_route_calls
+from app.parsers.supervisor import ParseSupervisor
+from app.metrics import (
+    CONTROLLER_RESOLUTION_DURATION,
+    FILE_PARSE_ABORTED,
+    FILE_PARSE_DURATION,
+    ROUTES_EXTRACTED,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_files_in_worker(
+    routes_path: str, repo_path: str, file_paths: List[str], max_file_bytes: int,
+    cache_location: Optional[Tuple[str, int]],
+) -> Tuple[List[APISpecification], Dict[str, List[str]], Dict[str, List[float]],
+           Dict[str, Dict[str, Any]]]:
+    """
+    Supervised worker entry point: parse the given route files. Timings are
+    returned rather than observed, as a worker's metrics die with it.
+    cache_location is the (path, max_entries) of the parent's parse cache.
+    """
+    cache = get_parse_cache(*cache_location) if cache_location else None
+    parser = NodeJSParser(routes_path=routes_path, repo_path=repo_path,
+                          max_file_bytes=max_file_bytes, cache=cache)
+    parser.deferred_timings = defaultdict(list)
+    api_specifications = []
+    for file_path in file_paths:
+        api_specifications.extend(parser._parse_file(Path(file_path)))
+    if cache is not None:
+        cache.flush()
+    return (api_specifications, parser.file_dependencies,
+            dict(parser.deferred_timings), parser.reader.skipped_files)
 
 
 class NodeJSParser:
-    def __init__(self, routes_path: str, repo_path: str):
+    def __init__(self, routes_path: str, repo_path: str,
+                 max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                 cache: Optional[ParseCache] = None,
+                 supervisor: Optional[ParseSupervisor] = None,
+                 parallel_min_files: int = 200, parallel_min_bytes: int = 1024 * 1024,
+                 files_per_task: int = 16):
         self.routes_path = Path(routes_path)
         self.repo_path = repo_path
         self.api_specifications: List[APISpecification] = []
         self.processed_files: set = set()
-        self.middleware_patterns = {
-            'express': r'app\.use\((.*?)\)',
-            'router': r'router\.use\((.*?)\)',
-        }
-        self.route_patterns = [
-            r"router\.(get|post|put|patch|delete)\(['\"](.+?)['\"],\s*(\w+|\(.*?\)\s*=>\s*\{.*?\})"
-        ]
+        # route file -> controller files its routes were resolved against
+        self.file_dependencies: Dict[str, List[str]] = {}
+        # per-file results are reused for identical files from any repository
+        self.cache = cache
+        self.controller_index = get_controller_index(str(repo_path), cache)
+        # route files over max_file_bytes, binary, minified or outside the
+        # repository are skipped
+        self.reader = FileReader(max_file_bytes, root=repo_path)
+        # when set, timings are collected here instead of observed
+        self.deferred_timings: Optional[Dict[str, List[float]]] = None
+        # when set, route files are parsed in its watched worker processes
+        # under a time and CPU budget, in parallel across them, once there
+        # are parallel_min_files of them or parallel_min_bytes of source;
+        # fewer are parsed one by one in process, as are all without it
+        self.supervisor = supervisor
+        self.parallel_min_files = parallel_min_files
+        self.parallel_min_bytes = parallel_min_bytes
+        # route files sent to a worker at a time
+        self.files_per_task = max(1, files_per_task)
+
+    def _observe(self, timing: str, seconds: float) -> None:
+        if self.deferred_timings is not None:
+            self.deferred_timings[timing].append(seconds)
+        elif timing == 'parse':
+            FILE_PARSE_DURATION.labels(framework='express').observe(seconds)
+        else:
+            CONTROLLER_RESOLUTION_DURATION.observe(seconds)
 
     def _read_file_content(self, file_path: Path) -> str:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except Exception as e:
-            print(f"Error reading file {file_path}: {e}")
-            return ""
+        return self.reader.read_text(str(file_path)) or ""
 
     def _extract_controller_imports(self, content: str) -> Dict[str, str]:
         controller_imports = {}
@@ -40,20 +101,17 @@ class NodeJSParser:
             for controller_name in controller_names:
                 controller_imports[controller_name] = file_path
 
-        print(controller_imports)
+        logger.debug("Controller imports: %s", controller_imports)
 
         return controller_imports
 
-    def _get_controller_code(self, controller_name: str, controller_file: str) -> str:
-
+    def _resolve_controller_path(self, controller_file: str) -> str:
         controller_path = os.path.join(self.repo_path, controller_file)
 
         # Check if the path has no extension; if so, add .js extension
         if not controller_path.endswith(".js"):
             controller_path += ".js"
-        print(f"controller file: {controller_path}")
 
-        # controller_file_path = os.path.normpath(controller_file_path)
         controller_path = controller_path.split("..")
 
         base_path = controller_path[0].split('\\')
@@ -62,59 +120,87 @@ class NodeJSParser:
 
         controller_file_path = ''
 
-        if controller_path[1][0] == '/':
+        if len(controller_path) > 1 and controller_path[1][0] == '/':
             controller_file_path = controller_path[1][1:]
 
-        # print(base_path)
-        # print(controller_file_path)
+        return base_path + controller_file_path
 
-        merged_path = base_path + controller_file_path
+    def _lookup_controller(self, controller_name: str,
+                           controller_file: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Code of a controller and the file and byte span it was read from
+        """
+        start = time.perf_counter()
+        try:
+            return self._find_controller(controller_name, controller_file)
+        finally:
+            self._observe('controller_resolution', time.perf_counter() - start)
 
-        print(f"after merging path: {merged_path}")
-        if not os.path.exists(merged_path):
-            return f"Controller file '{controller_file}' not found."
+    def _find_controller(self, controller_name: str,
+                         controller_file: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        merged_path = self._resolve_controller_path(controller_file)
 
-        with open(merged_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            pattern = rf"(?:const|let|var)\s+" + rf"{
-                controller_name}\s*=\s*async\s*\([^)]*\)\s*=>\s*\{{(?:[^{{}}]|{{\s*(?:[^{{}}]|{{\s*(?:[^{{}}]|{{\s*[^{{}}]*\}})*\}})*\}})*\}}"
+        logger.debug("Resolved controller file %s to %s", controller_file, merged_path)
+        if not os.path.exists(merged_path):
+            return f"Controller file '{controller_file}' not found.", None
 
-            match = re.search(pattern, content, re.DOTALL)
+        # each controller file is scanned once per repo; this is a lookup
+        symbol = self.controller_index.lookup(merged_path, controller_name)
+        if symbol is None:
+            return f"Controller '{controller_name}' not found in '{controller_file}'.", None
 
-            return match.group(0) if match else f"Controller '{controller_name}' not found in '{controller_file}'."
+        location = {'file': merged_path, 'start': symbol.byte_start, 'end': symbol.byte_end}
+        return symbol.code, location
 
-    def _extract_route_info(self, content: str, controller_imports: Dict[str, str]) -> List[Dict[str, Any]]:
+    def _get_controller_code(self, controller_name: str, controller_file: str) -> str:
+        return self._lookup_controller(controller_name, controller_file)[0]
+
+    def _find_route_calls(self, content: str,
+                          scan: Optional[JSScan] = None) -> List[Dict[str, Any]]:
+        return find_route_calls(content, scan)
+
+    def _extract_route_info(self, content: str, controller_imports: Dict[str, str],
+                            scan: Optional[JSScan] = None,
+                            file_path: Optional[Path] = None,
+                            route_calls: Optional[List[Dict[str, Any]]] = None
+                            ) -> List[Dict[str, Any]]:
+        if route_calls is None:
+            route_calls = self._find_route_calls(content, scan)
         routes = []
-        for pattern in self.route_patterns:
-            matches = re.findall(pattern, content, re.MULTILINE | re.DOTALL)
-            for method, endpoint, controller in matches:
-                controller_code = ""
-                if "(" in controller:
-                    controller_code = controller.strip()
-                elif controller in controller_imports:
-                    controller_code = self._get_controller_code(
-                        controller, controller_imports[controller])
-                routes.append({
-                    'method': method.lower(),
-                    'endpoint': endpoint,
-                    'controller_signature': controller,
-                    'controller_code': controller_code,
-                })
+        for route in route_calls:
+            controller = route['handler']
+            controller_code = ""
+            location = None
+            if route['inline']:
+                controller_code = controller.strip()
+                if file_path is not None:
+                    start, end = byte_offsets(content, list(route['handler_span']))
+                    location = {'file': str(file_path), 'start': start, 'end': end}
+            elif controller in controller_imports:
+                controller_code, location = self._lookup_controller(
+                    controller, controller_imports[controller])
+            elif '.' in controller:
+                # userController.getUser, where userController is the module
+                module, _, name = controller.rpartition('.')
+                if module in controller_imports:
+                    controller_code, location = self._lookup_controller(
+                        name, controller_imports[module])
+            routes.append({
+                'method': route['method'],
+                'endpoint': route['endpoint'],
+                'controller_signature': controller,
+                'controller_code': controller_code,
+                'controller_location': location,
+                'route_middleware': route['middleware'],
+            })
 
         return routes
 
-    def _extract_middleware(self, content: str) -> List[str]:
-        middleware = []
-        for pattern in self.middleware_patterns.values():
-            matches = re.finditer(pattern, content, re.MULTILINE | re.DOTALL)
-            for match in matches:
-                middleware_content = match.group(1)
-                if middleware_content:
-                    middleware.append(middleware_content.strip())
-        return middleware
+    def _extract_middleware(self, content: str, scan: Optional[JSScan] = None) -> List[str]:
+        return find_middleware_calls(content, scan)
 
     def _extract_request_data(self, handler: str) -> Dict[str, Any]:
-        print(f"Extracting request data for the following handler:\n{handler}")
+        logger.debug("Extracting request data for the following handler:\n%s", handler)
         schema = {}
 
         body_pattern = r'const\s*{\s*([^}]+)\s*}\s*=\s*req\.body'
@@ -132,7 +218,7 @@ class NodeJSParser:
             schema['params'] = [param.strip()
                                 for param in params_match.group(1).split(',')]
 
-        print(f"Final schema: {schema}")
+        logger.debug("Request schema: %s", schema)
 
         return schema
 
@@ -173,24 +259,76 @@ class NodeJSParser:
         return body.strip()
 
     def _process_file(self, file_path: Path) -> None:
+        self.api_specifications.extend(self._parse_file(file_path))
+
+    def _parse_file(self, file_path: Path) -> List[APISpecification]:
         if file_path in self.processed_files or not file_path.suffix == '.js':
-            return
+            return []
+        start = time.perf_counter()
+        api_specifications = self._parse_file_content(file_path)
+        self._observe('parse', time.perf_counter() - start)
+        if self.deferred_timings is None:
+            ROUTES_EXTRACTED.labels(framework='express').inc(len(api_specifications))
+        return api_specifications
+
+    def _file_facts(self, content: str) -> Dict[str, Any]:
+        """
+        What a route file declares by itself: its controller imports, route
+        calls and middleware. These depend on the content alone, so they
+        are cached by content hash.
+        """
+        if self.cache is not None:
+            facts = self.cache.get('route_file', content)
+            if facts is not None:
+                return facts
+        # one tokenizer pass serves route and middleware extraction
+        scan = JSScan(content)
+        facts = {
+            'imports': self._extract_controller_imports(content),
+            'routes': self._find_route_calls(content, scan),
+            'middleware': self._extract_middleware(content, scan),
+        }
+        if self.cache is not None:
+            self.cache.set('route_file', content, facts)
+        return facts
+
+    def _analyze_handler(self, handler: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Request and response data of a handler, cached by its code
+        """
+        if self.cache is not None:
+            analysis = self.cache.get('handler', handler)
+            if analysis is not None:
+                return analysis[0], analysis[1]
+        request_data = self._extract_request_data(handler)
+        response_data = self._extract_response_data(handler)
+        if self.cache is not None:
+            self.cache.set('handler', handler, [request_data, response_data])
+        return request_data, response_data
+
+    def _parse_file_content(self, file_path: Path) -> List[APISpecification]:
         content = self._read_file_content(file_path)
         if not content:
-            return
-
-        controller_imports = self._extract_controller_imports(content)
-        print(controller_imports)
-        routes = self._extract_route_info(content, controller_imports)
-        middleware = self._extract_middleware(content)
-
+            return []
+
+        facts = self._file_facts(content)
+        controller_imports = facts['imports']
+        self.file_dependencies[str(file_path)] = sorted({
+            self._resolve_controller_path(controller_file)
+            for controller_file in controller_imports.values()
+        })
+        # controllers are resolved per repository, never cached with the file
+        routes = self._extract_route_info(content, controller_imports, file_path=file_path,
+                                          route_calls=facts['routes'])
+        middleware = facts['middleware']
+
+        api_specifications = []
         for route in routes:
             handler = route['controller_code']
-            request_data = self._extract_request_data(handler)
-            response_data = self._extract_response_data(handler)
+            request_data, response_data = self._analyze_handler(handler)
             auth_required = any(
                 'auth' in mw.lower() or 'authenticate' in mw.lower() or 'jwt' in mw.lower()
-                for mw in middleware
+                for mw in middleware + route['route_middleware']
             )
 
             api_spec = APISpecification(
@@ -204,21 +342,168 @@ class NodeJSParser:
                 test_cases="",
                 files=str(file_path),
                 api_schema={},
-                middleware=middleware
+                middleware=middleware,
+                controller_location=route['controller_location'],
             )
-            self.api_specifications.append(api_spec)
+            api_specifications.append(api_spec)
 
         self.processed_files.add(file_path)
+        return api_specifications
+
+    def _iter_route_files(self, dir_path: Path) -> Iterator[Path]:
+        # skips dependencies, build output, ignored and non-route files
+        return RouteFileScanner(str(dir_path), repo_root=self.repo_path,
+                                reader=self.reader).iter_files()
+
+    def list_route_files(self) -> List[Path]:
+        """
+        Route files in the order extract_apis processes them
+        """
+        if self.routes_path.is_dir():
+            return list(self._iter_route_files(self.routes_path))
+        return [self.routes_path]
 
     def _process_directory(self, dir_path: Path) -> None:
+        self._process_files(list(self._iter_route_files(dir_path)))
+
+    def _process_files(self, file_paths: List[Path]) -> None:
+        file_paths = [
+            path for path in file_paths if path not in self.processed_files
+        ]
+        if self._supervised(file_paths):
+            self.api_specifications.extend(self._parse_files_supervised(file_paths))
+        else:
+            for file_path in file_paths:
+                self._process_file(file_path)
+        self._flush_cache()
+
+    def _supervised(self, file_paths: List[Path]) -> bool:
+        """
+        Whether to parse the files in worker processes, which is not worth
+        their start-up for a few small files
+        """
+        if self.supervisor is None:
+            return False
+        if len(file_paths) >= self.parallel_min_files:
+            return True
+        total = 0
+        for path in file_paths:
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                continue
+            if total >= self.parallel_min_bytes:
+                return True
+        return False
+
+    def _flush_cache(self) -> None:
+        if self.cache is not None:
+            self.cache.flush()
+
+    def _cache_location(self) -> Optional[Tuple[str, int]]:
+        return (self.cache.path, self.cache.max_entries) if self.cache else None
+
+    def _merge_worker_result(self, result: Tuple) -> List[APISpecification]:
+        api_specifications, file_dependencies, timings, skipped = result
+        self.file_dependencies.update(file_dependencies)
+        self.reader.skipped_files.update(skipped)
+        ROUTES_EXTRACTED.labels(framework='express').inc(len(api_specifications))
+        for timing, durations in timings.items():
+            for seconds in durations:
+                self._observe(timing, seconds)
+        return api_specifications
+
+    def _run_supervised(self, batches: List[List[Path]]) -> List[Tuple[str, Any]]:
+        return self.supervisor.map(_parse_files_in_worker, [
+            (str(self.routes_path), self.repo_path, [str(path) for path in batch],
+             self.reader.max_bytes, self._cache_location())
+            for batch in batches
+        ])
+
+    def _parse_files_supervised(self, file_paths: List[Path]) -> List[APISpecification]:
+        """
+        Parse the files under the supervisor, several to a task. The files
+        of a task that overran its budget or crashed its worker are parsed
+        again one to a task; a file that does so alone yields no specs and
+        is recorded as skipped with the reason.
+        """
+        # batches small enough to keep every worker busy
+        workers = self.supervisor.max_workers
+        size = min(self.files_per_task, -(-len(file_paths) // workers)) or 1
+        batches = [file_paths[i:i + size] for i in range(0, len(file_paths), size)]
+        outcomes = self._run_supervised(batches)
+
+        retries = [batch for batch, (status, _) in zip(batches, outcomes)
+                   if status != 'ok' and len(batch) > 1]
+        retried = iter(self._run_supervised(
+            [[path] for batch in retries for path in batch]))
+
+        api_specifications = []
+        for batch, (status, result) in zip(batches, outcomes):
+            if status == 'ok':
+                api_specifications.extend(self._merge_worker_result(result))
+                continue
+            if len(batch) > 1:
+                logger.info("Parsing %d files together was aborted (%s); "
+                            "parsing them one by one", len(batch), status)
+                single_outcomes = [next(retried) for _ in batch]
+            else:
+                single_outcomes = [(status, result)]
+            for path, (single_status, single_result) in zip(batch, single_outcomes):
+                if single_status == 'ok':
+                    api_specifications.extend(self._merge_worker_result(single_result))
+                else:
+                    self._skip_aborted(path, single_status, single_result)
+        self.processed_files.update(file_paths)
+        return api_specifications
+
+    def _skip_aborted(self, path: Path, status: str, detail: Any) -> None:
+        logger.warning("Parsing %s was aborted (%s: %s)", path, status, detail)
+        FILE_PARSE_ABORTED.labels(reason=status).inc()
         try:
-            for path in dir_path.iterdir():
-                if path.is_file() and path.suffix == '.js':
-                    self._process_file(path)
-                elif path.is_dir() and not path.name.startswith('.'):
-                    self._process_directory(path)
-        except Exception as e:
-            print(f"Error processing directory {dir_path}: {e}")
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+        self.reader.skip(str(path), status, size)
+
+    def skipped_files(self) -> List[Dict[str, Any]]:
+        """
+        Files passed over so far, with the reason and size
+        """
+        return self.reader.skipped()
+
+    def parse_files(self, file_paths: Iterable[Path]) -> List[Dict[str, Any]]:
+        """
+        Extract API specifications from the given route files only
+        """
+        start = len(self.api_specifications)
+        self._process_files([Path(file_path) for file_path in file_paths])
+        return [api_spec.model_dump() for api_spec in self.api_specifications[start:]]
+
+    def iter_apis(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield API specifications as they are parsed. Unlike extract_apis
+        nothing is accumulated, so memory is bounded by the specs of a
+        single file, or of one chunk of files when they are parsed by
+        workers.
+        """
+        if self.routes_path.is_dir():
+            file_paths = self._iter_route_files(self.routes_path)
+        else:
+            file_paths = iter([self.routes_path])
+        # whether workers are worth it is decided on the first chunk
+        chunk = list(islice(file_paths, max(self.parallel_min_files, 1)))
+        if self._supervised(chunk):
+            size = len(chunk)
+            while chunk:
+                for api_spec in self._parse_files_supervised(chunk):
+                    yield api_spec.model_dump()
+                chunk = list(islice(file_paths, size))
+        else:
+            for file_path in chain(chunk, file_paths):
+                for api_spec in self._parse_file(file_path):
+                    yield api_spec.model_dump()
+        self._flush_cache()
 
     def extract_apis(self) -> List[Dict[str, Any]]:
 
@@ -226,4 +511,5 @@ class NodeJSParser:
             self._process_directory(self.routes_path)
         else:
             self._process_file(self.routes_path)
+            self._flush_cache()
         return [api_spec.model_dump() for api_spec in self.api_specifications]
@@ -1,7 +1,32 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from app.schema.api_schema import APISpecification
 from app.parsers.NodeParser import NodeJSParser
+from app.parsers.DjangoParser import DjangoParser
+from app.parsers.parse_cache import get_parse_cache
+from app.parsers.supervisor import get_parse_supervisor
 from pathlib import Path
+import os
+import tempfile
+from config import settings
+
+# framework_type values parsed as Django; anything else is parsed as Node.js
+DJANGO_FRAMEWORKS = {'django', 'drf', 'django-rest-framework'}
+
+
+def _parse_cache():
+    if not settings.PARSE_CACHE_ENABLED:
+        return None
+    path = settings.PARSE_CACHE_PATH or os.path.join(
+        tempfile.gettempdir(), 'orbitapi-parse-cache.sqlite3')
+    return get_parse_cache(path, settings.PARSE_CACHE_MAX_ENTRIES)
+
+
+def _parse_supervisor():
+    if settings.PARSER_FILE_TIMEOUT <= 0:
+        return None
+    return get_parse_supervisor(settings.PARSER_WORKERS or os.cpu_count() or 1,
+                                settings.PARSER_FILE_TIMEOUT,
+                                settings.PARSER_FILE_CPU_SECONDS)
 
 
 class Parser:
@@ -9,13 +34,38 @@ class Parser:
         self.repo_path = repo_path
         self.framework_type = framework_type.lower()
         self.routes_path = Path(routes_path)
+        if self.framework_type in DJANGO_FRAMEWORKS:
+            # url confs live alongside each app, not in one routes directory
+            self.parser = DjangoParser(project_root=self.repo_path,
+                                       max_file_bytes=settings.PARSER_MAX_FILE_BYTES)
+        else:
+            self.parser = NodeJSParser(
+                routes_path=str(self.routes_path), repo_path=self.repo_path,
+                max_file_bytes=settings.PARSER_MAX_FILE_BYTES,
+                cache=_parse_cache(),
+                supervisor=_parse_supervisor(),
+                parallel_min_files=settings.PARSER_PARALLEL_MIN_FILES,
+                parallel_min_bytes=settings.PARSER_PARALLEL_MIN_BYTES,
+                files_per_task=settings.PARSER_FILES_PER_TASK,
+            )
 
     def parse(self) -> List[Dict[str, Any]]:
         """
         Parse the repository and extract API specifications
         """
 
-        parser = NodeJSParser(
-            routes_path=str(self.routes_path), repo_path=self.repo_path
-        )
-        return parser.extract_apis()
+        return self.parser.extract_apis()
+
+    def skipped_files(self) -> List[Dict[str, Any]]:
+        """
+        Files left unparsed as too large, binary or minified
+        """
+
+        return self.parser.skipped_files()
+
+    def iter_parse(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield API specifications as each file is parsed
+        """
+
+        return self.parser.iter_apis()
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+from app.parsers.file_access import FileReader
+from app.parsers.js_scanner import find_function_definitions
+from app.parsers.parse_cache import ParseCache
+
+
+MODULE_EXPORTS_PATTERN = re.compile(r"module\.exports\s*=\s*\{([^}]*)\}")
+NAMED_EXPORT_PATTERN = re.compile(r"(?:module\.)?exports\.(\w+)\s*=")
+
+
+class ControllerSymbol:
+    def __init__(self, name: str, start: int, end: int, line: int,
+                 exported: bool, code: str, byte_start: int, byte_end: int):
+        self.name = name
+        # character span of the definition in the file
+        self.start = start
+        self.end = end
+        # the same span in bytes, to read the code back without decoding
+        # the whole file
+        self.byte_start = byte_start
+        self.byte_end = byte_end
+        self.line = line
+        self.exported = exported
+        self.code = code
+
+
+class ControllerFile:
+    def __init__(self, path: str, mtime_ns: int, size: int, content_hash: str,
+                 symbols: Dict[str, ControllerSymbol]):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content_hash = content_hash
+        self.symbols = symbols
+
+
+def byte_offsets(content: str, indexes: List[int]) -> List[int]:
+    """
+    UTF-8 byte offsets of character indexes into content
+    """
+    if content.isascii():
+        return list(indexes)
+    offsets = []
+    position = byte = 0
+    # encode each stretch between consecutive indexes once
+    for index in sorted(set(indexes)):
+        byte += len(content[position:index].encode('utf-8'))
+        position = index
+        offsets.append((index, byte))
+    lookup = dict(offsets)
+    return [lookup[index] for index in indexes]
+
+
+def _exported_names(content: str) -> Set[str]:
+    names = set()
+    for match in MODULE_EXPORTS_PATTERN.finditer(content):
+        for item in match.group(1).split(','):
+            # `{ a, b: c }` exports a and b
+            name = item.split(':')[0].strip()
+            if name:
+                names.add(name)
+    names.update(NAMED_EXPORT_PATTERN.findall(content))
+    return names
+
+
+def scan_controller_file(path: str, content: str, mtime_ns: int = 0,
+                         size: int = 0) -> ControllerFile:
+    """
+    Scan a controller file once and record every handler definition in it
+    """
+    exported = _exported_names(content)
+    symbols: Dict[str, ControllerSymbol] = {}
+    definitions = find_function_definitions(content)
+    spans = byte_offsets(content, [index for definition in definitions
+                                   for index in (definition['start'], definition['end'])])
+    for position, definition in enumerate(definitions):
+        name, start, end = definition['name'], definition['start'], definition['end']
+        symbols[name] = ControllerSymbol(
+            name=name,
+            start=start,
+            end=end,
+            line=content.count('\n', 0, start) + 1,
+            exported=name in exported,
+            code=content[start:end],
+            byte_start=spans[2 * position],
+            byte_end=spans[2 * position + 1],
+        )
+    content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    return ControllerFile(path, mtime_ns, size, content_hash, symbols)
+
+
+def _symbol_rows(entry: ControllerFile) -> List[list]:
+    # the code itself is not stored: it is a slice of the content
+    return [
+        [symbol.name, symbol.start, symbol.end, symbol.line, symbol.exported,
+         symbol.byte_start, symbol.byte_end]
+        for symbol in entry.symbols.values()
+    ]
+
+
+def _controller_file_from_rows(path: str, content: str, mtime_ns: int, size: int,
+                               rows: List[list]) -> ControllerFile:
+    symbols = {
+        name: ControllerSymbol(name, start, end, line, exported, content[start:end],
+                               byte_start, byte_end)
+        for name, start, end, line, exported, byte_start, byte_end in rows
+    }
+    content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    return ControllerFile(path, mtime_ns, size, content_hash, symbols)
+
+
+class ControllerIndex:
+    """
+    Table of the handlers defined in a repository's controller files. Each
+    file is read and scanned once; a later lookup only re-reads it when its
+    mtime or size changed, and only re-scans it when its content did.
+    """
+
+    def __init__(self, cache: Optional[ParseCache] = None, root: Optional[str] = None):
+        self._files: Dict[str, ControllerFile] = {}
+        self.scans = 0
+        # controller files resolving outside root are never read
+        self.reader = FileReader(root=root)
+        # scans of identical controller files are shared across repositories
+        self.cache = cache
+
+    def _scan(self, path: str, content: str, mtime_ns: int, size: int) -> ControllerFile:
+        if self.cache is not None:
+            rows = self.cache.get('controller_file', content)
+            if rows is not None:
+                return _controller_file_from_rows(path, content, mtime_ns, size, rows)
+        entry = scan_controller_file(path, content, mtime_ns, size)
+        self.scans += 1
+        if self.cache is not None:
+            self.cache.set('controller_file', content, _symbol_rows(entry))
+        return entry
+
+    def get_file(self, path: str) -> Optional[ControllerFile]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._files.pop(path, None)
+            return None
+
+        entry = self._files.get(path)
+        if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            return entry
+
+        content = self.reader.read_text(path)
+        if content is None:
+            self._files.pop(path, None)
+            return None
+        if entry is not None and entry.content_hash == hashlib.sha1(content.encode('utf-8')).hexdigest():
+            entry.mtime_ns = stat.st_mtime_ns
+            entry.size = stat.st_size
+            return entry
+
+        entry = self._scan(path, content, stat.st_mtime_ns, stat.st_size)
+        self._files[path] = entry
+        return entry
+
+    def lookup(self, path: str, name: str) -> Optional[ControllerSymbol]:
+        entry = self.get_file(path)
+        if entry is None:
+            return None
+        return entry.symbols.get(name)
+
+
+# indexes of recently parsed repositories, most recent last
+_indexes: "OrderedDict[str, ControllerIndex]" = OrderedDict()
+# parses run in threads, which share _indexes
+_indexes_lock = threading.Lock()
+MAX_INDEXED_REPOS = 32
+
+
+def get_controller_index(repo_path: str, cache: Optional[ParseCache] = None) -> ControllerIndex:
+    with _indexes_lock:
+        index = _indexes.get(repo_path)
+        if index is None:
+            index = ControllerIndex(cache, root=repo_path)
+            _indexes[repo_path] = index
+            while len(_indexes) > MAX_INDEXED_REPOS:
+                _indexes.popitem(last=False)
+        elif cache is not None:
+            index.cache = cache
+        _indexes.move_to_end(repo_path)
+        return index
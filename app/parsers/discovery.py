@@ -0,0 +1,210 @@
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+from app.parsers.file_access import FileReader
+
+logger = logging.getLogger(__name__)
+
+# never holds hand-written route files: dependencies and build output
+IGNORED_DIRECTORIES = {
+    'node_modules', 'bower_components', 'jspm_packages', 'dist', 'build',
+    'coverage',
+}
+# bundled or minified output of a build step
+IGNORED_FILE_SUFFIXES = ('.min.js', '.bundle.js', '-bundle.js')
+
+# a file without any of these cannot declare an Express route
+ROUTE_KEYWORDS = (
+    b'router.', b'Router(', b'app.get', b'app.post', b'app.put', b'app.patch',
+    b'app.delete',
+)
+
+# one pass of the regex engine over the raw bytes finds any of the keywords
+# without decoding the file
+_KEYWORDS_RE = re.compile(b'|'.join(re.escape(keyword) for keyword in ROUTE_KEYWORDS))
+
+
+def _translate_glob(pattern: str) -> str:
+    """
+    Regex for a gitignore glob: * and ? stop at slashes, ** crosses them
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif char == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif char == '?':
+            parts.append('[^/]')
+            i += 1
+        elif char == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif char == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(char))
+            i += 1
+    return ''.join(parts)
+
+
+class GitIgnore:
+    """
+    Rules of one .gitignore file, matched against paths relative to the
+    directory it is in. Patterns without a slash match a name at any depth;
+    the last matching rule wins, so later `!` rules re-include.
+    """
+
+    def __init__(self, base: str, lines: Sequence[str]):
+        self.base = base
+        # (compiled pattern, matches the name only, negated, directories only)
+        self.rules: List[Tuple[re.Pattern, bool, bool, bool]] = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            directory_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            name_only = '/' not in line
+            line = line.lstrip('/')
+            regex = re.compile(_translate_glob(line) + r'\Z')
+            self.rules.append((regex, name_only, negated, directory_only))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional['GitIgnore']:
+        try:
+            with open(os.path.join(directory, '.gitignore'), encoding='utf-8',
+                      errors='replace') as file:
+                return cls(directory, file.readlines())
+        except OSError:
+            return None
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        True if ignored, False if explicitly re-included, None if no rule
+        applies. path is absolute and below base.
+        """
+        relative = Path(os.path.relpath(path, self.base)).as_posix()
+        name = relative.rsplit('/', 1)[-1]
+        result = None
+        for regex, name_only, negated, directory_only in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if regex.match(name if name_only else relative):
+                result = not negated
+        return result
+
+
+class RouteFileScanner:
+    """
+    Finds the route files below a directory in a single os.scandir walk.
+    Ignored directories, .gitignore'd paths and minified bundles are never
+    entered or read, and each remaining file is only kept when a byte search
+    finds a route keyword in it, so the regex work of parsing is spent on
+    files that can declare routes.
+
+    With a repo_root above root, the .gitignore files between the two apply
+    as well. Files are searched through reader, which memory-maps large ones
+    and records those over its size budget as skipped.
+    """
+
+    def __init__(self, root: str, repo_root: Optional[str] = None,
+                 suffixes: Tuple[str, ...] = ('.js',),
+                 reader: Optional[FileReader] = None):
+        self.root = os.path.abspath(root)
+        self.repo_root = os.path.abspath(repo_root) if repo_root else self.root
+        self.suffixes = suffixes
+        self.reader = reader or FileReader()
+        self.files_scanned = 0
+        self.files_ignored = 0
+        self.files_prefiltered = 0
+
+    def _ancestor_rules(self) -> List[GitIgnore]:
+        """
+        Rules of the .gitignore files from repo_root down to root's parent
+        """
+        relative = os.path.relpath(self.root, self.repo_root)
+        if relative == '.' or relative.startswith('..'):
+            return []
+        directories = [self.repo_root]
+        for part in Path(relative).parts[:-1]:
+            directories.append(os.path.join(directories[-1], part))
+        return [
+            gitignore for gitignore in map(GitIgnore.load, directories)
+            if gitignore is not None
+        ]
+
+    @staticmethod
+    def _ignored(rules: List[GitIgnore], path: str, is_dir: bool) -> bool:
+        ignored = False
+        for gitignore in rules:
+            result = gitignore.match(path, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def iter_files(self) -> Iterator[Path]:
+        """
+        Candidate route files in sorted depth-first order
+        """
+        if os.path.isfile(self.root):
+            yield Path(self.root)
+            return
+        yield from self._walk(self.root, self._ancestor_rules())
+        logger.debug("Scanned %d files under %s: %d ignored, %d without route keywords",
+                     self.files_scanned, self.root, self.files_ignored,
+                     self.files_prefiltered)
+
+    def _walk(self, directory: str, rules: List[GitIgnore]) -> Iterator[Path]:
+        gitignore = GitIgnore.load(directory)
+        if gitignore is not None:
+            rules = rules + [gitignore]
+        try:
+            with os.scandir(directory) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning("Error processing directory %s: %s", directory, e)
+            return
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if (entry.name.startswith('.') or entry.name in IGNORED_DIRECTORIES
+                        or self._ignored(rules, entry.path, True)):
+                    continue
+                yield from self._walk(entry.path, rules)
+            elif entry.is_file() and entry.name.endswith(self.suffixes):
+                self.files_scanned += 1
+                if (entry.name.endswith(IGNORED_FILE_SUFFIXES)
+                        or self._ignored(rules, entry.path, False)):
+                    self.files_ignored += 1
+                elif self.reader.search(entry.path, _KEYWORDS_RE):
+                    yield Path(entry.path)
+                else:
+                    self.files_prefiltered += 1
+
+
+def discover_route_files(root: str, repo_root: Optional[str] = None) -> List[Path]:
+    return list(RouteFileScanner(root, repo_root).iter_files())
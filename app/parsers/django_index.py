@@ -0,0 +1,549 @@
+import ast
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.parsers.controller_index import byte_offsets
+from app.parsers.file_access import FileReader
+
+logger = logging.getLogger(__name__)
+
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete', 'head', 'options')
+URL_FUNCTIONS = {'path', 're_path', 'url'}
+RESPONSE_CLASSES = {'Response', 'JsonResponse', 'HttpResponse'}
+# decorators that restrict a function view to fixed methods
+METHOD_DECORATORS = {'require_GET': ['GET'], 'require_POST': ['POST'],
+                     'require_safe': ['GET', 'HEAD']}
+LOGIN_DECORATORS = {'login_required', 'permission_required', 'user_passes_test'}
+LOGIN_MIXINS = {'LoginRequiredMixin', 'PermissionRequiredMixin', 'UserPassesTestMixin'}
+STATUS_CONSTANT = re.compile(r'HTTP_(\d{3})')
+# directories that never hold project code
+SKIP_DIRECTORIES = {
+    '__pycache__', 'node_modules', 'venv', 'env', 'site-packages', 'migrations',
+}
+
+
+def _name(node: ast.AST) -> Optional[str]:
+    """
+    Last component of a name or attribute chain: `serializers.CharField` ->
+    'CharField'
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Call):
+        return _name(node.func)
+    return None
+
+
+def _dotted(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+def _strings(node: Optional[ast.AST]) -> List[str]:
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return [element.value for element in node.elts
+                if isinstance(element, ast.Constant) and isinstance(element.value, str)]
+    return []
+
+
+def _status_code(node: ast.AST) -> Optional[int]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    match = STATUS_CONSTANT.search(_dotted(node) or '')
+    return int(match.group(1)) if match else None
+
+
+class UrlPattern:
+    def __init__(self, route: str, view: Optional[str], view_attr: Optional[str],
+                 name: Optional[str], include: Optional[str], line: int):
+        self.route = route
+        # local name the view is referenced by in the urls module, and the
+        # attribute taken from it: `views.item_list` -> ('views', 'item_list')
+        self.view = view
+        self.view_attr = view_attr
+        self.name = name
+        # dotted module of an include('app.urls'), for nested url confs
+        self.include = include
+        self.line = line
+
+
+class HandlerFacts:
+    """
+    What a view function or class-based view method reads from the request
+    and what it responds with, extracted once while the file is indexed
+    """
+
+    def __init__(self):
+        self.serializers: List[str] = []
+        self.body_fields: List[str] = []
+        self.query_fields: List[str] = []
+        self.header_fields: List[str] = []
+        self.reads_post = False
+        self.reads_get = False
+        self.reads_headers = False
+        # (response class, status code, body dict keys or None, returns serializer data)
+        self.responses: List[Tuple[str, Optional[int], Optional[List[str]], bool]] = []
+
+
+class ViewDefinition:
+    def __init__(self, name: str, file: str, code: Tuple[str, int, int], methods: List[str],
+                 auth_required: bool, handlers: Dict[str, HandlerFacts],
+                 class_based: bool):
+        self.name = name
+        self.file = file
+        # source of the view and its byte span in the file
+        self.code, self.start, self.end = code
+        self.methods = methods
+        self.auth_required = auth_required
+        # HTTP method -> facts of the code handling it
+        self.handlers = handlers
+        self.class_based = class_based
+
+
+class SerializerDefinition:
+    def __init__(self, name: str, file: str, fields: List[str]):
+        self.name = name
+        self.file = file
+        self.fields = fields
+
+
+class PythonModule:
+    """
+    Everything the Django extractor needs from one Python file
+    """
+
+    def __init__(self, path: str, module: str):
+        self.path = path
+        self.module = module
+        # local name -> (absolute module, attribute or None)
+        self.imports: Dict[str, Tuple[str, Optional[str]]] = {}
+        self.urlpatterns: List[UrlPattern] = []
+        self.views: Dict[str, ViewDefinition] = {}
+        self.serializers: Dict[str, SerializerDefinition] = {}
+
+
+def _resolve_relative(module: str, is_package: bool, target: Optional[str], level: int) -> str:
+    if level == 0:
+        return target or ''
+    parts = module.split('.')
+    # a package's own module name is its __init__
+    base = parts if is_package else parts[:-1]
+    base = base[:len(base) - (level - 1)] if level > 1 else base
+    return '.'.join(part for part in base + ([target] if target else []) if part)
+
+
+def _collect_handler_facts(function: ast.AST) -> HandlerFacts:
+    facts = HandlerFacts()
+    calls = []
+    for node in ast.walk(function):
+        if isinstance(node, ast.Call):
+            calls.append(node)
+        elif isinstance(node, ast.Attribute) and _dotted(node.value) == 'request':
+            if node.attr == 'POST':
+                facts.reads_post = True
+            elif node.attr in ('GET', 'query_params'):
+                facts.reads_get = True
+            elif node.attr in ('headers', 'META'):
+                facts.reads_headers = True
+        elif isinstance(node, ast.Subscript):
+            source = _dotted(node.value)
+            key = node.slice
+            if isinstance(key, ast.Constant) and isinstance(key.value, str):
+                _record_field(facts, source, key.value)
+
+    # ast.walk is breadth first; keep the responses in source order
+    for call in sorted(calls, key=lambda node: (node.lineno, node.col_offset)):
+        name = _name(call.func)
+        if name is None:
+            continue
+        if name.endswith('Serializer') and name not in facts.serializers:
+            facts.serializers.append(name)
+        elif name == 'get' and isinstance(call.func, ast.Attribute) and call.args:
+            key = call.args[0]
+            if isinstance(key, ast.Constant) and isinstance(key.value, str):
+                _record_field(facts, _dotted(call.func.value), key.value)
+        elif name in RESPONSE_CLASSES:
+            status = next((_status_code(keyword.value) for keyword in call.keywords
+                           if keyword.arg == 'status'), None)
+            if status is None and len(call.args) > 1:
+                status = _status_code(call.args[1])
+            keys = None
+            from_serializer = False
+            if call.args:
+                first = call.args[0]
+                if isinstance(first, ast.Dict):
+                    keys = [key.value for key in first.keys
+                            if isinstance(key, ast.Constant) and isinstance(key.value, str)]
+                # serializer.data, or ItemSerializer(item).data
+                from_serializer = isinstance(first, ast.Attribute) and first.attr == 'data' \
+                    and _dotted(first.value) != 'request'
+            facts.responses.append((name, status, keys, from_serializer))
+    return facts
+
+
+def _record_field(facts: HandlerFacts, source: Optional[str], field: str) -> None:
+    if source in ('request.data', 'request.POST'):
+        target = facts.body_fields
+    elif source in ('request.GET', 'request.query_params'):
+        target = facts.query_fields
+    elif source in ('request.headers', 'request.META'):
+        target = facts.header_fields
+    else:
+        return
+    if field not in target:
+        target.append(field)
+
+
+class SourceLines:
+    """
+    Line starts of a file, to cut definitions out of it by line numbers
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.starts = [0] + [match.end() for match in re.finditer('\n', source)]
+
+    def segment(self, first_line: int, last_line: int) -> Tuple[str, int, int]:
+        """
+        Text of the lines and its byte span in the file
+        """
+        start = self.starts[first_line - 1]
+        end = self.starts[last_line] if last_line < len(self.starts) else len(self.source)
+        code = self.source[start:end].rstrip('\r\n')
+        byte_start, byte_end = byte_offsets(self.source, [start, start + len(code)])
+        return code, byte_start, byte_end
+
+
+def _source_with_decorators(lines: SourceLines, node: ast.AST) -> Tuple[str, int, int]:
+    start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+    return lines.segment(start, node.end_lineno)
+
+
+def _function_view(node: ast.FunctionDef, path: str, lines: SourceLines) -> Optional[ViewDefinition]:
+    decorators = {_name(decorator): decorator for decorator in node.decorator_list}
+    arguments = [argument.arg for argument in node.args.args]
+    if not (arguments and arguments[0] == 'request') and 'api_view' not in decorators:
+        return None
+
+    methods = ['GET']
+    if isinstance(decorators.get('api_view'), ast.Call) and decorators['api_view'].args:
+        methods = [method.upper() for method in _strings(decorators['api_view'].args[0])] or methods
+    elif isinstance(decorators.get('require_http_methods'), ast.Call) \
+            and decorators['require_http_methods'].args:
+        methods = [method.upper()
+                   for method in _strings(decorators['require_http_methods'].args[0])] or methods
+    else:
+        for decorator, fixed in METHOD_DECORATORS.items():
+            if decorator in decorators:
+                methods = fixed
+
+    auth_required = bool(LOGIN_DECORATORS.intersection(decorators))
+    permissions = decorators.get('permission_classes')
+    if isinstance(permissions, ast.Call) and permissions.args:
+        elements = getattr(permissions.args[0], 'elts', [])
+        auth_required = auth_required or any(
+            _name(element) != 'AllowAny' for element in elements)
+
+    facts = _collect_handler_facts(node)
+    return ViewDefinition(
+        name=node.name,
+        file=path,
+        code=_source_with_decorators(lines, node),
+        methods=methods,
+        auth_required=auth_required,
+        handlers={method: facts for method in methods},
+        class_based=False,
+    )
+
+
+def _class_view(node: ast.ClassDef, path: str, lines: SourceLines) -> Optional[ViewDefinition]:
+    handlers = {}
+    auth_required = any(_name(base) in LOGIN_MIXINS for base in node.bases)
+    for statement in node.body:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)) \
+                and statement.name in HTTP_METHODS:
+            handlers[statement.name.upper()] = _collect_handler_facts(statement)
+        elif isinstance(statement, ast.Assign) and any(
+                _name(target) == 'permission_classes' for target in statement.targets):
+            elements = getattr(statement.value, 'elts', [])
+            auth_required = auth_required or any(
+                _name(element) != 'AllowAny' for element in elements)
+    if not handlers:
+        return None
+    return ViewDefinition(
+        name=node.name,
+        file=path,
+        code=_source_with_decorators(lines, node),
+        methods=list(handlers),
+        auth_required=auth_required,
+        handlers=handlers,
+        class_based=True,
+    )
+
+
+def _serializer(node: ast.ClassDef, path: str) -> Optional[SerializerDefinition]:
+    if not any((_name(base) or '').endswith('Serializer') for base in node.bases):
+        return None
+    fields = []
+    for statement in node.body:
+        if isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Call):
+            field_class = _name(statement.value.func) or ''
+            if field_class.endswith(('Field', 'Serializer')) \
+                    or (_dotted(statement.value.func) or '').startswith('serializers.'):
+                fields += [target.id for target in statement.targets
+                           if isinstance(target, ast.Name)]
+        elif isinstance(statement, ast.ClassDef) and statement.name == 'Meta':
+            for meta in statement.body:
+                if isinstance(meta, ast.Assign) and any(
+                        _name(target) == 'fields' for target in meta.targets):
+                    fields += [field for field in _strings(meta.value) if field not in fields]
+    return SerializerDefinition(node.name, path, fields)
+
+
+def _url_pattern(call: ast.Call) -> Optional[UrlPattern]:
+    if _name(call.func) not in URL_FUNCTIONS or len(call.args) < 2:
+        return None
+    route = call.args[0]
+    if not (isinstance(route, ast.Constant) and isinstance(route.value, str)):
+        return None
+    name = next((keyword.value.value for keyword in call.keywords
+                 if keyword.arg == 'name' and isinstance(keyword.value, ast.Constant)), None)
+    target = call.args[1]
+    view, view_attr, include = None, None, None
+    if isinstance(target, ast.Call) and _name(target.func) == 'include':
+        if target.args and isinstance(target.args[0], ast.Constant):
+            include = target.args[0].value
+        elif target.args and isinstance(target.args[0], ast.Tuple) and target.args[0].elts \
+                and isinstance(target.args[0].elts[0], ast.Constant):
+            include = target.args[0].elts[0].value
+        if not isinstance(include, str):
+            return None
+    else:
+        if isinstance(target, ast.Call) and _name(target.func) == 'as_view':
+            # ItemView.as_view()
+            target = target.func.value
+        if isinstance(target, ast.Name):
+            view = target.id
+        elif isinstance(target, ast.Attribute):
+            view, view_attr = _dotted(target.value), target.attr
+        else:
+            return None
+    return UrlPattern(route.value, view, view_attr, name, include, call.lineno)
+
+
+def scan_python_file(path: str, module: str, source: str) -> PythonModule:
+    """
+    Record the imports, url patterns, views and serializers of one file
+    """
+    record = PythonModule(path, module)
+    try:
+        tree = ast.parse(source, filename=path)
+    except (SyntaxError, ValueError) as e:
+        logger.warning("Skipping %s: %s", path, e)
+        return record
+
+    lines = SourceLines(source)
+    is_package = os.path.basename(path) == '__init__.py'
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom):
+            base = _resolve_relative(module, is_package, node.module, node.level)
+            for alias in node.names:
+                record.imports[alias.asname or alias.name] = (base, alias.name)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                record.imports[alias.asname or alias.name.split('.')[0]] = (
+                    alias.name if alias.asname else alias.name.split('.')[0], None)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            view = _function_view(node, path, lines)
+            if view is not None:
+                record.views[view.name] = view
+        elif isinstance(node, ast.ClassDef):
+            serializer = _serializer(node, path)
+            if serializer is not None:
+                record.serializers[serializer.name] = serializer
+                continue
+            view = _class_view(node, path, lines)
+            if view is not None:
+                record.views[view.name] = view
+
+    # urlpatterns = [...] and urlpatterns += [...], in source order
+    for node in tree.body:
+        targets = []
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign)):
+            targets = [node.target]
+        if not any(_name(target) == 'urlpatterns' for target in targets):
+            continue
+        calls = [child for child in ast.walk(node.value) if isinstance(child, ast.Call)]
+        for call in sorted(calls, key=lambda child: (child.lineno, child.col_offset)):
+            pattern = _url_pattern(call)
+            if pattern is not None:
+                record.urlpatterns.append(pattern)
+    return record
+
+
+def _module_name(relative: Path) -> str:
+    parts = list(relative.with_suffix('').parts)
+    if parts and parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+class DjangoProjectIndex:
+    """
+    Urlpatterns, views and serializers of a whole Django project, built by
+    reading and parsing each Python file exactly once
+    """
+
+    def __init__(self, project_root: str, reader: Optional[FileReader] = None):
+        self.project_root = project_root
+        self.reader = reader or FileReader()
+        # dotted module name -> scanned file, in walk order
+        self.modules: Dict[str, PythonModule] = {}
+        self.serializers: Dict[str, SerializerDefinition] = {}
+        self.views: Dict[str, ViewDefinition] = {}
+        self.files_read = 0
+
+    def build(self) -> 'DjangoProjectIndex':
+        for directory, directories, files in os.walk(self.project_root):
+            directories[:] = sorted(
+                name for name in directories
+                if not name.startswith('.') and name not in SKIP_DIRECTORIES
+            )
+            for file_name in sorted(files):
+                if file_name.endswith('.py'):
+                    self.add_file(os.path.join(directory, file_name))
+        return self
+
+    def add_file(self, path: str) -> None:
+        source = self.reader.read_text(path)
+        if source is None:
+            return
+        self.files_read += 1
+        module = _module_name(Path(os.path.relpath(path, self.project_root)))
+        record = scan_python_file(path, module, source)
+        self.modules[module] = record
+        # project-wide tables; the first definition of a name wins
+        for name, serializer in record.serializers.items():
+            self.serializers.setdefault(name, serializer)
+        for name, view in record.views.items():
+            self.views.setdefault(name, view)
+
+    def find_module(self, dotted: str) -> Optional[PythonModule]:
+        """
+        A module by dotted name. Imports are relative to the directory of
+        manage.py, which need not be the repository root, so a unique suffix
+        match is accepted too.
+        """
+        if dotted in self.modules:
+            return self.modules[dotted]
+        suffix = '.' + dotted
+        matches = [module for name, module in self.modules.items() if name.endswith(suffix)]
+        return matches[0] if len(matches) == 1 else None
+
+    def url_modules(self) -> List[PythonModule]:
+        return [module for module in self.modules.values() if module.urlpatterns]
+
+    def resolve_view(self, urls: PythonModule, pattern: UrlPattern) -> Optional[ViewDefinition]:
+        """
+        Follow the urls module's imports to the view a pattern points at,
+        falling back to the project-wide table by name
+        """
+        if pattern.view is None:
+            return None
+        if pattern.view_attr is None:
+            name = pattern.view
+            if name in urls.views:
+                return urls.views[name]
+            source = urls.imports.get(name)
+            if source is not None:
+                module = self.find_module(source[0])
+                if module is not None and source[1] in module.views:
+                    return module.views[source[1]]
+            return self.views.get(name)
+
+        name = pattern.view_attr
+        head = pattern.view.split('.')[0]
+        source = urls.imports.get(head)
+        if source is not None:
+            dotted = source[0] if source[1] is None else f"{source[0]}.{source[1]}"
+            dotted = '.'.join([dotted] + pattern.view.split('.')[1:])
+            module = self.find_module(dotted)
+            if module is not None and name in module.views:
+                return module.views[name]
+        return self.views.get(name)
+
+
+def index_django_project(project_root: str,
+                         reader: Optional[FileReader] = None) -> DjangoProjectIndex:
+    return DjangoProjectIndex(str(project_root), reader).build()
+
+
+def join_routes(prefix: str, route: str) -> str:
+    """
+    Route of a pattern in an included url conf; re_path anchors are dropped
+    at the join
+    """
+    if not prefix:
+        return route
+    return prefix.rstrip('$') + route.lstrip('^')
+
+
+def route_parameters(route: str) -> List[str]:
+    """
+    Names of the captured parameters of a path() or re_path() route
+    """
+    names = re.findall(r'<(?:\w+:)?(\w+)>', route)
+    names += [name for name in re.findall(r'\(\?P<(\w+)>', route) if name not in names]
+    return names
+
+
+def describe_handler(facts: HandlerFacts, serializers: Dict[str, SerializerDefinition],
+                     route: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Join a handler's facts with the serializers it uses into the request
+    data and expected responses of an API specification
+    """
+    fields: Dict[str, str] = {}
+    for name in facts.serializers:
+        serializer = serializers.get(name)
+        if serializer is not None:
+            fields.update({field: "sample_value" for field in serializer.fields})
+
+    request_data: Dict[str, Any] = {"body": dict(fields), "params": {}, "headers": {}, "query": {}}
+    request_data["body"].update({field: "sample_value" for field in facts.body_fields})
+    if facts.reads_post and not request_data["body"]:
+        request_data["body"] = {"example_field": "sample_value"}
+    request_data["params"] = {name: "sample_value" for name in route_parameters(route)}
+    if facts.query_fields:
+        request_data["query"] = {field: "sample_value" for field in facts.query_fields}
+    elif facts.reads_get:
+        request_data["query"] = {"query_param": "sample_value"}
+    if facts.header_fields:
+        request_data["headers"] = {field: "sample_value" for field in facts.header_fields}
+    elif facts.reads_headers:
+        request_data["headers"] = {"Authorization": "Bearer token"}
+
+    responses = []
+    for response_class, status, keys, from_serializer in facts.responses:
+        if keys is not None:
+            body: Any = {key: "unknown" for key in keys}
+        elif from_serializer and fields:
+            body = dict(fields)
+        elif response_class == "JsonResponse":
+            body = dict(fields) or {"key": "value"}
+        else:
+            body = "Sample response content"
+        responses.append({"status_code": status or 200, "body": body})
+    if not responses:
+        responses.append({"status_code": 200, "body": dict(fields)})
+    return request_data, responses
@@ -0,0 +1,144 @@
+import logging
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# larger files are not parsed at all
+DEFAULT_MAX_FILE_BYTES = 2 * 1024 * 1024
+# files at least this large are memory-mapped instead of read into memory
+DEFAULT_MMAP_MIN_BYTES = 256 * 1024
+
+# why a file was not parsed
+SKIP_TOO_LARGE = 'too_large'
+SKIP_BINARY = 'binary'
+SKIP_MINIFIED = 'minified'
+SKIP_UNREADABLE = 'unreadable'
+SKIP_OUTSIDE_ROOT = 'outside_root'
+
+# content is judged by its first bytes only
+SNIFF_BYTES = 64 * 1024
+# hand-written source stays far below either of these; bundlers do not
+MINIFIED_AVERAGE_LINE = 300
+MINIFIED_LONGEST_LINE = 5000
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+def sniff(data: Buffer) -> Optional[str]:
+    """
+    SKIP_BINARY or SKIP_MINIFIED if the start of a file looks like either,
+    else None
+    """
+    sample = data[:SNIFF_BYTES]
+    if b'\0' in sample:
+        return SKIP_BINARY
+    if len(sample) < 1024:
+        return None
+    lines = sample.split(b'\n')
+    if (len(sample) / len(lines) > MINIFIED_AVERAGE_LINE
+            or max(map(len, lines)) > MINIFIED_LONGEST_LINE):
+        return SKIP_MINIFIED
+    return None
+
+
+class FileReader:
+    """
+    Shared file access for the parsers. Files over max_bytes are never
+    opened, large ones are memory-mapped so they can be searched without
+    being copied, and binary or minified content is not decoded. Every file
+    passed over is recorded in skipped_files with the reason.
+
+    With a root, files that resolve outside it, through a symlink in the
+    tree, are passed over too, so a checkout or upload cannot make the
+    parsers read other files of the server.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                 mmap_min_bytes: int = DEFAULT_MMAP_MIN_BYTES,
+                 root: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.mmap_min_bytes = mmap_min_bytes
+        self.root = os.path.realpath(root) if root is not None else None
+        # path -> {'file', 'reason', 'size'}
+        self.skipped_files: Dict[str, Dict[str, Any]] = {}
+
+    def skip(self, path: str, reason: str, size: Optional[int] = None) -> None:
+        if path not in self.skipped_files:
+            logger.info("Skipping %s: %s", path, reason)
+        self.skipped_files[str(path)] = {'file': str(path), 'reason': reason, 'size': size}
+
+    def _within_root(self, path: str) -> bool:
+        if self.root is None:
+            return True
+        real = os.path.realpath(path)
+        return real == self.root or real.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    @contextmanager
+    def open_bytes(self, path: str) -> Iterator[Optional[Buffer]]:
+        """
+        The content of a file as bytes or a read-only memory map, or None if
+        it is over the size budget or cannot be read. The map is closed when
+        the block exits, so nothing taken from it may outlive the block
+        except copies.
+        """
+        path = str(path)
+        if not self._within_root(path):
+            self.skip(path, SKIP_OUTSIDE_ROOT)
+            yield None
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning("Error reading file %s: %s", path, e)
+            self.skip(path, SKIP_UNREADABLE)
+            yield None
+            return
+        if size > self.max_bytes:
+            self.skip(path, SKIP_TOO_LARGE, size)
+            yield None
+            return
+
+        try:
+            file = open(path, 'rb')
+        except OSError as e:
+            logger.warning("Error reading file %s: %s", path, e)
+            self.skip(path, SKIP_UNREADABLE, size)
+            yield None
+            return
+        with file:
+            if size < self.mmap_min_bytes:
+                yield file.read()
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def search(self, path: str, pattern: 're.Pattern[bytes]') -> bool:
+        """
+        Whether a bytes pattern occurs in a file, searched in place
+        """
+        with self.open_bytes(path) as data:
+            return data is not None and pattern.search(data) is not None
+
+    def read_text(self, path: str) -> Optional[str]:
+        """
+        The decoded content of a source file, or None if it is skipped
+        """
+        with self.open_bytes(path) as data:
+            if data is None:
+                return None
+            reason = sniff(data)
+            if reason is not None:
+                self.skip(str(path), reason, len(data))
+                return None
+            try:
+                return data[:].decode('utf-8')
+            except UnicodeDecodeError:
+                self.skip(str(path), SKIP_UNREADABLE, len(data))
+                return None
+
+    def skipped(self) -> List[Dict[str, Any]]:
+        return list(self.skipped_files.values())
@@ -0,0 +1,330 @@
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+
+INLINE_FUNCTION = re.compile(r'^(?:async\s+)?function\b')
+IDENTIFIER = re.compile(r'[A-Za-z_$][\w$]*')
+NUMBER = re.compile(r'\d[\w.]*')
+
+OPENERS = {'(': ')', '[': ']', '{': '}'}
+CLOSERS = {')': '(', ']': '[', '}': '{'}
+
+# after these keywords a '/' starts a regex literal, not a division
+REGEX_KEYWORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+
+ROUTE_CALL = re.compile(r'\b(router|app)\s*\.\s*(get|post|put|patch|delete)\s*\(')
+MIDDLEWARE_CALL = re.compile(r'\b(?:router|app)\s*\.\s*use\s*\(')
+FUNCTION_DEFINITIONS = [
+    # const name = async (req, res) => {   /   const name = req => {
+    re.compile(r'\b(?:const|let|var)\s+([\w$]+)\s*=\s*(?:async\s*)?'
+               r'(?:\([^()]*\)|[\w$]+)\s*=>\s*\{'),
+    # const name = async function (req, res) {
+    re.compile(r'\b(?:const|let|var)\s+([\w$]+)\s*=\s*(?:async\s+)?'
+               r'function\b[^(]*\([^()]*\)\s*\{'),
+    # async function name(req, res) {
+    re.compile(r'(?:\basync\s+)?\bfunction\s+([\w$]+)\s*\([^()]*\)\s*\{'),
+    # exports.name = async (req, res) => {
+    re.compile(r'\b(?:module\.)?exports\.([\w$]+)\s*=\s*(?:async\s*)?'
+               r'(?:\([^()]*\)|[\w$]+)\s*=>\s*\{'),
+]
+
+
+class JSScan:
+    """
+    Single left-to-right pass over JavaScript source that knows about
+    strings, template literals, regex literals and comments. Records which
+    spans are not code and matches every bracket pair, so callers can find
+    constructs with true brace matching instead of backtracking regexes.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        # open bracket index -> matching close bracket index
+        self.pairs: Dict[int, int] = {}
+        # sorted, non-overlapping (start, end) spans of strings/comments/regexes
+        self._skip_starts: List[int] = []
+        self._skip_ends: List[int] = []
+        # sorted indexes of brackets and commas that are code
+        self.punctuation: List[int] = []
+        self._scan()
+
+    def _skip(self, start: int, end: int) -> None:
+        self._skip_starts.append(start)
+        self._skip_ends.append(end)
+
+    def is_code(self, index: int) -> bool:
+        position = bisect_right(self._skip_starts, index) - 1
+        return position < 0 or index >= self._skip_ends[position]
+
+    def _scan_string(self, start: int, quote: str) -> int:
+        source, n = self.source, len(self.source)
+        i = start + 1
+        while i < n:
+            char = source[i]
+            if char == '\\':
+                i += 2
+            elif char == quote or char == '\n':
+                return i + 1
+            else:
+                i += 1
+        return n
+
+    def _scan_template(self, start: int) -> Tuple[int, bool]:
+        """
+        Scan template text from start; returns the end index and whether the
+        text stopped at a '${' substitution
+        """
+        source, n = self.source, len(self.source)
+        i = start
+        while i < n:
+            char = source[i]
+            if char == '\\':
+                i += 2
+            elif char == '`':
+                return i + 1, False
+            elif char == '$' and i + 1 < n and source[i + 1] == '{':
+                return i, True
+            else:
+                i += 1
+        return n, False
+
+    def _scan_regex(self, start: int) -> int:
+        source, n = self.source, len(self.source)
+        i = start + 1
+        in_class = False
+        while i < n:
+            char = source[i]
+            if char == '\\':
+                i += 2
+                continue
+            if char == '\n':
+                return i
+            if in_class:
+                if char == ']':
+                    in_class = False
+            elif char == '[':
+                in_class = True
+            elif char == '/':
+                i += 1
+                while i < n and (source[i].isalnum() or source[i] == '_'):
+                    i += 1
+                return i
+            i += 1
+        return n
+
+    def _scan(self) -> None:
+        source, n = self.source, len(self.source)
+        stack: List[int] = []
+        # stack depths at which a template substitution `${` was opened
+        templates: List[int] = []
+        # kind of the previous significant token, for regex detection
+        previous: Optional[str] = None
+        i = 0
+        while i < n:
+            char = source[i]
+            if char in ' \t\r\n':
+                i += 1
+            elif char == '/' and source.startswith('//', i):
+                end = source.find('\n', i)
+                end = n if end == -1 else end
+                self._skip(i, end)
+                i = end
+            elif char == '/' and source.startswith('/*', i):
+                end = source.find('*/', i + 2)
+                end = n if end == -1 else end + 2
+                self._skip(i, end)
+                i = end
+            elif char == '"' or char == "'":
+                end = self._scan_string(i, char)
+                self._skip(i, end)
+                previous = 'value'
+                i = end
+            elif char == '`':
+                end, substitution = self._scan_template(i + 1)
+                self._skip(i, end)
+                if substitution:
+                    templates.append(len(stack))
+                    stack.append(end + 1)
+                    self.punctuation.append(end + 1)
+                    previous = '{'
+                    i = end + 2
+                else:
+                    previous = 'value'
+                    i = end
+            elif char == '/':
+                if previous is None or previous in REGEX_KEYWORDS or previous in '([{,;:=!&|?+-*%<>~^':
+                    end = self._scan_regex(i)
+                    self._skip(i, end)
+                    previous = 'value'
+                    i = end
+                else:
+                    previous = '/'
+                    i += 1
+            elif char in OPENERS:
+                stack.append(i)
+                self.punctuation.append(i)
+                previous = char
+                i += 1
+            elif char in CLOSERS:
+                if stack and source[stack[-1]] == CLOSERS[char]:
+                    opened = stack.pop()
+                    self.pairs[opened] = i
+                    self.punctuation.append(i)
+                    if templates and templates[-1] == len(stack):
+                        # end of a `${...}` substitution; back to template text
+                        templates.pop()
+                        end, substitution = self._scan_template(i + 1)
+                        self._skip(i + 1, end)
+                        if substitution:
+                            templates.append(len(stack))
+                            stack.append(end + 1)
+                            self.punctuation.append(end + 1)
+                            previous = '{'
+                            i = end + 2
+                        else:
+                            previous = 'value'
+                            i = end
+                        continue
+                previous = ')' if char == ')' else 'value'
+                i += 1
+            elif char == ',':
+                self.punctuation.append(i)
+                previous = ','
+                i += 1
+            else:
+                match = IDENTIFIER.match(source, i) or NUMBER.match(source, i)
+                if match:
+                    word = match.group(0)
+                    previous = word if word in REGEX_KEYWORDS else 'value'
+                    i = match.end()
+                else:
+                    previous = char
+                    i += 1
+
+    def match_bracket(self, index: int) -> Optional[int]:
+        return self.pairs.get(index)
+
+    def split_arguments(self, open_index: int) -> List[Tuple[int, int]]:
+        """
+        Spans of the top-level, comma-separated arguments of the call whose
+        opening parenthesis is at open_index
+        """
+        close_index = self.pairs.get(open_index)
+        if close_index is None:
+            return []
+        arguments = []
+        start = open_index + 1
+        position = bisect_right(self.punctuation, open_index)
+        while position < len(self.punctuation):
+            index = self.punctuation[position]
+            if index >= close_index:
+                break
+            char = self.source[index]
+            if char in OPENERS:
+                end = self.pairs.get(index)
+                if end is None:
+                    break
+                position = bisect_right(self.punctuation, end)
+                continue
+            if char == ',':
+                arguments.append((start, index))
+                start = index + 1
+            position += 1
+        arguments.append((start, close_index))
+        return [
+            (s, e) for s, e in (_strip(self.source, s, e) for s, e in arguments) if s < e
+        ]
+
+
+def _strip(source: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and source[start].isspace():
+        start += 1
+    while end > start and source[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _string_literal(text: str) -> Optional[str]:
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '\'"`':
+        return text[1:-1]
+    return None
+
+
+def find_route_calls(source: str, scan: Optional[JSScan] = None) -> List[Dict[str, object]]:
+    """
+    Find `router.get('/path', ..., handler)` style calls. The handler is the
+    last argument; arguments between the path and the handler are route
+    level middleware.
+    """
+    scan = scan or JSScan(source)
+    routes = []
+    for match in ROUTE_CALL.finditer(source):
+        if not scan.is_code(match.start()):
+            continue
+        arguments = scan.split_arguments(match.end() - 1)
+        if len(arguments) < 2:
+            continue
+        path = _string_literal(source[arguments[0][0]:arguments[0][1]])
+        if path is None:
+            continue
+        handler_start, handler_end = arguments[-1]
+        handler = source[handler_start:handler_end]
+        routes.append({
+            'method': match.group(2).lower(),
+            'endpoint': path,
+            'handler': handler,
+            'handler_span': (handler_start, handler_end),
+            'inline': '=>' in handler or bool(INLINE_FUNCTION.match(handler)),
+            'middleware': [source[s:e] for s, e in arguments[1:-1]],
+        })
+    return routes
+
+
+def find_middleware_calls(source: str, scan: Optional[JSScan] = None) -> List[str]:
+    """
+    Argument text of every `app.use(...)` / `router.use(...)` call
+    """
+    scan = scan or JSScan(source)
+    middleware = []
+    for match in MIDDLEWARE_CALL.finditer(source):
+        if not scan.is_code(match.start()):
+            continue
+        open_index = match.end() - 1
+        close_index = scan.match_bracket(open_index)
+        if close_index is None:
+            continue
+        text = source[open_index + 1:close_index].strip()
+        if text:
+            middleware.append(text)
+    return middleware
+
+
+def find_function_definitions(source: str, scan: Optional[JSScan] = None) -> List[Dict[str, object]]:
+    """
+    Named handler definitions with the span from the declaration to the
+    closing brace of the body, in source order. The first definition of a
+    name wins.
+    """
+    scan = scan or JSScan(source)
+    found: Dict[str, Dict[str, object]] = {}
+    for pattern in FUNCTION_DEFINITIONS:
+        for match in pattern.finditer(source):
+            name = match.group(1)
+            if not scan.is_code(match.start()):
+                continue
+            close_index = scan.match_bracket(match.end() - 1)
+            if close_index is None:
+                continue
+            if name in found and found[name]['start'] < match.start():
+                continue
+            found[name] = {
+                'name': name,
+                'start': match.start(),
+                'end': close_index + 1,
+            }
+    return sorted(found.values(), key=lambda definition: definition['start'])
+
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.metrics import PARSE_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# part of every key; bump it whenever what the parsers extract from a file
+# changes, so results of the old parser are never served
+PARSER_VERSION = '1'
+
+# pending writes are committed in one transaction once this many pile up
+FLUSH_EVERY = 256
+# the table is counted, and trimmed to max_entries, only once a process has
+# written this many rows, or a tenth of max_entries, since it last did;
+# workers flush after every task
+EVICT_CHECK_EVERY = 1024
+# a hit only refreshes the entry's last use when it is older than this, so
+# reads do not turn into writes
+TOUCH_INTERVAL = 60 * 60
+
+
+def blob_sha(content: str) -> str:
+    """
+    The git blob id of content, so a file hashes the same whichever
+    repository or fork it is in
+    """
+    data = content.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class ParseCache:
+    """
+    Per-file parse results keyed by (kind, parser version, blob id of the
+    file content), persisted in SQLite so process pool workers and later
+    runs share them, with an in-process LRU in front. The least recently
+    used entries beyond max_entries are evicted. That is checked only every
+    so many writes, so the table can briefly run over by about a tenth.
+
+    Failures of the store are logged and otherwise ignored: a broken cache
+    only costs a re-parse.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000, memory_size: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._pending: List[Tuple[str, str, int]] = []
+        # rows written since the table was last counted
+        self._unchecked_writes = 0
+        self._check_every = max(1, min(EVICT_CHECK_EVERY, max_entries // 10))
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # parsing runs in worker threads; every use holds the lock
+            self._connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS parse_cache ('
+                ' key TEXT PRIMARY KEY, value TEXT NOT NULL, used_at INTEGER NOT NULL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS parse_cache_used_at ON parse_cache (used_at)')
+            self._connection.commit()
+        except sqlite3.Error as e:
+            logger.warning("Parse cache at %s is unavailable: %s", path, e)
+            self._connection = None
+
+    @staticmethod
+    def key(kind: str, content: str) -> str:
+        return f"{kind}:{PARSER_VERSION}:{blob_sha(content)}"
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, kind: str, content: str) -> Optional[Any]:
+        value = self._get(self.key(kind, content))
+        PARSE_CACHE_LOOKUPS.labels(kind=kind, outcome='miss' if value is None else 'hit').inc()
+        return value
+
+    def _get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            row = None
+            if self._connection is not None:
+                try:
+                    row = self._connection.execute(
+                        'SELECT value, used_at FROM parse_cache WHERE key = ?', (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning("Parse cache read failed: %s", e)
+            if row is None:
+                self.misses += 1
+                return None
+            value = json.loads(row[0])
+            now = int(time.time())
+            if now - row[1] > TOUCH_INTERVAL:
+                self._pending.append((key, row[0], now))
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+    def set(self, kind: str, content: str, value: Any) -> None:
+        key = self.key(kind, content)
+        with self._lock:
+            self._remember(key, value)
+            self._pending.append((key, json.dumps(value, separators=(',', ':')),
+                                  int(time.time())))
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush()
+
+    def flush(self) -> None:
+        """
+        Commit pending writes and evict beyond max_entries
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        if not pending or self._connection is None:
+            return
+        try:
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO parse_cache (key, value, used_at) VALUES (?, ?, ?)',
+                    pending,
+                )
+            self._unchecked_writes += len(pending)
+            if self._unchecked_writes >= self._check_every:
+                self._evict()
+        except sqlite3.Error as e:
+            logger.warning("Parse cache write failed: %s", e)
+
+    def _evict(self) -> None:
+        with self._connection:
+            (count,) = self._connection.execute(
+                'SELECT COUNT(*) FROM parse_cache').fetchone()
+            if count > self.max_entries:
+                self._connection.execute(
+                    'DELETE FROM parse_cache WHERE key IN ('
+                    ' SELECT key FROM parse_cache ORDER BY used_at LIMIT ?)',
+                    (count - self.max_entries,),
+                )
+        self._unchecked_writes = 0
+
+
+# one cache per database file and process
+_caches: Dict[str, ParseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_parse_cache(path: str, max_entries: int) -> ParseCache:
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = ParseCache(path, max_entries)
+        return cache
@@ -0,0 +1,218 @@
+import logging
+import math
+import multiprocessing
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows; CPU limits are not applied
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# outcomes of a supervised task besides 'ok'
+ABORT_TIMEOUT = 'timeout'
+ABORT_CPU_LIMIT = 'cpu_limit'
+ABORT_CRASHED = 'crashed'
+ABORT_ERROR = 'error'
+
+# the signal a process gets for exceeding RLIMIT_CPU, where there is one
+_SIGXCPU = getattr(signal, 'SIGXCPU', None)
+
+
+def _limit_cpu(cpu_seconds: int) -> None:
+    """
+    Let the calling process spend at most cpu_seconds more CPU time before
+    the kernel stops it with SIGXCPU
+    """
+    if resource is None or cpu_seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = math.ceil(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(connection: Connection, cpu_seconds: int) -> None:
+    """
+    Worker process loop: run (function, args) tasks one at a time, each
+    under a fresh CPU budget, and send back ('ok', result) or ('error', ...)
+    """
+    # the parent handles interrupts; a worker just stops with it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        function, args = task
+        _limit_cpu(cpu_seconds)
+        try:
+            outcome = ('ok', function(*args))
+        except Exception as e:
+            outcome = (ABORT_ERROR, repr(e))
+        connection.send(outcome)
+
+
+class _Worker:
+    def __init__(self, context, cpu_seconds: int):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, cpu_seconds),
+                                       daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class ParseSupervisor:
+    """
+    Runs parse tasks in worker processes it watches over, so one
+    pathological file cannot stall a request or the server. Each task gets
+    timeout seconds of wall-clock time and cpu_seconds of CPU time; a worker
+    that overruns either, or dies, is killed and replaced, and its task is
+    reported with the reason instead of a result.
+
+    Workers are spawned on demand, up to max_workers of them, and kept between
+    calls, so steady-state parsing pays no process start-up. Concurrent
+    callers share them.
+    """
+
+    def __init__(self, workers: int, timeout: float, cpu_seconds: int = 0):
+        self.max_workers = max(1, workers)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        # spawn, as forking a process with running threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._idle: List[_Worker] = []
+        self._worker_count = 0
+        self._available = threading.Condition()
+
+    def _acquire(self, wanted: int) -> List[_Worker]:
+        """
+        Up to wanted workers, idle ones first, waiting until at least one
+        is free
+        """
+        with self._available:
+            while not self._idle and self._worker_count >= self.max_workers:
+                self._available.wait()
+            workers = []
+            while len(workers) < wanted and self._idle:
+                workers.append(self._idle.pop())
+            spawn = min(wanted - len(workers), self.max_workers - self._worker_count)
+            self._worker_count += spawn
+        return workers + [self._spawn() for _ in range(spawn)]
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self.cpu_seconds)
+
+    def _release(self, workers: List[_Worker]) -> None:
+        with self._available:
+            self._idle.extend(workers)
+            self._available.notify_all()
+
+    def _discard(self, worker: _Worker) -> None:
+        worker.kill()
+        with self._available:
+            self._worker_count -= 1
+            self._available.notify_all()
+
+    def map(self, function: Callable[..., Any],
+            tasks: Sequence[Tuple[Any, ...]]) -> List[Tuple[str, Any]]:
+        """
+        Run function(*args) for each args in tasks. Returns, in task order,
+        ('ok', result) or (reason, detail) with reason one of the ABORT_*
+        constants. function must be importable by the workers.
+        """
+        outcomes: List[Optional[Tuple[str, Any]]] = [None] * len(tasks)
+        if not tasks:
+            return []
+        pending: Deque[int] = deque(range(len(tasks)))
+        idle = self._acquire(min(self.max_workers, len(tasks)))
+        # worker -> (task index, wall-clock deadline)
+        busy: Dict[_Worker, Tuple[int, float]] = {}
+
+        try:
+            while pending or busy:
+                while pending and idle:
+                    worker = idle.pop()
+                    index = pending.popleft()
+                    worker.connection.send((function, tasks[index]))
+                    busy[worker] = (index, time.monotonic() + self.timeout)
+
+                next_deadline = min(deadline for _, deadline in busy.values())
+                ready = wait([worker.connection for worker in busy],
+                             timeout=max(0.0, next_deadline - time.monotonic()))
+                for worker in list(busy):
+                    index, deadline = busy[worker]
+                    if worker.connection in ready:
+                        try:
+                            outcomes[index] = worker.connection.recv()
+                        except (EOFError, OSError):
+                            worker.process.join()
+                            exitcode = worker.process.exitcode
+                            reason = (ABORT_CPU_LIMIT
+                                      if _SIGXCPU is not None and exitcode == -_SIGXCPU
+                                      else ABORT_CRASHED)
+                            outcomes[index] = (reason, exitcode)
+                            idle.append(self._replace(worker))
+                        else:
+                            idle.append(worker)
+                        del busy[worker]
+                    elif time.monotonic() >= deadline:
+                        outcomes[index] = (ABORT_TIMEOUT, self.timeout)
+                        del busy[worker]
+                        idle.append(self._replace(worker))
+        finally:
+            # tasks still running when the caller gave up are abandoned
+            for worker in busy:
+                self._discard(worker)
+            self._release(idle)
+
+        return outcomes
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        return self._spawn()
+
+    def shutdown(self) -> None:
+        with self._available:
+            workers, self._idle = self._idle, []
+            self._worker_count -= len(workers)
+        for worker in workers:
+            try:
+                worker.connection.send(None)
+            except OSError:
+                pass
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.kill()
+
+
+_supervisors: Dict[Tuple[int, float, int], ParseSupervisor] = {}
+_supervisors_lock = threading.Lock()
+
+
+def get_parse_supervisor(workers: int, timeout: float, cpu_seconds: int = 0) -> ParseSupervisor:
+    """
+    The process-wide supervisor for a configuration
+    """
+    key = (workers, timeout, cpu_seconds)
+    with _supervisors_lock:
+        supervisor = _supervisors.get(key)
+        if supervisor is None:
+            supervisor = _supervisors[key] = ParseSupervisor(workers, timeout, cpu_seconds)
+        return supervisor
@@ -2,6 +2,13 @@ from typing import Dict, Any, List, Optional
 from pydantic import BaseModel, Field
 
 
+class CodeLocation(BaseModel):
+    # file and byte span the controller code was read from
+    file: str
+    start: int
+    end: int
+
+
 class APISpecification(BaseModel):
     endpoint: str
     method: str
@@ -14,6 +21,7 @@ class APISpecification(BaseModel):
     files: str
     api_schema: Dict[str, Any] = Field(default_factory=dict)
     middleware: List[str]
+    controller_location: Optional[CodeLocation] = None
 
 
 class ParseRequestModel(BaseModel):
@@ -21,5 +29,44 @@ class ParseRequestModel(BaseModel):
     framework_type: str
 
 
+class LocalParseRequestModel(BaseModel):
+    # a directory on the server, within one of LOCAL_SOURCE_ROOTS
+    path: str
+    framework_type: str
+
+
+class SkippedFile(BaseModel):
+    file: str
+    # too_large, binary, minified, unreadable or outside_root (a symlink
+    # leaving the source tree), or for a parse that was
+    # aborted: timeout, cpu_limit, crashed or error
+    reason: str
+    size: Optional[int] = None
+
+
 class ApiSpecsResponseModel(BaseModel):
     api_specs: List[APISpecification]
+    skipped_files: List[SkippedFile] = Field(default_factory=list)
+
+
+class JobSubmittedModel(BaseModel):
+    job_id: str
+    status: str
+
+
+class TestRunRequestModel(BaseModel):
+    repo_url: str
+    # the service the test cases are sent to
+    base_url: str
+    # the latest parsed commit when not given
+    commit: Optional[str] = None
+    concurrency: Optional[int] = Field(None, ge=1, le=1000)
+    # requests per second per host
+    rate_limit: Optional[float] = Field(None, ge=0)
+    timeout: Optional[float] = Field(None, gt=0)
+
+
+class TestRunSubmittedModel(BaseModel):
+    run_id: str
+    status: str
+
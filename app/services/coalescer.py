@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import settings
+from app.metrics import PARSE_REQUESTS
+from app.services.pipeline import run_parse_pipeline
+from app.services.repo_utils import GitCommandError, remote_head_commit
+
+logger = logging.getLogger(__name__)
+
+# (repo url, framework type, remote HEAD commit or None if unknown)
+RunKey = Tuple[str, str, Optional[str]]
+
+
+class _Run:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        # requests currently awaiting the task
+        self.waiters = 0
+
+
+class ParseCoalescer:
+    """
+    Runs the parse pipeline once for concurrent requests of the same
+    repository at the same remote HEAD commit. The first request starts the
+    run and later ones attach to it; all of them get its result or its
+    error. A request that is cancelled only detaches, and the run is
+    cancelled once no request is waiting for it any more.
+
+    Successful results are kept for ttl seconds, so requests arriving just
+    after a run finished are served without one. The result is shared
+    between requests and must not be modified.
+
+    When the remote HEAD cannot be resolved, requests for the same URL are
+    still coalesced but their result is not cached.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_results: int = 32):
+        self.ttl = ttl
+        self.max_results = max_results
+        self._runs: Dict[RunKey, _Run] = {}
+        # key -> (expiry, result), least recently stored first
+        self._results: "OrderedDict[RunKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    async def _key(self, repo_url: str, framework_type: str) -> RunKey:
+        try:
+            commit = await remote_head_commit(repo_url)
+        except GitCommandError as e:
+            # the pipeline's clone stage reports the actual problem
+            logger.warning("Resolving HEAD of %s failed: %s", repo_url, e)
+            commit = None
+        return (repo_url.strip(), framework_type.lower(), commit)
+
+    def _cached(self, key: RunKey) -> Optional[Dict[str, Any]]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expiry, result = entry
+        if expiry < time.monotonic():
+            del self._results[key]
+            return None
+        return result
+
+    def _store(self, key: RunKey, result: Dict[str, Any]) -> None:
+        if key[2] is None or self.ttl <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def _start(self, key: RunKey, repo_url: str, framework_type: str) -> _Run:
+        run = _Run(asyncio.create_task(run_parse_pipeline(repo_url, framework_type)))
+
+        def finished(task: asyncio.Task) -> None:
+            if self._runs.get(key) is run:
+                del self._runs[key]
+            if task.cancelled():
+                return
+            # retrieved here so an error nobody awaits any more is not reported
+            # as never retrieved
+            if task.exception() is None:
+                self._store(key, task.result())
+
+        run.task.add_done_callback(finished)
+        self._runs[key] = run
+        return run
+
+    async def run(self, repo_url: str, framework_type: str) -> Dict[str, Any]:
+        """
+        The result of run_parse_pipeline for the repository's current HEAD,
+        from a cached result, a run in flight or a new run
+        """
+        key = await self._key(repo_url, framework_type)
+        cached = self._cached(key)
+        if cached is not None:
+            PARSE_REQUESTS.labels(outcome='cached').inc()
+            return cached
+
+        run = self._runs.get(key)
+        if run is None:
+            PARSE_REQUESTS.labels(outcome='leader').inc()
+            run = self._start(key, repo_url, framework_type)
+        else:
+            PARSE_REQUESTS.labels(outcome='joined').inc()
+            logger.info("Joining the parse of %s at %s already in flight",
+                        repo_url, key[2])
+
+        run.waiters += 1
+        try:
+            # shielded, so cancelling one request does not cancel the run
+            return await asyncio.shield(run.task)
+        finally:
+            run.waiters -= 1
+            if run.waiters == 0 and not run.task.done():
+                # nobody wants the result any more; later requests start afresh
+                if self._runs.get(key) is run:
+                    del self._runs[key]
+                run.task.cancel()
+
+
+_coalescer: Optional[ParseCoalescer] = None
+
+
+def get_parse_coalescer() -> ParseCoalescer:
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = ParseCoalescer(ttl=settings.PARSE_RESULT_CACHE_TTL,
+                                    max_results=settings.PARSE_RESULT_CACHE_SIZE)
+    return _coalescer
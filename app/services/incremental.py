@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.database.database import spec_snapshot_collection
+from app.parsers.Parser import Parser
+from app.services.repo_utils import GitCommandError, head_commit, run_git
+from app.services.spec_table import SpecTable
+
+logger = logging.getLogger(__name__)
+
+
+def _relative(path: str, repo_path: str) -> str:
+    return Path(os.path.relpath(path, repo_path)).as_posix()
+
+
+def _snapshot_id(repo_url: str, framework_type: str) -> str:
+    return f"{framework_type.lower()}:{repo_url.strip()}"
+
+
+async def load_snapshot(repo_url: str, framework_type: str) -> Optional[Dict[str, Any]]:
+    try:
+        return await spec_snapshot_collection.find_one(
+            {'_id': _snapshot_id(repo_url, framework_type)})
+    except Exception as e:
+        logger.warning("Loading spec snapshot for %s failed: %s", repo_url, e)
+        return None
+
+
+async def save_snapshot(
+    repo_url: str,
+    framework_type: str,
+    repo_path: str,
+    state: Dict[str, Any],
+    api_specs: List[Dict[str, Any]],
+) -> None:
+    """
+    Record the specs extracted at a commit in normalized form. File paths are
+    stored relative to the checkout so the snapshot survives the checkout
+    moving, and controller code is stored as a byte span of its file rather
+    than as text.
+    """
+    specs = SpecTable.from_specs(api_specs, root=repo_path, keep_code=False)
+    try:
+        await spec_snapshot_collection.replace_one(
+            {'_id': _snapshot_id(repo_url, framework_type)},
+            {
+                'repo_url': repo_url,
+                'framework_type': framework_type.lower(),
+                'commit': state['commit'],
+                'routes_path': state['routes_path'],
+                'dependencies': [
+                    {'file': route_file, 'controllers': controllers}
+                    for route_file, controllers in state['dependencies'].items()
+                ],
+                'specs': specs.to_payload(),
+                'skipped_files': state['skipped_files'],
+                'updated_at': datetime.now(timezone.utc),
+            },
+            upsert=True,
+        )
+    except Exception as e:
+        logger.warning("Saving spec snapshot for %s failed: %s", repo_url, e)
+
+
+async def changed_files(repo_path: str, old_commit: str, new_commit: str) -> Optional[Set[str]]:
+    """
+    Repo-relative paths changed between two commits, or None when the old
+    commit is no longer available locally
+    """
+    try:
+        await run_git('cat-file', '-e', f'{old_commit}^{{commit}}', cwd=repo_path)
+        output = await run_git('diff', '--name-only', '--no-renames',
+                               old_commit, new_commit, cwd=repo_path)
+    except GitCommandError:
+        return None
+    return set(output.splitlines())
+
+
+def _dependencies(parser: Parser, repo_path: str) -> Dict[str, List[str]]:
+    return {
+        _relative(route_file, repo_path): [
+            _relative(controller, repo_path) for controller in controllers
+        ]
+        for route_file, controllers in parser.parser.file_dependencies.items()
+    }
+
+
+def relative_skipped_files(parser: Parser, repo_path: str) -> List[Dict[str, Any]]:
+    return [
+        dict(skipped, file=_relative(skipped['file'], repo_path))
+        for skipped in parser.skipped_files()
+    ]
+
+
+def _merge_changes(
+    parser: Parser,
+    repo_path: str,
+    snapshot: Dict[str, Any],
+    changed: Set[str],
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+    """
+    Re-parse only the route files touched by the diff, directly or through a
+    controller they import, and reuse the snapshot for everything else
+    """
+    old_dependencies = {
+        entry['file']: entry['controllers'] for entry in snapshot['dependencies']
+    }
+    old_table = SpecTable.from_payload(snapshot['specs'], root=repo_path)
+    old_specs = old_table.routes_by_file()
+
+    route_files = parser.parser.list_route_files()
+    affected = []
+    for route_file in route_files:
+        relative = _relative(str(route_file), repo_path)
+        if (
+            relative in changed
+            or relative not in old_dependencies
+            or changed.intersection(old_dependencies[relative])
+        ):
+            affected.append(route_file)
+    logger.info("Re-parsing %d of %d route files", len(affected), len(route_files))
+
+    new_specs: Dict[str, List[Dict[str, Any]]] = {}
+    for spec in parser.parser.parse_files(affected):
+        new_specs.setdefault(spec['files'], []).append(spec)
+    new_dependencies = _dependencies(parser, repo_path)
+
+    api_specs = []
+    dependencies = {}
+    # keep the order of a full parse
+    for route_file in route_files:
+        absolute = str(route_file)
+        relative = _relative(absolute, repo_path)
+        if relative in new_dependencies:
+            api_specs += new_specs.get(absolute, [])
+            dependencies[relative] = new_dependencies[relative]
+        else:
+            # unchanged, as are its controllers: the stored spans still hold
+            api_specs += [old_table.expand(route) for route in old_specs.get(relative, [])]
+            dependencies[relative] = old_dependencies[relative]
+    return api_specs, dependencies
+
+
+async def extract_specs(
+    repo_url: str,
+    framework_type: str,
+    repo_path: str,
+    routes_path: str,
+    commit: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Extract the API specifications of a checkout, re-parsing only what changed
+    since the last recorded snapshot of the same repository.
+
+    commit identifies the source tree; it defaults to the checkout's HEAD.
+    Trees that are not git checkouts pass a content digest instead and are
+    parsed afresh whenever it changes.
+
+    Returns the specs and the state to pass to save_snapshot.
+    """
+    repo_path = str(repo_path)
+    parser = Parser(repo_path=repo_path, framework_type=framework_type,
+                    routes_path=routes_path)
+    if commit is None:
+        commit = await head_commit(Path(repo_path))
+    relative_routes = _relative(str(routes_path), repo_path)
+    snapshot = await load_snapshot(repo_url, framework_type)
+
+    api_specs = None
+    if snapshot is not None and snapshot['routes_path'] == relative_routes:
+        if snapshot['commit'] == commit:
+            api_specs = await asyncio.to_thread(
+                SpecTable.from_payload(snapshot['specs'], root=repo_path).expanded)
+            dependencies = {
+                entry['file']: entry['controllers'] for entry in snapshot['dependencies']
+            }
+            skipped_files = snapshot['skipped_files']
+        else:
+            changed = await changed_files(repo_path, snapshot['commit'], commit)
+            if changed is not None:
+                api_specs, dependencies = await asyncio.to_thread(
+                    _merge_changes, parser, repo_path, snapshot, changed)
+                # skipped route files have no dependencies recorded, so the
+                # merge re-examines, and again skips, every one of them
+                skipped_files = relative_skipped_files(parser, repo_path)
+
+    if api_specs is None:
+        # parsing is CPU-bound and may wait on a process pool; keep it off
+        # the event loop
+        api_specs = await asyncio.to_thread(parser.parse)
+        dependencies = _dependencies(parser, repo_path)
+        skipped_files = relative_skipped_files(parser, repo_path)
+
+    state = {
+        'commit': commit,
+        'routes_path': relative_routes,
+        'dependencies': dependencies,
+        'skipped_files': skipped_files,
+    }
+    return api_specs, state
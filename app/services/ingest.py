@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from contextlib import asynccontextmanager
+from pathlib import Path, PurePosixPath
+from typing import IO, AsyncIterator, List, Optional, Tuple
+from config import settings
+from app.parsers.Parser import DJANGO_FRAMEWORKS
+from app.parsers.discovery import IGNORED_DIRECTORIES, IGNORED_FILE_SUFFIXES
+from app.parsers.django_index import SKIP_DIRECTORIES
+
+logger = logging.getLogger(__name__)
+
+# the Django parser joins url confs to views to serializers; nothing else in
+# a project contributes to a spec
+DJANGO_SOURCE_NAMES = {
+    'urls.py', 'views.py', 'viewsets.py', 'serializers.py', '__init__.py',
+}
+# views/, serializers/ and urls/ split into packages of their own
+DJANGO_SOURCE_PACKAGES = {'urls', 'views', 'serializers'}
+
+COPY_CHUNK_BYTES = 64 * 1024
+
+
+class IngestError(Exception):
+    """
+    Raised for an archive or local path that cannot be ingested, with the
+    HTTP status to answer with
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def wanted_file(relative: str, framework_type: str) -> bool:
+    """
+    Whether a repo-relative posix path is a file the framework's parser
+    reads. Dependency, build and hidden directories never are.
+    """
+    parts = PurePosixPath(relative).parts
+    if not parts:
+        return False
+    directories, name = parts[:-1], parts[-1]
+    if any(part.startswith('.') or part in IGNORED_DIRECTORIES or part in SKIP_DIRECTORIES
+           for part in directories):
+        return False
+    if framework_type.lower() in DJANGO_FRAMEWORKS:
+        return name.endswith('.py') and (
+            name in DJANGO_SOURCE_NAMES
+            or (bool(directories) and directories[-1] in DJANGO_SOURCE_PACKAGES)
+        )
+    return name.endswith('.js') and not name.endswith(IGNORED_FILE_SUFFIXES)
+
+
+def _safe_relative(name: str) -> Optional[str]:
+    """
+    An archive member name as a relative posix path, or None for absolute
+    names and names escaping the extraction directory
+    """
+    name = name.replace('\\', '/')
+    if name.startswith('/') or (len(name) > 1 and name[1] == ':'):
+        return None
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return '/'.join(parts)
+
+
+def _tree_digest(entries: List[Tuple[str, str]]) -> str:
+    # stands in for a commit id: snapshots and stored specs are keyed by it
+    digest = hashlib.sha256()
+    for relative, fingerprint in sorted(entries):
+        digest.update(f"{relative}\0{fingerprint}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ArchiveExtractor:
+    """
+    Extracts the parser-relevant files of a tar (any compression) or zip
+    archive into dest. Tar archives are read as a stream, member by member;
+    zip archives through their central directory. Only the members
+    wanted_file accepts are written, so dependencies, assets and binaries
+    are never decompressed to disk.
+
+    Members over max_file_bytes are passed over like the parsers pass over
+    large files. Archives with more than max_entries members, or whose
+    extracted files add up to more than max_bytes, are rejected, however
+    their headers declare the sizes.
+    """
+
+    def __init__(self, dest: str, framework_type: str, max_bytes: int,
+                 max_entries: int, max_file_bytes: int):
+        self.dest = dest
+        self.framework_type = framework_type
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_file_bytes = max_file_bytes
+        self.entries = 0
+        self.files_extracted = 0
+        self.bytes_extracted = 0
+        self.files_too_large = 0
+        # (relative path, sha256 of the content)
+        self._extracted: List[Tuple[str, str]] = []
+
+    def extract(self, fileobj: IO[bytes]) -> str:
+        """
+        Extract the archive and return a digest of the extracted files
+        """
+        fileobj.seek(0)
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            self._extract_zip(fileobj)
+        else:
+            fileobj.seek(0)
+            self._extract_tar(fileobj)
+        logger.info("Extracted %d of %d archive entries (%d bytes, %d over the size limit)",
+                    self.files_extracted, self.entries, self.bytes_extracted,
+                    self.files_too_large)
+        return _tree_digest(self._extracted)
+
+    def _count_entry(self) -> None:
+        self.entries += 1
+        if self.entries > self.max_entries:
+            raise IngestError(f"Archive has more than {self.max_entries} entries", 413)
+
+    def _extract_tar(self, fileobj: IO[bytes]) -> None:
+        try:
+            # 'r|*' never seeks back, so members are handled as they stream by
+            with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+                for member in archive:
+                    self._count_entry()
+                    # links and devices are never extracted
+                    if not member.isreg():
+                        continue
+                    relative = _safe_relative(member.name)
+                    if relative is None or not wanted_file(relative, self.framework_type):
+                        continue
+                    source = archive.extractfile(member)
+                    if source is not None:
+                        self._write(relative, member.size, source)
+        except tarfile.TarError as e:
+            raise IngestError(f"Not a readable tar or zip archive: {e}") from e
+
+    def _extract_zip(self, fileobj: IO[bytes]) -> None:
+        try:
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    self._count_entry()
+                    if info.is_dir():
+                        continue
+                    relative = _safe_relative(info.filename)
+                    if relative is None or not wanted_file(relative, self.framework_type):
+                        continue
+                    with archive.open(info) as source:
+                        self._write(relative, info.file_size, source)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError) as e:
+            raise IngestError(f"Not a readable zip archive: {e}") from e
+        except RuntimeError as e:
+            # zipfile's error for an encrypted member without a password
+            raise IngestError(f"Encrypted zip archives are not supported: {e}") from e
+
+    def _write(self, relative: str, declared_size: int, source: IO[bytes]) -> None:
+        if declared_size > self.max_file_bytes:
+            self.files_too_large += 1
+            return
+        target = os.path.join(self.dest, *relative.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        digest = hashlib.sha256()
+        written = 0
+        with open(target, 'wb') as out:
+            # the declared size is not trusted; the bytes actually written are
+            while True:
+                chunk = source.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if self.bytes_extracted + written > self.max_bytes:
+                    raise IngestError(
+                        f"Archive expands to more than {self.max_bytes} bytes of source", 413)
+                if written > self.max_file_bytes:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        if written > self.max_file_bytes:
+            os.remove(target)
+            self.files_too_large += 1
+            return
+        self.bytes_extracted += written
+        self.files_extracted += 1
+        self._extracted.append((relative, digest.hexdigest()))
+
+
+def _extract_archive(fileobj: IO[bytes], framework_type: str) -> Tuple[str, str]:
+    dest = tempfile.mkdtemp(prefix='orbitapi-archive-')
+    try:
+        digest = ArchiveExtractor(
+            dest, framework_type,
+            max_bytes=settings.ARCHIVE_MAX_EXTRACTED_BYTES,
+            max_entries=settings.ARCHIVE_MAX_ENTRIES,
+            max_file_bytes=settings.PARSER_MAX_FILE_BYTES,
+        ).extract(fileobj)
+    except BaseException:
+        shutil.rmtree(dest, ignore_errors=True)
+        raise
+    return dest, digest
+
+
+@asynccontextmanager
+async def extracted_archive(fileobj: IO[bytes], framework_type: str) -> AsyncIterator[Tuple[Path, str]]:
+    """
+    Extract an archive into a temporary directory for the duration of the
+    block, yielding the directory and a digest of its content
+    """
+    dest, digest = await asyncio.to_thread(_extract_archive, fileobj, framework_type)
+    try:
+        yield Path(dest), digest
+    finally:
+        await asyncio.to_thread(shutil.rmtree, dest, ignore_errors=True)
+
+
+def resolve_local_path(path: str) -> Path:
+    """
+    A server-local source directory, which must lie within one of
+    LOCAL_SOURCE_ROOTS after symlinks are resolved
+    """
+    roots = [os.path.realpath(root) for root in settings.LOCAL_SOURCE_ROOTS]
+    if not roots:
+        raise IngestError("Local path ingestion is disabled", 403)
+    real = os.path.realpath(path)
+    if not any(real == root or real.startswith(root.rstrip(os.sep) + os.sep) for root in roots):
+        raise IngestError(f"{path} is outside the allowed source roots", 403)
+    if not os.path.isdir(real):
+        raise IngestError(f"{path} is not a directory", 404)
+    return Path(real)
+
+
+def _local_digest(root: Path, framework_type: str) -> str:
+    # files are not read: their size and modification time stand in for content
+    entries = []
+    for directory, directories, files in os.walk(root):
+        directories[:] = [
+            name for name in directories
+            if not name.startswith('.') and name not in IGNORED_DIRECTORIES
+            and name not in SKIP_DIRECTORIES
+        ]
+        for name in files:
+            path = os.path.join(directory, name)
+            relative = Path(os.path.relpath(path, root)).as_posix()
+            if not wanted_file(relative, framework_type):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((relative, f"{stat.st_size}:{stat.st_mtime_ns}"))
+    return _tree_digest(entries)
+
+
+@asynccontextmanager
+async def local_source(path: str, framework_type: str) -> AsyncIterator[Tuple[Path, str]]:
+    """
+    A server-local source directory, parsed in place, and a digest of its
+    relevant files
+    """
+    root = resolve_local_path(path)
+    digest = await asyncio.to_thread(_local_digest, root, framework_type)
+    yield root, digest
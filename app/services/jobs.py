@@ -0,0 +1,325 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+import bson
+from pymongo import ReturnDocument
+from config import settings
+from app.logging import trace_id_var
+from app.database.database import job_collection
+from app.services.pipeline import STAGES, PipelineError, run_parse_pipeline
+from app.services.spec_table import SpecTable
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobManager:
+    """
+    Runs the parse pipeline in a pool of background workers. Job state lives
+    in a collection shared by every process running a JobManager.
+
+    A worker claims a job atomically before running it and holds a lease on
+    it, renewed every third of lease_seconds. A job whose lease ran out,
+    because the process running it stopped, is claimed again by whichever
+    process next looks for work, so every job runs in one process at a time.
+    A job claimed max_attempts times without finishing is failed.
+
+    Results are stored in the job document, so one encoding to more than
+    max_result_bytes fails the job rather than the write; its specs are
+    still persisted and can be read from the spec store.
+    """
+    # progress writes during generation are throttled to this interval
+    PROGRESS_INTERVAL = 1.0
+
+    def __init__(self, collection, workers: int = 2, lease_seconds: float = 60.0,
+                 max_attempts: int = 3, max_result_bytes: int = 12 * 1024 ** 2):
+        self.collection = collection
+        self.worker_count = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.max_result_bytes = max_result_bytes
+        # identifies this process's claims
+        self.owner = uuid.uuid4().hex
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        # ids in the queue, so a sweep does not queue a job twice
+        self._queued: Set[str] = set()
+        self._workers: List[asyncio.Task] = []
+
+    def _claimable(self) -> Dict[str, Any]:
+        return {'$or': [
+            {'status': JOB_QUEUED},
+            {'status': JOB_RUNNING, 'lease_expires_at': {'$lt': _now()}},
+        ]}
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _sweep(self) -> None:
+        """
+        Queue the jobs that are waiting or whose lease expired, oldest first
+        """
+        cursor = self.collection.find(self._claimable(), {'_id': 1}).sort('created_at', 1)
+        async for job in cursor:
+            self._enqueue(job['_id'])
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                await self._sweep()
+            except Exception:
+                logger.exception("Looking for abandoned jobs failed")
+
+    async def start(self) -> None:
+        await self.collection.create_index([('status', 1), ('created_at', 1)])
+        # picks up work interrupted by a restart, here or in another process
+        await self._sweep()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+        ]
+        self._workers.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # hand interrupted jobs back at once instead of when their lease
+        # runs out; a shutdown does not count as an attempt
+        await self.collection.update_many(
+            {'owner': self.owner, 'status': JOB_RUNNING},
+            {'$set': {'status': JOB_QUEUED, 'stage': None, 'updated_at': _now()},
+             '$inc': {'attempts': -1},
+             '$unset': {'owner': '', 'lease_expires_at': ''}},
+        )
+
+    async def submit(self, repo_url: str, framework_type: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = _now()
+        await self.collection.insert_one({
+            '_id': job_id,
+            'repo_url': repo_url,
+            'framework_type': framework_type,
+            'status': JOB_QUEUED,
+            'stage': None,
+            'stages': {stage: {'status': 'pending'} for stage in STAGES},
+            'progress': {'endpoints_total': 0, 'endpoints_completed': 0},
+            'result': None,
+            'error': None,
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now,
+        })
+        self._enqueue(job_id)
+        return job_id
+
+    async def get(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        projection = {'owner': 0, 'lease_expires_at': 0}
+        if not include_result:
+            projection['result'] = 0
+        return await self.collection.find_one({'_id': job_id}, projection)
+
+    @staticmethod
+    def result_table(job: Dict[str, Any]) -> SpecTable:
+        """
+        The specs of a job's result, partial or final
+        """
+        result = job.get('result') or {}
+        return SpecTable.from_payload(result.get('specs') or {})
+
+    def _result(self, api_specs: List[Dict[str, Any]],
+                skipped_files: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        A result to store in the job document, or None when it would not
+        fit within max_result_bytes
+        """
+        # normalized, so shared code and middleware are stored once
+        result = {
+            'specs': SpecTable.from_specs(api_specs).to_payload(),
+            'skipped_files': skipped_files,
+        }
+        if len(bson.encode(result)) > self.max_result_bytes:
+            return None
+        return result
+
+    async def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        # a process that lost its claim on the job no longer writes to it
+        fields['updated_at'] = _now()
+        await self.collection.update_one(
+            {'_id': job_id, 'owner': self.owner}, {'$set': fields})
+
+    async def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take a waiting job, or one whose lease expired, for this
+        process. None when it is running elsewhere or finished.
+        """
+        now = _now()
+        return await self.collection.find_one_and_update(
+            {'$and': [{'_id': job_id}, self._claimable()]},
+            {'$set': {
+                'status': JOB_RUNNING,
+                'stage': None,
+                'owner': self.owner,
+                'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+                'started_at': now,
+                'updated_at': now,
+            }, '$inc': {'attempts': 1}},
+            projection={'result': 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _keep_lease(self, job_id: str, run: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            renewed = await self.collection.update_one(
+                {'_id': job_id, 'owner': self.owner, 'status': JOB_RUNNING},
+                {'$set': {'lease_expires_at': _now() + timedelta(seconds=self.lease_seconds)}},
+            )
+            if renewed.matched_count == 0:
+                logger.warning("Lost the lease on job %s; stopping it", job_id)
+                run.cancel()
+                return
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            # log lines of a job carry its id as the trace id
+            token = trace_id_var.set(job_id)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job %s crashed", job_id)
+            finally:
+                trace_id_var.reset(token)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._claim(job_id)
+        if job is None:
+            return
+        if job['attempts'] > self.max_attempts:
+            # every earlier run died without recording an outcome
+            logger.warning("Job %s failed after %d attempts", job_id, self.max_attempts)
+            await self._update(job_id, {
+                'status': JOB_FAILED,
+                'error': {'stage': job.get('stage'),
+                          'message': f"Gave up after {self.max_attempts} attempts"},
+                'finished_at': _now(),
+            })
+            return
+        run = asyncio.create_task(self._run_claimed(job))
+        lease = asyncio.create_task(self._keep_lease(job_id, run))
+        try:
+            await run
+        except asyncio.CancelledError:
+            if not lease.done():
+                raise
+            # the lease was lost and another process may have the job now
+        finally:
+            lease.cancel()
+
+    async def _run_claimed(self, job: Dict[str, Any]) -> None:
+        job_id = job['_id']
+        last_progress_write = 0.0
+
+        async def on_progress(event: str, data: Dict[str, Any]) -> None:
+            nonlocal last_progress_write
+            stage = data.get('stage')
+            if event == 'stage_started':
+                await self._update(job_id, {
+                    'stage': stage,
+                    f'stages.{stage}.status': JOB_RUNNING,
+                    f'stages.{stage}.started_at': _now(),
+                })
+            elif event == 'stage_finished':
+                fields = {
+                    f'stages.{stage}.status': JOB_SUCCEEDED,
+                    f'stages.{stage}.finished_at': _now(),
+                }
+                if stage == 'parse':
+                    # partial result: the specs without test cases, when
+                    # they fit; the final result is checked again
+                    partial = self._result(data['api_specs'], data['skipped_files'])
+                    if partial is not None:
+                        fields['result'] = partial
+                    fields['progress.endpoints_total'] = len(data['api_specs'])
+                await self._update(job_id, fields)
+            elif event == 'endpoint_generated':
+                now = time.monotonic()
+                if (data['completed'] == data['total']
+                        or now - last_progress_write >= self.PROGRESS_INTERVAL):
+                    last_progress_write = now
+                    await self._update(job_id, {
+                        'progress.endpoints_completed': data['completed'],
+                    })
+
+        try:
+            result = await run_parse_pipeline(
+                job['repo_url'], job['framework_type'], on_progress=on_progress)
+        except PipelineError as e:
+            logger.warning("Job %s failed in stage %s: %s", job_id, e.stage, e.trace)
+            await self._update(job_id, {
+                'status': JOB_FAILED,
+                f'stages.{e.stage}.status': JOB_FAILED,
+                'error': {'stage': e.stage, 'message': str(e)},
+                'finished_at': _now(),
+            })
+            return
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            await self._update(job_id, {
+                'status': JOB_FAILED,
+                'error': {'stage': None, 'message': str(e)},
+                'finished_at': _now(),
+            })
+            return
+
+        stored = self._result(result['api_specs'], result['skipped_files'])
+        if stored is None:
+            logger.warning("Result of job %s is over %d bytes", job_id, self.max_result_bytes)
+            await self._update(job_id, {
+                'status': JOB_FAILED,
+                'stage': None,
+                'result': None,
+                'error': {'stage': 'store', 'message': (
+                    f"The result of {len(result['api_specs'])} specs is too large "
+                    f"to keep with the job; read the specs from /repo/specs")},
+                'finished_at': _now(),
+            })
+            return
+
+        await self._update(job_id, {
+            'status': JOB_SUCCEEDED,
+            'stage': None,
+            'result': stored,
+            'finished_at': _now(),
+        })
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        _manager = JobManager(job_collection, workers=settings.JOB_WORKERS,
+                              lease_seconds=settings.JOB_LEASE_SECONDS,
+                              max_attempts=settings.JOB_MAX_ATTEMPTS,
+                              max_result_bytes=settings.JOB_MAX_RESULT_BYTES)
+    return _manager
@@ -0,0 +1,138 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from config import settings
+from app.metrics import LLM_TOKENS
+
+# what a model answers with when the provider returned nothing
+NO_RESPONSE = "No response generated."
+
+
+class RateLimitError(Exception):
+    """Raised by a model when the provider rejects a call for rate limiting"""
+
+
+class TestCaseModel(ABC):
+    """
+    Interface for the language models used to generate test cases. With a
+    response_schema the model is asked for JSON matching it.
+    """
+    name: str = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str,
+                       response_schema: Optional[Dict[str, Any]] = None) -> str:
+        ...
+
+
+def estimate_tokens(text: str) -> int:
+    # roughly four characters per token
+    return len(text) // 4
+
+
+def record_tokens(model_name: str, prompt_tokens: int, output_tokens: int) -> None:
+    LLM_TOKENS.labels(model=model_name, kind='prompt').inc(prompt_tokens)
+    LLM_TOKENS.labels(model=model_name, kind='output').inc(output_tokens)
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    # google.api_core raises ResourceExhausted (HTTP 429) when the quota is hit
+    if getattr(error, 'code', None) == 429:
+        return True
+    return type(error).__name__ in ('ResourceExhausted', 'TooManyRequests')
+
+
+class GeminiModel(TestCaseModel):
+    def __init__(self, model_name: str, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.name = model_name
+        self._genai = genai
+        self._model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str,
+                       response_schema: Optional[Dict[str, Any]] = None) -> str:
+        generation_config = None
+        if response_schema is not None:
+            generation_config = self._genai.GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=response_schema,
+            )
+        try:
+            response = await self._model.generate_content_async(
+                [prompt], generation_config=generation_config)
+        except Exception as e:
+            if _is_rate_limit_error(e):
+                raise RateLimitError(str(e)) from e
+            raise
+        if not response:
+            return NO_RESPONSE
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            record_tokens(self.name, usage.prompt_token_count or 0,
+                          usage.candidates_token_count or 0)
+        return response.text
+
+
+class StubModel(TestCaseModel):
+    """
+    Local model returning canned test cases, used for tests and benchmarks
+    """
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self, prompt: str,
+                       response_schema: Optional[Dict[str, Any]] = None) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        test_cases = [
+            {
+                "name": "returns expected response",
+                "request": {},
+                "expected_status": 200,
+            }
+        ]
+        if response_schema is None:
+            text = json.dumps(test_cases)
+        else:
+            # batch prompts end with the endpoints as a JSON array
+            endpoints = json.loads(prompt.rsplit('\n', 1)[-1])
+            text = json.dumps({"results": [
+                {"method": endpoint["method"], "endpoint": endpoint["endpoint"],
+                 "test_cases": test_cases}
+                for endpoint in endpoints
+            ]})
+        record_tokens(self.name, estimate_tokens(prompt), estimate_tokens(text))
+        return text
+
+
+_model: Optional[TestCaseModel] = None
+
+
+def get_model() -> TestCaseModel:
+    """
+    Return the configured test case model, creating it on first use
+    """
+    global _model
+    if _model is None:
+        if settings.TEST_CASE_MODEL == "stub":
+            _model = StubModel(latency=settings.STUB_MODEL_LATENCY)
+        else:
+            _model = GeminiModel(settings.TEST_CASE_MODEL,
+                                 api_key=settings.GEMINI_API_KEY)
+    return _model
+
+
+def set_model(model: Optional[TestCaseModel]) -> None:
+    """
+    Replace the process-wide model, e.g. with a StubModel in tests
+    """
+    global _model
+    _model = model
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+import traceback
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import (
+    Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple
+)
+from app.parsers.Parser import Parser
+from app.services.repo_utils import head_commit
+from app.services.workspace import get_workspace_pool
+from app.services.incremental import extract_specs, relative_skipped_files, save_snapshot
+from app.services.spec_store import SpecWriter, get_spec_store
+from app.test_case_gen import get_test_case_generator
+from app.metrics import STAGE_DURATION, STAGE_FAILURES, timed
+
+logger = logging.getLogger(__name__)
+
+# stages of the clone/parse/generate pipeline, in order
+STAGES = ('clone', 'parse', 'generate', 'store')
+
+ProgressCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# yields the directory to parse and the commit (or content digest)
+# identifying it; None means the directory's git HEAD
+SourceCheckout = AsyncContextManager[Tuple[Path, Optional[str]]]
+
+
+class PipelineError(Exception):
+    """
+    Wraps an error raised by a pipeline stage together with the stage name
+    """
+
+    def __init__(self, stage: str, error: Exception):
+        self.stage = stage
+        self.error = error
+        self.trace = traceback.format_exc()
+        STAGE_FAILURES.labels(stage=stage).inc()
+        super().__init__(str(error))
+
+
+async def run_parse_pipeline(
+    repo_url: str,
+    framework_type: str,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Check out a repository, extract its API specifications and generate test
+    cases for them.
+
+    on_progress is awaited with ('stage_started', {'stage'}),
+    ('stage_finished', {'stage', ...}) and, during generation,
+    ('endpoint_generated', {'api_spec', 'completed', 'total'}).
+
+    Files the parser passed over (too large, binary or minified) are listed
+    in the result's skipped_files.
+    """
+    return await run_source_pipeline(
+        repo_url, framework_type, _workspace_checkout(repo_url), on_progress)
+
+
+@asynccontextmanager
+async def _workspace_checkout(repo_url: str) -> AsyncIterator[Tuple[Path, Optional[str]]]:
+    # Lease an up-to-date checkout of the repository from the pool
+    async with get_workspace_pool().checkout(repo_url) as repo_path:
+        yield repo_path, None
+
+
+async def run_source_pipeline(
+    repo_url: str,
+    framework_type: str,
+    checkout: SourceCheckout,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    run_parse_pipeline over the source tree checkout provides, such as an
+    extracted archive. The clone stage covers obtaining the tree; repo_url
+    names it in stored specs and snapshots, e.g. "archive:<name>".
+    """
+    async def report(event: str, **data: Any) -> None:
+        if on_progress is not None:
+            await on_progress(event, data)
+
+    await report('stage_started', stage='clone')
+    started = time.perf_counter()
+    try:
+        async with checkout as (repo_path, commit):
+            STAGE_DURATION.labels(stage='clone').observe(time.perf_counter() - started)
+            logger.info("Repository %s checked out at %s", repo_url, repo_path)
+            await report('stage_finished', stage='clone')
+            await report('stage_started', stage='parse')
+
+            try:
+                # Extract API specifications, re-parsing only files changed
+                # since the last snapshot of this repository. Route files are
+                # recognised by content, so the whole checkout is scanned.
+                with timed(STAGE_DURATION, stage='parse'):
+                    api_specs, snapshot_state = await extract_specs(
+                        repo_url, framework_type, repo_path, str(repo_path), commit
+                    )
+            except Exception as e:
+                raise PipelineError('parse', e) from e
+
+    except PipelineError:
+        raise
+    except Exception as e:
+        raise PipelineError('clone', e) from e
+
+    await report('stage_finished', stage='parse', api_specs=api_specs,
+                 skipped_files=snapshot_state['skipped_files'])
+    await report('stage_started', stage='generate')
+
+    # specs are persisted in the background as their test cases come in
+    writer = get_spec_store().writer(repo_url, snapshot_state['commit'], str(repo_path))
+    completed = 0
+
+    async def on_complete(api_spec: Dict[str, Any]) -> None:
+        nonlocal completed
+        completed += 1
+        await writer.add(api_spec)
+        await report('endpoint_generated', api_spec=api_spec,
+                     completed=completed, total=len(api_specs))
+
+    try:
+        # The checkout is released before generation, which needs only the specs
+        with timed(STAGE_DURATION, stage='generate'):
+            await get_test_case_generator().generate_all(api_specs, on_complete=on_complete)
+    except Exception as e:
+        writer.cancel()
+        raise PipelineError('generate', e) from e
+    await report('stage_finished', stage='generate')
+
+    await report('stage_started', stage='store')
+    with timed(STAGE_DURATION, stage='store'):
+        await writer.close()
+        await save_snapshot(repo_url, framework_type, repo_path,
+                            snapshot_state, api_specs)
+    await report('stage_finished', stage='store', stored=writer.written,
+                 failed=writer.failed)
+
+    return {"api_specs": api_specs, "skipped_files": snapshot_state['skipped_files']}
+
+
+async def stream_parse_pipeline(
+    repo_url: str,
+    framework_type: str,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run the pipeline and yield events as results become available:
+    ('spec', ...) as soon as an endpoint is parsed, ('test_cases', ...) when
+    its test cases are generated, then ('done', ...) or ('error', ...).
+
+    Generation for an endpoint starts as soon as it is parsed, while the rest
+    of the repository is still being parsed.
+    """
+    # bounded so a slow client applies backpressure to parsing
+    queue: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue(maxsize=256)
+    generator = get_test_case_generator()
+    generation_tasks: Set[asyncio.Task] = set()
+    writer: Optional[SpecWriter] = None
+
+    async def generate(index: int, api_spec: Dict[str, Any]) -> None:
+        test_cases = await generator.generate_for_endpoint(api_spec)
+        await writer.add(dict(api_spec, test_cases=test_cases))
+        await queue.put(('test_cases', {
+            'index': index,
+            'method': api_spec['method'],
+            'endpoint': api_spec['endpoint'],
+            'test_cases': test_cases,
+        }))
+
+    async def produce() -> None:
+        nonlocal writer
+        stage = 'clone'
+        count = 0
+        skipped_files = []
+        started = time.perf_counter()
+        try:
+            async with get_workspace_pool().checkout(repo_url) as repo_path:
+                STAGE_DURATION.labels(stage='clone').observe(time.perf_counter() - started)
+                stage = 'parse'
+                writer = get_spec_store().writer(
+                    repo_url, await head_commit(repo_path), str(repo_path))
+                parser = Parser(repo_path=str(repo_path), framework_type=framework_type,
+                                routes_path=str(repo_path))
+                api_specs = parser.iter_parse()
+                while True:
+                    # parse file by file off the event loop
+                    api_spec = await asyncio.to_thread(next, api_specs, None)
+                    if api_spec is None:
+                        break
+                    await queue.put(('spec', {'index': count, 'api_spec': api_spec}))
+                    generation_tasks.add(
+                        asyncio.create_task(generate(count, api_spec)))
+                    count += 1
+                skipped_files = relative_skipped_files(parser, str(repo_path))
+
+            stage = 'generate'
+            await asyncio.gather(*generation_tasks)
+            stage = 'store'
+            with timed(STAGE_DURATION, stage='store'):
+                await writer.close()
+            await queue.put(('done', {'total': count, 'stored': writer.written,
+                                      'skipped_files': skipped_files}))
+        except Exception as e:
+            STAGE_FAILURES.labels(stage=stage).inc()
+            logger.exception("Error streaming %s during %s", repo_url, stage)
+            for task in generation_tasks:
+                task.cancel()
+            await queue.put(('error', {'stage': stage, 'message': str(e)}))
+        # not in a finally: once cancelled, nobody reads the queue any more and
+        # putting into a full one would block for good
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        # the client went away or we are done; stop any outstanding work
+        producer.cancel()
+        for task in generation_tasks:
+            task.cancel()
+        if writer is not None:
+            writer.cancel()
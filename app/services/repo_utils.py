@@ -1,17 +1,227 @@
-import subprocess
+import asyncio
+import os
+import posixpath
 import tempfile
 from pathlib import Path
+from urllib.parse import urlsplit
 import shutil
+from typing import List, Optional, Set
+from config import settings
+from app.parsers.NodeParser import NodeJSParser
 
+COMMON_ROUTE_PATHS = [
+    'routes',
+    'api/routes',
+    'src/routes',
+    'app/routes',
+    'api',
+    'endpoints',
+    'app/api',
+    'app/endpoints'
+]
 
-async def clone_repo(git_url: str) -> Path:
-    temp_dir = tempfile.mkdtemp()
-    repo_path = Path(temp_dir) / 'repo'
 
-    # clone the repository using subprocess
-    subprocess.run(['git', 'clone', git_url, str(repo_path)], check=True)
-    return repo_path
+# schemes a repository may be cloned over; file is added by CLONE_ALLOW_FILE_URLS
+REMOTE_URL_SCHEMES = ('https', 'ssh', 'git')
+
+
+class GitCommandError(Exception):
+    def __init__(self, args: List[str], returncode: int, stderr: str):
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__(
+            f"git {' '.join(args)} failed with exit code {returncode}: {stderr.strip()}")
+
+
+async def run_git(*args: str, cwd: Optional[Path] = None) -> str:
+    """
+    Run a git command in a subprocess without blocking the event loop and
+    return its stdout
+    """
+    env = dict(os.environ, GIT_TERMINAL_PROMPT='0')
+    process = await asyncio.create_subprocess_exec(
+        'git', *args,
+        cwd=str(cwd) if cwd else None,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env,
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise GitCommandError(list(args), process.returncode,
+                              stderr.decode(errors='replace'))
+    return stdout.decode(errors='replace')
+
+
+def check_repo_url(git_url: str) -> None:
+    """
+    Raise ValueError for a repository URL git may not be pointed at: one
+    that would be read as an option, or whose scheme is not allowed
+    """
+    if git_url.startswith('-'):
+        raise ValueError(f"{git_url} is not a repository URL")
+    schemes = REMOTE_URL_SCHEMES + (('file',) if settings.CLONE_ALLOW_FILE_URLS else ())
+    scheme = urlsplit(git_url).scheme.lower()
+    if scheme not in schemes:
+        raise ValueError(f"Repository URLs must use one of: {', '.join(schemes)}")
+
+
+def find_routes_directory_in(paths: Set[str]) -> Optional[str]:
+    """
+    Pick the first common route directory present in a set of repo-relative
+    directory paths
+    """
+    for route_path in COMMON_ROUTE_PATHS:
+        if route_path in paths:
+            return route_path
+    return None
+
+
+def _resolve_module_candidates(route_file: str, module: str) -> List[str]:
+    """
+    Repo-relative paths a relative require() in a route file may point to
+    """
+    if not module.startswith('.'):
+        return []
+    bases = [
+        # node resolution, relative to the requiring file
+        posixpath.normpath(posixpath.join(posixpath.dirname(route_file), module)),
+        # NodeJSParser resolves '../x' against the repo root
+        posixpath.normpath(module.split('..')[-1].lstrip('/')),
+    ]
+    candidates = []
+    for base in bases:
+        candidates += [base, base + '.js', posixpath.join(base, 'index.js')]
+    return candidates
+
+
+def _required_controller_files(repo_path: Path, routes_dir: str,
+                               tracked_files: Set[str]) -> Set[str]:
+    """
+    Tracked files the route files of routes_dir require, read from the
+    checked-out routes directory
+    """
+    parser = NodeJSParser(routes_path=str(repo_path / routes_dir),
+                          repo_path=str(repo_path))
+    controller_files = set()
+    for path in tracked_files:
+        if not path.startswith(routes_dir + '/') or not path.endswith('.js'):
+            continue
+        content = parser._read_file_content(repo_path / path)
+        for module in parser._extract_controller_imports(content).values():
+            controller_files.update(
+                candidate for candidate in _resolve_module_candidates(path, module)
+                if candidate in tracked_files
+            )
+    return controller_files
+
+
+async def _sparse_checkout_routes(repo_path: Path) -> None:
+    """
+    Check out only the routes directory and the controller files its route
+    files require. Falls back to a full checkout when no routes directory
+    can be found.
+    """
+    # with a blob-filtered clone this only needs trees, not file contents
+    listing = await run_git('ls-tree', '-r', '--name-only', 'HEAD', cwd=repo_path)
+    tracked_files = set(listing.splitlines())
+    directories = {
+        posixpath.dirname(path) for path in tracked_files
+    }
+    for directory in list(directories):
+        while directory:
+            directory = posixpath.dirname(directory)
+            directories.add(directory)
+
+    routes_dir = find_routes_directory_in(directories)
+    if routes_dir is None:
+        await run_git('checkout', cwd=repo_path)
+        return
+
+    await run_git('sparse-checkout', 'set', '--no-cone', f'/{routes_dir}/',
+                  cwd=repo_path)
+    await run_git('checkout', cwd=repo_path)
+
+    controller_files = await asyncio.to_thread(
+        _required_controller_files, repo_path, routes_dir, tracked_files)
+
+    if controller_files:
+        await run_git('sparse-checkout', 'add',
+                      *sorted(f'/{path}' for path in controller_files),
+                      cwd=repo_path)
+
+
+async def clone_repo(
+    git_url: str,
+    depth: Optional[int] = None,
+    filter_blobs: Optional[bool] = None,
+    sparse: Optional[bool] = None,
+    dest: Optional[Path] = None,
+) -> Path:
+    """
+    Clone a repository without blocking the event loop. Defaults to a
+    shallow, blob-filtered clone; with sparse enabled only the route files and
+    the controllers they require are checked out.
+    """
+    depth = settings.CLONE_DEPTH if depth is None else depth
+    filter_blobs = settings.CLONE_FILTER_BLOBS if filter_blobs is None else filter_blobs
+    sparse = settings.CLONE_SPARSE if sparse is None else sparse
+
+    if dest is None:
+        temp_dir = tempfile.mkdtemp()
+        dest = Path(temp_dir) / 'repo'
+
+    args = ['clone', '--quiet']
+    if depth:
+        args += ['--depth', str(depth)]
+    if filter_blobs:
+        args.append('--filter=blob:none')
+    if sparse:
+        args.append('--no-checkout')
+    await run_git(*args, '--', git_url, str(dest))
+
+    if sparse:
+        await _sparse_checkout_routes(dest)
+    return dest
+
+
+async def head_commit(repo_path: Path) -> str:
+    return (await run_git('rev-parse', 'HEAD', cwd=repo_path)).strip()
+
+
+async def remote_head_commit(git_url: str) -> Optional[str]:
+    """
+    The commit the remote's HEAD points to, asked for without cloning, or
+    None if the remote does not say
+    """
+    output = await run_git('ls-remote', '--', git_url, 'HEAD')
+    for line in output.splitlines():
+        commit, _, ref = line.partition('\t')
+        if ref == 'HEAD':
+            return commit
+    return None
+
+
+async def update_repo(repo_path: Path, depth: Optional[int] = None) -> None:
+    """
+    Bring an existing clone up to date with the remote HEAD using an
+    incremental fetch. Shallow, blob-filtered and sparse clones keep their
+    settings.
+    """
+    depth = settings.CLONE_DEPTH if depth is None else depth
+
+    args = ['fetch', '--quiet']
+    if depth:
+        args += ['--depth', str(depth)]
+    await run_git(*args, 'origin', 'HEAD', cwd=repo_path)
+    await run_git('reset', '--quiet', '--hard', 'FETCH_HEAD', cwd=repo_path)
+
+    sparse = await run_git('config', '--bool', '--default', 'false',
+                           'core.sparseCheckout', cwd=repo_path)
+    if sparse.strip() == 'true':
+        # the routes may require controllers that were not checked out before
+        await _sparse_checkout_routes(repo_path)
 
 
 async def clean_up_repo(repo_path: Path):
-    shutil.rmtree(repo_path)
+    await asyncio.to_thread(shutil.rmtree, repo_path, ignore_errors=True)
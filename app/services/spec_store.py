@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from config import settings
+from app.database.database import api_collection
+from app.metrics import PERSIST_DURATION, SPECS_PERSISTED, timed
+
+logger = logging.getLogger(__name__)
+
+
+def spec_id(repo_url: str, commit: str, method: str, endpoint: str, file: str = '') -> str:
+    """
+    Stable document id of a spec, so writing the same parse twice updates
+    the documents in place instead of duplicating them. The route file is
+    part of the key: Express routers mounted at different prefixes often
+    declare the same relative endpoint.
+    """
+    key = "\0".join([repo_url.strip(), commit, method.lower(), endpoint, file])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class SpecStore:
+    """
+    Persists API specifications keyed by repository, commit, method,
+    endpoint and route file as unordered bulk upserts
+    """
+
+    def __init__(self, collection, batch_size: int, max_pending_batches: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_pending_batches = max_pending_batches
+        self._indexes_ready = False
+
+    async def ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        await self.collection.create_index(
+            [('repo_url', ASCENDING), ('commit', ASCENDING),
+             ('method', ASCENDING), ('endpoint', ASCENDING), ('files', ASCENDING)],
+            unique=True, name='repo_commit_method_endpoint_file',
+        )
+        # latest specs of a repository
+        await self.collection.create_index(
+            [('repo_url', ASCENDING), ('updated_at', DESCENDING)],
+            name='repo_updated_at',
+        )
+        # last write to a commit's specs, the version behind read ETags
+        await self.collection.create_index(
+            [('repo_url', ASCENDING), ('commit', ASCENDING), ('updated_at', DESCENDING)],
+            name='repo_commit_updated_at',
+        )
+        # keyset pagination of a commit's specs in endpoint order
+        await self.collection.create_index(
+            [('repo_url', ASCENDING), ('commit', ASCENDING),
+             ('endpoint', ASCENDING), ('_id', ASCENDING)],
+            name='repo_commit_endpoint',
+        )
+        self._indexes_ready = True
+
+    def _operation(self, repo_url: str, commit: str, spec: Dict[str, Any],
+                   now: datetime) -> UpdateOne:
+        document = dict(spec, repo_url=repo_url, commit=commit, updated_at=now)
+        document.pop('_id', None)
+        return UpdateOne(
+            {'_id': spec_id(repo_url, commit, spec['method'], spec['endpoint'],
+                            spec.get('files', ''))},
+            {'$set': document, '$setOnInsert': {'created_at': now}},
+            upsert=True,
+        )
+
+    async def write_batch(self, repo_url: str, commit: str,
+                          specs: List[Dict[str, Any]]) -> int:
+        """
+        Upsert one batch; returns the number of documents inserted or changed
+        """
+        if not specs:
+            return 0
+        await self.ensure_indexes()
+        now = datetime.now(timezone.utc)
+        # unordered, so one bad document does not stop the rest of the batch
+        with timed(PERSIST_DURATION):
+            result = await self.collection.bulk_write(
+                [self._operation(repo_url, commit, spec, now) for spec in specs],
+                ordered=False,
+            )
+        return result.upserted_count + result.modified_count
+
+    async def latest_commit(self, repo_url: str) -> Optional[str]:
+        document = await self.collection.find_one(
+            {'repo_url': repo_url}, {'commit': 1}, sort=[('updated_at', DESCENDING)])
+        return document['commit'] if document else None
+
+    async def last_updated(self, repo_url: str, commit: str) -> Optional[datetime]:
+        """
+        Time of the last write to a commit's specs. Every write sets
+        updated_at, so this changes whenever any of them does.
+        """
+        document = await self.collection.find_one(
+            {'repo_url': repo_url, 'commit': commit}, {'updated_at': 1},
+            sort=[('updated_at', DESCENDING)])
+        return document['updated_at'] if document else None
+
+    async def find_page(
+        self,
+        repo_url: str,
+        commit: str,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+        method: Optional[str] = None,
+        path_prefix: Optional[str] = None,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        One page of a commit's specs ordered by (endpoint, _id), starting
+        after the (endpoint, _id) of the last spec of the previous page
+        """
+        conditions: List[Dict[str, Any]] = [{'repo_url': repo_url, 'commit': commit}]
+        if method:
+            # Express specs store methods in lower case, Django ones in upper
+            conditions.append({'method': {'$in': [method.lower(), method.upper()]}})
+        if path_prefix:
+            # an anchored prefix can still use the endpoint index
+            conditions.append({'endpoint': {'$regex': '^' + re.escape(path_prefix)}})
+        if after is not None:
+            endpoint, last_id = after
+            conditions.append({'$or': [
+                {'endpoint': {'$gt': endpoint}},
+                {'endpoint': endpoint, '_id': {'$gt': last_id}},
+            ]})
+        cursor = self.collection.find({'$and': conditions}, projection)
+        cursor = cursor.sort([('endpoint', ASCENDING), ('_id', ASCENDING)]).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    def writer(self, repo_url: str, commit: str,
+               repo_path: Optional[str] = None) -> 'SpecWriter':
+        return SpecWriter(self, repo_url, commit, repo_path)
+
+
+class SpecWriter:
+    """
+    Write-behind buffer for the specs of one repository at one commit. add()
+    only blocks once max_pending_batches are already being written, so the
+    caller keeps parsing or generating while earlier batches flush.
+    """
+
+    def __init__(self, store: SpecStore, repo_url: str, commit: str,
+                 repo_path: Optional[str] = None):
+        self.store = store
+        self.repo_url = repo_url
+        self.commit = commit
+        # spec file paths are stored relative to the checkout
+        self.repo_path = repo_path
+        self.written = 0
+        self.failed = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._pending: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(store.max_pending_batches)
+
+    def _relative(self, path: str) -> str:
+        if not os.path.isabs(path):
+            return path
+        return Path(os.path.relpath(path, self.repo_path)).as_posix()
+
+    def _prepare(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        # absolute paths differ between checkouts of the same commit
+        if not self.repo_path:
+            return spec
+        if spec.get('files'):
+            spec = dict(spec, files=self._relative(spec['files']))
+        location = spec.get('controller_location')
+        if location and location.get('file'):
+            spec = dict(spec, controller_location=dict(
+                location, file=self._relative(location['file'])))
+        return spec
+
+    async def add(self, spec: Dict[str, Any]) -> None:
+        self._buffer.append(self._prepare(spec))
+        if len(self._buffer) >= self.store.batch_size:
+            await self._flush_buffer()
+
+    async def _flush_buffer(self) -> None:
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        await self._slots.acquire()
+        task = asyncio.create_task(self._write(batch))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        written = failed = 0
+        try:
+            written = await self.store.write_batch(self.repo_url, self.commit, batch)
+        except BulkWriteError as e:
+            # the rest of an unordered batch is still written
+            details = e.details
+            written = details.get('nUpserted', 0) + details.get('nModified', 0)
+            failed = len(details.get('writeErrors', []))
+            logger.warning("Writing specs of %s failed for %d of %d documents",
+                           self.repo_url, failed, len(batch))
+        except Exception as e:
+            failed = len(batch)
+            logger.warning("Writing %d specs of %s failed: %s",
+                           len(batch), self.repo_url, e)
+        finally:
+            self._slots.release()
+        self.written += written
+        self.failed += failed
+        SPECS_PERSISTED.labels(outcome='written').inc(written)
+        SPECS_PERSISTED.labels(outcome='failed').inc(failed)
+
+    async def close(self) -> None:
+        """
+        Write what is still buffered and wait for every batch in flight
+        """
+        await self._flush_buffer()
+        if self._pending:
+            await asyncio.gather(*self._pending)
+
+    def cancel(self) -> None:
+        for task in self._pending:
+            task.cancel()
+
+
+_spec_store: Optional[SpecStore] = None
+
+
+def get_spec_store() -> SpecStore:
+    global _spec_store
+    if _spec_store is None:
+        _spec_store = SpecStore(
+            api_collection,
+            batch_size=settings.SPEC_STORE_BATCH_SIZE,
+            max_pending_batches=settings.SPEC_STORE_MAX_PENDING_BATCHES,
+        )
+    return _spec_store
@@ -0,0 +1,167 @@
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# fields of a spec that are kept per route as they are
+ROUTE_FIELDS = (
+    'endpoint', 'method', 'controller_signature', 'request_data',
+    'expected_response', 'auth_required', 'test_cases', 'api_schema',
+)
+
+
+def read_code(path: str, start: int, end: int) -> Optional[str]:
+    """
+    Read controller code back from the byte span it was parsed from
+    """
+    try:
+        with open(path, 'rb') as file:
+            file.seek(start)
+            return file.read(end - start).decode('utf-8')
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning("Reading code from %s failed: %s", path, e)
+        return None
+
+
+class SpecTable:
+    """
+    Normalized form of a list of API specifications. File paths, middleware
+    lists and controller code are stored once in shared tables and routes
+    refer to them by index. Code with a known location can be dropped and
+    read back lazily from the checkout.
+
+    With a root, file paths are stored relative to it and expanded back to
+    absolute paths.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = str(root) if root is not None else None
+        self.files: List[str] = []
+        self.middleware: List[List[str]] = []
+        self.code: List[str] = []
+        self.routes: List[Dict[str, Any]] = []
+        self._file_ids: Dict[str, int] = {}
+        self._middleware_ids: Dict[Tuple[str, ...], int] = {}
+        self._code_ids: Dict[str, int] = {}
+
+    def _intern_file(self, path: str) -> int:
+        if self.root is not None and os.path.isabs(path):
+            path = Path(os.path.relpath(path, self.root)).as_posix()
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            file_id = self._file_ids[path] = len(self.files)
+            self.files.append(path)
+        return file_id
+
+    def _intern_middleware(self, middleware: List[str]) -> int:
+        key = tuple(middleware)
+        middleware_id = self._middleware_ids.get(key)
+        if middleware_id is None:
+            middleware_id = self._middleware_ids[key] = len(self.middleware)
+            self.middleware.append(list(middleware))
+        return middleware_id
+
+    def _intern_code(self, code: str) -> int:
+        code_id = self._code_ids.get(code)
+        if code_id is None:
+            code_id = self._code_ids[code] = len(self.code)
+            self.code.append(code)
+        return code_id
+
+    def add(self, spec: Dict[str, Any], keep_code: bool = True) -> None:
+        """
+        Add an expanded spec. With keep_code False the code of a spec whose
+        location is known is not stored; it is read from disk on expansion.
+        """
+        route = {field: spec[field] for field in ROUTE_FIELDS if field in spec}
+        route['file'] = self._intern_file(spec['files']) if spec.get('files') else None
+        route['middleware'] = self._intern_middleware(spec.get('middleware') or [])
+        location = spec.get('controller_location')
+        if location:
+            route['code_file'] = self._intern_file(location['file'])
+            route['code_start'] = location['start']
+            route['code_end'] = location['end']
+        if keep_code or not location:
+            route['code'] = self._intern_code(spec.get('controller_code') or '')
+        self.routes.append(route)
+
+    @classmethod
+    def from_specs(cls, specs: Iterable[Dict[str, Any]], root: Optional[str] = None,
+                   keep_code: bool = True) -> 'SpecTable':
+        table = cls(root)
+        for spec in specs:
+            table.add(spec, keep_code=keep_code)
+        return table
+
+    def _path(self, file_id: int) -> str:
+        path = self.files[file_id]
+        return os.path.join(self.root, path) if self.root is not None else path
+
+    def load_code(self, route: Dict[str, Any]) -> str:
+        if route.get('code') is not None:
+            return self.code[route['code']]
+        if route.get('code_file') is not None:
+            code = read_code(self._path(route['code_file']),
+                             route['code_start'], route['code_end'])
+            if code is not None:
+                return code
+        return ''
+
+    def expand(self, route: Dict[str, Any]) -> Dict[str, Any]:
+        spec = {field: route[field] for field in ROUTE_FIELDS if field in route}
+        spec['controller_code'] = self.load_code(route)
+        spec['files'] = self._path(route['file']) if route.get('file') is not None else ''
+        spec['middleware'] = list(self.middleware[route['middleware']])
+        spec['controller_location'] = None
+        if route.get('code_file') is not None:
+            spec['controller_location'] = {
+                'file': self._path(route['code_file']),
+                'start': route['code_start'],
+                'end': route['code_end'],
+            }
+        return spec
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for route in self.routes:
+            yield self.expand(route)
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def expanded(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def routes_by_file(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Routes grouped by their stored (relative, with a root) file path
+        """
+        grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for route in self.routes:
+            if route.get('file') is not None:
+                grouped[self.files[route['file']]].append(route)
+        return grouped
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            'files': self.files,
+            'middleware': self.middleware,
+            'code': self.code,
+            'routes': self.routes,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], root: Optional[str] = None) -> 'SpecTable':
+        table = cls(root)
+        table.files = list(payload.get('files', []))
+        table.middleware = [list(middleware) for middleware in payload.get('middleware', [])]
+        table.code = list(payload.get('code', []))
+        table.routes = [dict(route) for route in payload.get('routes', [])]
+        table._file_ids = {path: index for index, path in enumerate(table.files)}
+        table._middleware_ids = {
+            tuple(middleware): index for index, middleware in enumerate(table.middleware)
+        }
+        table._code_ids = {code: index for index, code in enumerate(table.code)}
+        return table
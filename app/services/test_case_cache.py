@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from config import settings
+from app.database.database import test_case_cache_collection
+
+logger = logging.getLogger(__name__)
+
+# the only spec fields that end up in the test case prompt
+PROMPT_FIELDS = ('method', 'endpoint', 'request_data',
+                 'expected_response', 'auth_required')
+
+
+def test_case_cache_key(endpoint_data: Dict[str, Any], model_name: str) -> str:
+    """
+    Stable hash of the prompt inputs of an endpoint plus the model name
+    """
+    payload = {field: endpoint_data.get(field) for field in PROMPT_FIELDS}
+    payload['model'] = model_name
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'),
+                         default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """
+    In-process LRU with a per-entry TTL
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MongoCacheStore:
+    """
+    Persistent tier backed by a Mongo collection. Expiry is handled by a TTL
+    index; the entry count is bounded by evicting the least recently used
+    documents.
+    """
+    EVICTION_CHECK_INTERVAL = 100
+
+    def __init__(self, collection, ttl: int, max_entries: int):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._indexes_ready = False
+        self._writes_since_check = 0
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        await self.collection.create_index('expires_at', expireAfterSeconds=0)
+        await self.collection.create_index('last_used')
+        self._indexes_ready = True
+
+    async def get(self, key: str) -> Optional[str]:
+        await self._ensure_indexes()
+        now = datetime.now(timezone.utc)
+        # TTL monitor runs about once a minute, so filter on expiry as well
+        document = await self.collection.find_one_and_update(
+            {'_id': key, 'expires_at': {'$gt': now}},
+            {'$set': {'last_used': now}},
+        )
+        return document['test_cases'] if document else None
+
+    async def set(self, key: str, value: str, model_name: str) -> None:
+        await self._ensure_indexes()
+        now = datetime.now(timezone.utc)
+        await self.collection.replace_one(
+            {'_id': key},
+            {
+                'test_cases': value,
+                'model': model_name,
+                'created_at': now,
+                'last_used': now,
+                'expires_at': now + timedelta(seconds=self.ttl),
+            },
+            upsert=True,
+        )
+        self._writes_since_check += 1
+        if self._writes_since_check >= self.EVICTION_CHECK_INTERVAL:
+            self._writes_since_check = 0
+            await self.evict()
+
+    async def evict(self) -> int:
+        excess = await self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return 0
+        cursor = self.collection.find({}, {'_id': 1}).sort(
+            'last_used', 1).limit(excess)
+        stale_ids = [document['_id'] async for document in cursor]
+        if stale_ids:
+            await self.collection.delete_many({'_id': {'$in': stale_ids}})
+        return len(stale_ids)
+
+
+class TestCaseCache:
+    """
+    Two-tier cache of generated test cases: an in-process LRU in front of an
+    optional persistent store. Errors from the persistent tier, and calls to
+    it taking longer than store_timeout seconds, are logged and treated as
+    misses so generation never fails or stalls because of the cache.
+    """
+
+    def __init__(self, lru: LRUCache, store: Optional[MongoCacheStore] = None,
+                 store_timeout: float = 0.5):
+        self.lru = lru
+        self.store = store
+        self.store_timeout = store_timeout
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.lru.get(key)
+        if value is None and self.store is not None:
+            try:
+                async with asyncio.timeout(self.store_timeout):
+                    value = await self.store.get(key)
+            except Exception as e:
+                logger.warning("Test case cache lookup failed: %r", e)
+            if value is not None:
+                self.lru.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str, model_name: str) -> None:
+        self.lru.set(key, value)
+        if self.store is not None:
+            try:
+                async with asyncio.timeout(self.store_timeout):
+                    await self.store.set(key, value, model_name)
+            except Exception as e:
+                logger.warning("Test case cache write failed: %r", e)
+
+
+_cache: Optional[TestCaseCache] = None
+
+
+def get_test_case_cache() -> Optional[TestCaseCache]:
+    """
+    Return the process-wide cache, or None when caching is disabled
+    """
+    global _cache
+    if not settings.TEST_CASE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        store = None
+        if settings.TEST_CASE_CACHE_PERSISTENT:
+            store = MongoCacheStore(test_case_cache_collection,
+                                    ttl=settings.TEST_CASE_CACHE_TTL,
+                                    max_entries=settings.TEST_CASE_CACHE_MAX_ENTRIES)
+        _cache = TestCaseCache(
+            lru=LRUCache(settings.TEST_CASE_CACHE_LRU_SIZE,
+                         settings.TEST_CASE_CACHE_TTL),
+            store=store,
+            store_timeout=settings.TEST_CASE_CACHE_STORE_TIMEOUT,
+        )
+    return _cache
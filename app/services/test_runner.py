@@ -0,0 +1,446 @@
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+import httpx
+from config import settings
+from app.database.database import report_collection
+from app.metrics import TEST_CASE_REQUEST_DURATION
+from app.services.spec_store import get_spec_store
+
+logger = logging.getLogger(__name__)
+
+RUN_RUNNING = 'running'
+RUN_FINISHED = 'finished'
+RUN_FAILED = 'failed'
+RUN_INTERRUPTED = 'interrupted'
+
+OUTCOME_PASSED = 'passed'
+OUTCOME_FAILED = 'failed'
+OUTCOME_ERROR = 'error'
+
+# stand-in for a path parameter a test case gives no value for
+DEFAULT_PATH_VALUE = '1'
+# :id (Express), <int:pk> (Django) and {id} (OpenAPI) path parameters
+PATH_PARAMETER = re.compile(r':(\w+)|<(?:\w+:)?(\w+)>|\{(\w+)\}')
+# an endpoint with a scheme or host of its own: http://..., //host/...
+ABSOLUTE_URL = re.compile(r'^\s*(?:[A-Za-z][A-Za-z0-9+.-]*:|[/\\]{2})')
+JSON_FENCE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL)
+
+SPEC_PAGE_SIZE = 500
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _decode_json(text: str) -> Any:
+    """
+    The first JSON value in text, which models like to wrap in a Markdown
+    fence or in prose
+    """
+    fenced = JSON_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    starts = [index for index in (text.find('['), text.find('{')) if index >= 0]
+    if not starts:
+        raise ValueError("No JSON in test cases")
+    value, _ = json.JSONDecoder().raw_decode(text[min(starts):])
+    return value
+
+
+def parse_test_cases(text: str) -> List[Dict[str, Any]]:
+    """
+    The test cases of a spec's generated test_cases text. Raises ValueError
+    for text that holds none, e.g. a generation failure message.
+    """
+    data = _decode_json(text or '')
+    if isinstance(data, dict):
+        data = data.get('test_cases', data.get('tests', [data]))
+    if not isinstance(data, list):
+        raise ValueError("Test cases are not a list")
+    return [case for case in data if isinstance(case, dict)]
+
+
+def _as_data(value: Any) -> Any:
+    # structured output sends request parts as JSON-encoded strings
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _as_mapping(value: Any) -> Dict[str, Any]:
+    value = _as_data(value)
+    return value if isinstance(value, dict) else {}
+
+
+def _expected_status(case: Dict[str, Any]) -> Optional[int]:
+    for key in ('expected_status', 'status_code', 'status'):
+        value = case.get(key)
+        if value is None:
+            continue
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _fill_path(endpoint: str, params: Dict[str, Any]) -> str:
+    """
+    The request path of an endpoint. Raises ValueError for an endpoint that
+    is a URL rather than a path, as requests go to base_url's host only.
+    """
+    if ABSOLUTE_URL.match(endpoint):
+        raise ValueError(f"Endpoint {endpoint} is not a path")
+
+    def substitute(match: re.Match) -> str:
+        name = next(group for group in match.groups() if group)
+        return quote(str(params.get(name, DEFAULT_PATH_VALUE)), safe='')
+
+    path = PATH_PARAMETER.sub(substitute, endpoint)
+    return path if path.startswith('/') else '/' + path
+
+
+class PlannedRequest:
+    """
+    One generated test case of a spec, as the HTTP request it stands for
+    """
+    __slots__ = ('method', 'endpoint', 'name', 'path', 'query', 'headers', 'body',
+                 'expected_status')
+
+    def __init__(self, spec: Dict[str, Any], case: Dict[str, Any]):
+        request = _as_mapping(case.get('request'))
+        params = _as_mapping(request.get('params'))
+        self.method = str(spec['method']).upper()
+        self.endpoint = spec['endpoint']
+        self.name = str(case.get('name') or case.get('description') or '')
+        self.path = _fill_path(self.endpoint, params)
+        self.query = {key: value for key, value in _as_mapping(request.get('query')).items()
+                      if value is not None}
+        self.headers = {str(key): str(value)
+                        for key, value in _as_mapping(request.get('headers')).items()}
+        self.body = _as_data(request.get('body'))
+        self.expected_status = _expected_status(case)
+
+    def passed(self, status: int) -> bool:
+        if self.expected_status is None:
+            return status < 400
+        return status == self.expected_status
+
+
+def plan_requests(spec: Dict[str, Any]) -> List[PlannedRequest]:
+    """
+    The requests of a spec's test cases; raises ValueError for test cases
+    that cannot be parsed
+    """
+    return [PlannedRequest(spec, case) for case in parse_test_cases(spec.get('test_cases', ''))]
+
+
+class HostRateLimiter:
+    """
+    Token buckets allowing rate requests per second to each host, in bursts
+    of up to burst. A rate of 0 or less leaves requests unlimited.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        # host -> (tokens, time they were counted)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def acquire(self, host: str) -> None:
+        if self.rate <= 0:
+            return
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        # waiters queue on the lock, so they are let through in arrival order
+        async with lock:
+            now = time.monotonic()
+            tokens, counted = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted) * self.rate)
+            if tokens < 1:
+                await asyncio.sleep((1 - tokens) / self.rate)
+                now, tokens = time.monotonic(), 1.0
+            self._buckets[host] = (tokens - 1, now)
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of sorted values
+    """
+    if not values:
+        return None
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+
+def latency_stats(latencies: Iterable[float]) -> Dict[str, Optional[float]]:
+    values = sorted(latencies)
+    return {
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': values[-1] if values else None,
+        'mean': sum(values) / len(values) if values else None,
+    }
+
+
+class TestRunner:
+    """
+    Sends planned requests to the service at base_url over one pooled
+    keep-alive client. At most concurrency requests are in flight, each
+    host is limited to rate_limit requests per second, and a request that
+    takes longer than timeout seconds is recorded as an error. A custom
+    transport, e.g. httpx.ASGITransport, runs against an in-process app.
+    """
+
+    def __init__(self, base_url: str, concurrency: int = 50, rate_limit: float = 0,
+                 timeout: float = 10.0, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.transport = transport
+        self.rate_limiter = HostRateLimiter(rate_limit)
+
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.concurrency,
+                              max_keepalive_connections=self.concurrency)
+        return httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                 limits=limits, transport=self.transport)
+
+    async def _send(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                    request: PlannedRequest) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            'method': request.method,
+            'endpoint': request.endpoint,
+            'name': request.name,
+            'path': request.path,
+            'expected_status': request.expected_status,
+            'status': None,
+            'passed': False,
+            'latency': None,
+            'error': None,
+        }
+        async with semaphore:
+            # appended to base_url's path rather than resolved against it,
+            # which could lead off to another host
+            base = client.base_url
+            url = base.copy_with(path=base.path.rstrip('/') + request.path)
+            if url.netloc != base.netloc:
+                result['error'] = f"{request.path} does not stay on {base.host}"
+                return result
+            await self.rate_limiter.acquire(url.host)
+            body = request.body
+            start = time.perf_counter()
+            try:
+                # httpx times connecting, writing and reading separately; the
+                # case as a whole gets timeout seconds too
+                async with asyncio.timeout(self.timeout):
+                    response = await client.request(
+                        request.method, url, params=request.query or None,
+                        headers=request.headers or None,
+                        json=body if body is not None and not isinstance(body, str) else None,
+                        content=body if isinstance(body, str) else None,
+                    )
+            except (httpx.TimeoutException, TimeoutError):
+                result['error'] = 'timeout'
+            except Exception as e:
+                # besides httpx errors, an in-process app's own exceptions
+                # surface here; either way the case errored, not the run
+                result['error'] = f"{type(e).__name__}: {e}"
+            else:
+                result['status'] = response.status_code
+                result['passed'] = request.passed(response.status_code)
+            result['latency'] = time.perf_counter() - start
+
+        outcome = (OUTCOME_ERROR if result['error']
+                   else OUTCOME_PASSED if result['passed'] else OUTCOME_FAILED)
+        TEST_CASE_REQUEST_DURATION.labels(outcome=outcome).observe(result['latency'])
+        return result
+
+    async def run(self, requests: List[PlannedRequest]) -> List[Dict[str, Any]]:
+        """
+        Send every request and return their results in request order
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._client() as client:
+            return await asyncio.gather(
+                *(self._send(client, semaphore, request) for request in requests))
+
+
+def summarize(results: List[Dict[str, Any]], seconds: float,
+              unparseable_specs: int = 0) -> Dict[str, Any]:
+    passed = sum(1 for result in results if result['passed'])
+    errors = sum(1 for result in results if result['error'])
+    return {
+        'cases': len(results),
+        'passed': passed,
+        'failed': len(results) - passed - errors,
+        'errors': errors,
+        'unparseable_specs': unparseable_specs,
+        'seconds': seconds,
+        'cases_per_second': len(results) / seconds if seconds > 0 else None,
+        'latency': latency_stats(result['latency'] for result in results
+                                 if result['latency'] is not None),
+    }
+
+
+def check_base_url(base_url: str) -> None:
+    """
+    Raise ValueError for a base URL that is not http(s), and PermissionError
+    for one whose host is not in TEST_RUNNER_ALLOWED_HOSTS; with none
+    allowed, test runs are disabled
+    """
+    parts = urlsplit(base_url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f"{base_url} is not an http(s) URL")
+    allowed = [host.lower() for host in settings.TEST_RUNNER_ALLOWED_HOSTS]
+    if not allowed:
+        raise PermissionError("Test runs are disabled")
+    if parts.hostname.lower() not in allowed:
+        raise PermissionError(f"{parts.hostname} is not an allowed test target")
+
+
+class TestRunManager:
+    """
+    Runs the generated test cases of a repository's stored specs against a
+    service in the background and records each run as a report: status,
+    pass/fail counts, latency percentiles and per-case results.
+    """
+
+    def __init__(self, collection, spec_store=None, transport=None):
+        self.collection = collection
+        self.spec_store = spec_store or get_spec_store()
+        self.transport = transport
+        self._runs: Dict[str, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        # runs cannot resume, as their requests would be sent twice
+        await self.collection.update_many(
+            {'kind': 'test_run', 'status': RUN_RUNNING},
+            {'$set': {'status': RUN_INTERRUPTED, 'finished_at': _now()}},
+        )
+
+    async def stop(self) -> None:
+        tasks = list(self._runs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, repo_url: str, base_url: str, commit: Optional[str] = None,
+                     concurrency: Optional[int] = None, rate_limit: Optional[float] = None,
+                     timeout: Optional[float] = None) -> str:
+        """
+        Start a run of the specs of commit, by default the latest parsed
+        one, and return its id. Raises LookupError when there are no specs,
+        ValueError for a base URL that is not http(s) and PermissionError
+        for one that may not be targeted.
+        """
+        check_base_url(base_url)
+        if commit is None:
+            commit = await self.spec_store.latest_commit(repo_url)
+            if commit is None:
+                raise LookupError(f"No specs stored for {repo_url}")
+        options = {
+            'concurrency': concurrency or settings.TEST_RUNNER_CONCURRENCY,
+            'rate_limit': rate_limit if rate_limit is not None else settings.TEST_RUNNER_RATE_LIMIT,
+            'timeout': timeout or settings.TEST_RUNNER_TIMEOUT,
+        }
+        run_id = uuid.uuid4().hex
+        await self.collection.insert_one({
+            '_id': run_id,
+            'kind': 'test_run',
+            'repo_url': repo_url,
+            'commit': commit,
+            'base_url': base_url,
+            'options': options,
+            'status': RUN_RUNNING,
+            'summary': None,
+            'results': [],
+            'error': None,
+            'created_at': _now(),
+            'finished_at': None,
+        })
+        task = asyncio.create_task(self._run(run_id, repo_url, commit, base_url, options))
+        self._runs[run_id] = task
+        task.add_done_callback(lambda _: self._runs.pop(run_id, None))
+        return run_id
+
+    async def get(self, run_id: str, include_results: bool = False) -> Optional[Dict[str, Any]]:
+        projection = None if include_results else {'results': 0}
+        return await self.collection.find_one({'_id': run_id, 'kind': 'test_run'}, projection)
+
+    async def _planned_requests(self, repo_url: str, commit: str) -> Tuple[List[PlannedRequest], int]:
+        requests: List[PlannedRequest] = []
+        unparseable = 0
+        after = None
+        projection = {'method': 1, 'endpoint': 1, 'test_cases': 1}
+        while True:
+            page = await self.spec_store.find_page(
+                repo_url, commit, SPEC_PAGE_SIZE, after=after, projection=projection)
+            for spec in page:
+                try:
+                    requests.extend(plan_requests(spec))
+                except ValueError:
+                    unparseable += 1
+            if len(page) < SPEC_PAGE_SIZE:
+                return requests, unparseable
+            after = (page[-1]['endpoint'], page[-1]['_id'])
+
+    async def _run(self, run_id: str, repo_url: str, commit: str, base_url: str,
+                   options: Dict[str, Any]) -> None:
+        try:
+            requests, unparseable = await self._planned_requests(repo_url, commit)
+            runner = TestRunner(base_url, transport=self.transport, **options)
+            start = time.perf_counter()
+            results = await runner.run(requests)
+            summary = summarize(results, time.perf_counter() - start, unparseable)
+        except asyncio.CancelledError:
+            await self.collection.update_one(
+                {'_id': run_id},
+                {'$set': {'status': RUN_INTERRUPTED, 'finished_at': _now()}})
+            raise
+        except Exception as e:
+            logger.exception("Test run %s failed", run_id)
+            await self.collection.update_one(
+                {'_id': run_id},
+                {'$set': {'status': RUN_FAILED, 'error': str(e), 'finished_at': _now()}})
+            return
+
+        # failures are kept first when a run has more results than are stored
+        stored = sorted(results, key=lambda result: result['passed'])
+        stored = stored[:settings.TEST_RUNNER_MAX_STORED_RESULTS]
+        summary['results_truncated'] = len(stored) < len(results)
+        logger.info("Test run %s: %d of %d cases passed in %.1fs", run_id,
+                    summary['passed'], summary['cases'], summary['seconds'])
+        await self.collection.update_one({'_id': run_id}, {'$set': {
+            'status': RUN_FINISHED,
+            'summary': summary,
+            'results': stored,
+            'finished_at': _now(),
+        }})
+
+
+_manager: Optional[TestRunManager] = None
+
+
+def get_test_run_manager() -> TestRunManager:
+    global _manager
+    if _manager is None:
+        _manager = TestRunManager(report_collection)
+    return _manager
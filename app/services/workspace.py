@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Set
+from config import settings
+from app.services.repo_utils import clone_repo, head_commit, update_repo
+
+logger = logging.getLogger(__name__)
+
+
+def directory_size(path: Path) -> int:
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class Workspace:
+    def __init__(self, key: str, path: Path):
+        self.key = key
+        self.path = path
+        self.lock = asyncio.Lock()
+        # requests holding or waiting for the lock; a workspace is only
+        # evicted when there are none
+        self.leases = 0
+        self.size_bytes = 0
+        self.last_used = 0.0
+
+
+class WorkspacePool:
+    """
+    Keeps one checkout per repository URL on disk and refreshes it with an
+    incremental fetch instead of cloning it again. The total size of the
+    checkouts is kept under a quota by evicting the least recently used ones;
+    evicted directories are deleted in the background.
+
+    A checkout is locked while it is leased so that a fetch never rewrites
+    files another request is still reading. Checkouts that are leased or
+    waited for are never evicted, nor is the one just released, so a
+    repository larger than the quota is still reused.
+    """
+    TRASH_DIR = '.trash'
+
+    def __init__(self, root: Path, quota_bytes: int):
+        self.root = Path(root)
+        self.quota_bytes = quota_bytes
+        self._workspaces: Dict[str, Workspace] = {}
+        self._loaded = False
+        # the first requests wait for the pool to be loaded, not just begun
+        self._load_lock = asyncio.Lock()
+        self._cleanup_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def workspace_key(repo_url: str) -> str:
+        return hashlib.sha256(repo_url.strip().encode('utf-8')).hexdigest()[:32]
+
+    async def _load_existing(self) -> None:
+        """
+        Adopt checkouts left on disk by a previous process
+        """
+        async with self._load_lock:
+            if self._loaded:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            trash = self.root / self.TRASH_DIR
+            if trash.exists():
+                self._delete_in_background(trash)
+
+            for entry in os.scandir(self.root):
+                if entry.name == self.TRASH_DIR or not entry.is_dir():
+                    continue
+                workspace = Workspace(entry.name, Path(entry.path))
+                workspace.last_used = entry.stat().st_mtime
+                workspace.size_bytes = await asyncio.to_thread(
+                    directory_size, workspace.path)
+                self._workspaces[entry.name] = workspace
+            self._loaded = True
+
+    @asynccontextmanager
+    async def checkout(self, repo_url: str) -> AsyncIterator[Path]:
+        """
+        Lease an up-to-date checkout of repo_url for the duration of the block
+        """
+        await self._load_existing()
+        key = self.workspace_key(repo_url)
+        workspace = self._workspaces.get(key)
+        if workspace is None:
+            workspace = Workspace(key, self.root / key)
+            self._workspaces[key] = workspace
+
+        # counted before waiting, so the workspace cannot be evicted, and a
+        # second one created for the same directory, while this request waits
+        workspace.leases += 1
+        try:
+            async with workspace.lock:
+                if await self._refresh(workspace, repo_url):
+                    workspace.size_bytes = await asyncio.to_thread(
+                        directory_size, workspace.path)
+                workspace.last_used = time.time()
+                try:
+                    yield workspace.path
+                finally:
+                    workspace.last_used = time.time()
+        finally:
+            workspace.leases -= 1
+
+        self._evict(keep=workspace)
+
+    async def _refresh(self, workspace: Workspace, repo_url: str) -> bool:
+        """
+        Bring the checkout up to date; True when its files changed, so the
+        recorded size no longer holds
+        """
+        if (workspace.path / '.git').exists():
+            try:
+                before = await head_commit(workspace.path)
+                await update_repo(workspace.path)
+                return await head_commit(workspace.path) != before
+            except Exception as e:
+                logger.warning("Refreshing %s failed, cloning again: %s",
+                               repo_url, e)
+        await self._reclone(workspace, repo_url)
+        return True
+
+    async def _reclone(self, workspace: Workspace, repo_url: str) -> None:
+        if workspace.path.exists():
+            self._move_to_trash(workspace.path)
+        await clone_repo(repo_url, dest=workspace.path)
+
+    def _evict(self, keep: Optional[Workspace] = None) -> None:
+        total = sum(w.size_bytes for w in self._workspaces.values())
+        if total <= self.quota_bytes:
+            return
+        for workspace in sorted(self._workspaces.values(), key=lambda w: w.last_used):
+            if total <= self.quota_bytes:
+                break
+            if workspace is keep or workspace.leases:
+                continue
+            del self._workspaces[workspace.key]
+            total -= workspace.size_bytes
+            if workspace.path.exists():
+                self._move_to_trash(workspace.path)
+            logger.info("Evicted workspace %s (%d bytes)",
+                        workspace.key, workspace.size_bytes)
+
+    def _move_to_trash(self, path: Path) -> None:
+        # a rename is cheap; the actual deletion happens off the request path
+        trash = self.root / self.TRASH_DIR
+        trash.mkdir(parents=True, exist_ok=True)
+        target = trash / f"{path.name}-{uuid.uuid4().hex}"
+        os.rename(path, target)
+        self._delete_in_background(target)
+
+    def _delete_in_background(self, path: Path) -> None:
+        task = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(shutil.rmtree, path, ignore_errors=True))
+        self._cleanup_tasks.add(task)
+        task.add_done_callback(self._cleanup_tasks.discard)
+
+    async def wait_for_cleanup(self) -> None:
+        if self._cleanup_tasks:
+            await asyncio.gather(*self._cleanup_tasks)
+
+
+_pool: Optional[WorkspacePool] = None
+
+
+def get_workspace_pool() -> WorkspacePool:
+    global _pool
+    if _pool is None:
+        root = settings.WORKSPACE_ROOT or os.path.join(
+            tempfile.gettempdir(), 'orbitapi-workspaces')
+        _pool = WorkspacePool(Path(root), settings.WORKSPACE_QUOTA_BYTES)
+    return _pool
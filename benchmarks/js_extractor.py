@@ -0,0 +1,132 @@
+"""
+Benchmark of the JavaScript handler extractor against the regexes it
+replaced, on inputs that make those regexes backtrack.
+
+    python -m benchmarks.js_extractor [--budget SECONDS] [--json PATH]
+
+Each case is run at doubling sizes. A legacy regex stops being measured once
+a single run exceeds the budget; the scanner should grow linearly throughout.
+'found' counts the route calls and handler bodies each extractor reports,
+which shows where the legacy patterns miss real code or match commented out
+or quoted code.
+"""
+import argparse
+import json
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.parsers.js_scanner import JSScan, find_function_definitions, find_route_calls
+
+# the patterns NodeJSParser used before the tokenizer-based extractor
+LEGACY_ROUTE_PATTERN = (
+    r"router\.(get|post|put|patch|delete)\(['\"](.+?)['\"],\s*"
+    r"(\w+|\(.*?\)\s*=>\s*\{.*?\})"
+)
+LEGACY_CONTROLLER_PATTERN = (
+    r"(?:const|let|var)\s+handler\s*=\s*async\s*\([^)]*\)\s*=>\s*"
+    r"\{(?:[^{}]|{\s*(?:[^{}]|{\s*(?:[^{}]|{\s*[^{}]*\})*\})*\})*\}"
+)
+
+
+def routes_without_braces(size: int) -> str:
+    # expression-bodied arrows never match `=> {`, so the lazy DOTALL
+    # groups rescan the rest of the file for every route call
+    return "router.get('/items', (req, res) => res.json(items));\n" * size
+
+
+def unterminated_handler(size: int) -> str:
+    # an unclosed body makes the nested alternation try every split of the
+    # whitespace between '{\s*' and '[^{}]'
+    return "const handler = async (req, res) => {" + "{ " * 3 + " " * size
+
+
+def deeply_nested_handler(size: int) -> str:
+    depth = max(1, size // 50)
+    body = "if (x) { " * depth + "res.json({ ok: 1 });" + " }" * depth
+    filler = "  const s = '}{';\n" * size
+    return f"const handler = async (req, res) => {{\n{filler}{body}\n}};\n"
+
+
+def strings_and_comments(size: int) -> str:
+    line = (
+        "// router.get('/commented', handler) {\n"
+        "const s = \"router.post('/string', (req, res) => {\";\n"
+        "const t = `${ { a: '}' }.a } }`;\n"
+        "const r = /[{}]+\\//g;\n"
+    )
+    return line * size + "router.get('/real', (req, res) => { res.json({}); });\n"
+
+
+CASES: Dict[str, Callable[[int], str]] = {
+    'routes_without_braces': routes_without_braces,
+    'unterminated_handler': unterminated_handler,
+    'deeply_nested_handler': deeply_nested_handler,
+    'strings_and_comments': strings_and_comments,
+}
+
+
+def legacy_extract(source: str) -> int:
+    routes = re.findall(LEGACY_ROUTE_PATTERN, source, re.MULTILINE | re.DOTALL)
+    handler = re.search(LEGACY_CONTROLLER_PATTERN, source, re.DOTALL)
+    return len(routes) + bool(handler)
+
+
+def scanner_extract(source: str) -> int:
+    scan = JSScan(source)
+    routes = find_route_calls(source, scan)
+    handlers = find_function_definitions(source, scan)
+    return len(routes) + len(handlers)
+
+
+def _timed(function: Callable[[str], int], source: str) -> Tuple[float, int]:
+    start = time.perf_counter()
+    found = function(source)
+    return time.perf_counter() - start, found
+
+
+def run(sizes: List[int], budget: float) -> List[Dict[str, object]]:
+    results = []
+    for name, make_source in CASES.items():
+        legacy_over_budget = False
+        for size in sizes:
+            source = make_source(size)
+            scanner_seconds, scanner_found = _timed(scanner_extract, source)
+            row = {
+                'case': name,
+                'size': size,
+                'bytes': len(source),
+                'scanner_seconds': scanner_seconds,
+                'scanner_found': scanner_found,
+                'legacy_seconds': None,
+                'legacy_found': None,
+            }
+            if not legacy_over_budget:
+                row['legacy_seconds'], row['legacy_found'] = _timed(legacy_extract, source)
+                legacy_over_budget = row['legacy_seconds'] > budget
+            results.append(row)
+            legacy = row['legacy_seconds']
+            print(f"{name:24} size={size:<7} bytes={row['bytes']:<9} "
+                  f"scanner={scanner_seconds:.4f}s found={scanner_found:<6} "
+                  f"legacy={'skipped' if legacy is None else f'{legacy:.4f}s'} "
+                  f"found={row['legacy_found']}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[50, 100, 200, 400, 800, 1600, 3200])
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help="stop timing a legacy case after a run this slow")
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.budget)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+End-to-end load test of the parse API, entirely offline.
+
+    python -m benchmarks.load [--scale small|medium|large] [--repos N]
+                              [--requests N] [--concurrency 1,4,16]
+                              [--mix parse=1,stream=0,job=0]
+                              [--llm-latency SECONDS] [--warm-caches]
+                              [--seed N] [--output DIR]
+                              [--compare BASELINE.json]
+
+Generates Express repositories (see benchmarks/synthetic.py), commits each
+to a local git repository served over a file:// URL, and runs the app from
+main.py in process with the in-memory Mongo stand-in (MONGO_URI=memory://)
+and the stub model in place of Gemini, answering after --llm-latency.
+
+Each concurrency level runs in a fresh process with empty workspaces and
+caches, and drives --requests requests, spread round-robin over the
+repositories, with that many in flight. Request kinds are drawn from --mix:
+POST /repo/parse, POST /repo/parse/stream read to the end, or POST /repo/jobs
+polled until the job finishes. It reports throughput and p50/p95/p99 latency
+of whole requests and of each pipeline stage and model call, as observed by
+the app's own metrics, and flags the level at which throughput stops
+scaling. Results are written to <output>/<commit>-load-<scale>.json.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.synthetic import ExpressShape, make_express_repo
+
+SCALES = {
+    'small': ExpressShape(route_files=5, controller_modules=2),
+    'medium': ExpressShape(route_files=40, controller_modules=8),
+    'large': ExpressShape(route_files=200, controller_modules=40),
+}
+
+REQUEST_KINDS = ('parse', 'stream', 'job')
+
+# a level whose throughput is less than this much above the previous one's
+# is where the instance saturates
+SATURATION_GAIN = 1.1
+
+JOB_POLL_INTERVAL = 0.05
+
+
+def percentile(samples: List[float], fraction: float) -> Optional[float]:
+    # nearest rank
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    return {
+        'count': len(samples),
+        'p50': _round(percentile(samples, 0.50)),
+        'p95': _round(percentile(samples, 0.95)),
+        'p99': _round(percentile(samples, 0.99)),
+        'max': _round(max(samples) if samples else None),
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 6) if value is not None else None
+
+
+def _git(*args: str, cwd: str) -> None:
+    subprocess.run(
+        ['git', '-c', 'user.name=load', '-c', 'user.email=load@localhost', *args],
+        cwd=cwd, check=True, capture_output=True,
+    )
+
+
+def make_repositories(root: str, shape: ExpressShape, count: int) -> List[str]:
+    """
+    count committed git repositories of the given shape, as file:// URLs.
+    Each gets a marker file so their commits, and so their cache keys, differ.
+    """
+    urls = []
+    for index in range(count):
+        path = os.path.join(root, f'repo{index}')
+        make_express_repo(path, shape)
+        with open(os.path.join(path, 'README.md'), 'w') as file:
+            file.write(f"load test repository {index}\n")
+        _git('init', '--quiet', cwd=path)
+        _git('add', '-A', cwd=path)
+        _git('commit', '--quiet', '-m', 'load test', cwd=path)
+        urls.append('file://' + path)
+    return urls
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(','):
+        kind, _, weight = item.partition('=')
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r}")
+        weights[kind] = float(weight or 1)
+    if not any(weights.values()):
+        raise argparse.ArgumentTypeError("the mix needs a non-zero weight")
+    return weights
+
+
+def plan_requests(urls: List[str], mix: Dict[str, float], count: int,
+                  seed: int) -> List[Tuple[str, str]]:
+    """
+    (kind, repo url) for each request, the same for the same seed
+    """
+    kinds = random.Random(seed).choices(list(mix), weights=list(mix.values()), k=count)
+    return [(kind, urls[index % len(urls)]) for index, kind in enumerate(kinds)]
+
+
+class _Recording:
+    """
+    Stands in for a labelled histogram child, keeping every observation
+    """
+
+    def __init__(self, metric, samples: List[float]):
+        self.metric = metric
+        self.samples = samples
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.metric.observe(value)
+
+
+def _record_observations(histogram, label: str, samples: Dict[str, List[float]],
+                         prefix: str = '') -> None:
+    labels = histogram.labels
+
+    def recording_labels(*args, **kwargs):
+        key = prefix + str(kwargs.get(label, args[0] if args else ''))
+        return _Recording(labels(*args, **kwargs), samples.setdefault(key, []))
+
+    histogram.labels = recording_labels
+
+
+async def _send(client, kind: str, repo_url: str) -> Tuple[int, int]:
+    """
+    Make one request and return its status and the number of specs
+    """
+    body = {'repo_url': repo_url, 'framework_type': 'express'}
+    if kind == 'parse':
+        response = await client.post('/repo/parse', json=body)
+        specs = len(response.json().get('api_specs', [])) if response.status_code == 200 else 0
+        return response.status_code, specs
+
+    if kind == 'stream':
+        specs = 0
+        async with client.stream('POST', '/repo/parse/stream', json=body) as response:
+            async for line in response.aiter_lines():
+                if line and json.loads(line).get('event') == 'spec':
+                    specs += 1
+                elif line and json.loads(line).get('event') == 'error':
+                    return 500, specs
+        return response.status_code, specs
+
+    response = await client.post('/repo/jobs', json=body)
+    if response.status_code != 202:
+        return response.status_code, 0
+    job_id = response.json()['job_id']
+    while True:
+        job = (await client.get(f'/repo/jobs/{job_id}')).json()
+        if job['status'] in ('succeeded', 'failed'):
+            break
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+    if job['status'] == 'failed':
+        return 500, 0
+    return 200, job['progress']['endpoints_total']
+
+
+async def _drive(plan: List[Tuple[str, str]], concurrency: int) -> Dict[str, Any]:
+    import httpx
+    from main import app
+    from app import metrics
+
+    samples: Dict[str, List[float]] = {}
+    _record_observations(metrics.STAGE_DURATION, 'stage', samples)
+    _record_observations(metrics.LLM_CALL_DURATION, 'outcome', samples, prefix='llm_call_')
+
+    requests: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {}
+    specs = 0
+    queue: "asyncio.Queue[Tuple[str, str]]" = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    async def worker(client) -> None:
+        nonlocal specs
+        while not queue.empty():
+            kind, repo_url = queue.get_nowait()
+            start = time.perf_counter()
+            status, count = await _send(client, kind, repo_url)
+            requests.setdefault(kind, []).append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            specs += count
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://load',
+                                     timeout=None) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+    every_request = [seconds for latencies in requests.values() for seconds in latencies]
+    return {
+        'concurrency': concurrency,
+        'requests': len(plan),
+        'seconds': round(elapsed, 6),
+        'requests_per_second': round(len(plan) / elapsed, 3) if elapsed else None,
+        'specs_per_second': round(specs / elapsed, 3) if elapsed else None,
+        'statuses': statuses,
+        'latency': {
+            'request': summarize(every_request),
+            **{f'request_{kind}': summarize(latencies)
+               for kind, latencies in sorted(requests.items())},
+        },
+        'stages': {stage: summarize(values) for stage, values in sorted(samples.items())},
+    }
+
+
+def run_level(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One concurrency level; runs in a process of its own, configured through
+    the environment before the app is imported
+    """
+    plan = [tuple(item) for item in config['plan']]
+    return asyncio.run(_drive(plan, config['concurrency']))
+
+
+def _level_environment(state_dir: str, llm_latency: float, warm_caches: bool) -> Dict[str, str]:
+    env = dict(
+        os.environ,
+        MONGO_URI='memory://',
+        TEST_CASE_MODEL='stub',
+        STUB_MODEL_LATENCY=str(llm_latency),
+        WORKSPACE_ROOT=os.path.join(state_dir, 'workspaces'),
+        PARSE_CACHE_PATH=os.path.join(state_dir, 'parse-cache.sqlite3'),
+        LOG_LEVEL='WARNING',
+    )
+    if not warm_caches:
+        # every request does the full work of a first parse
+        env.update(PARSE_CACHE_ENABLED='false', TEST_CASE_CACHE_ENABLED='false',
+                   PARSE_RESULT_CACHE_TTL='0')
+    return env
+
+
+def run_levels(args: argparse.Namespace, urls: List[str], root: str) -> List[Dict[str, Any]]:
+    plan = plan_requests(urls, args.mix, args.requests, args.seed)
+    results = []
+    for concurrency in args.concurrency:
+        state_dir = os.path.join(root, f'state-{concurrency}')
+        config = {'plan': plan, 'concurrency': concurrency}
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.load', '--run-level', json.dumps(config)],
+            env=_level_environment(state_dir, args.llm_latency, args.warm_caches),
+            capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            sys.stderr.write(completed.stderr)
+            raise SystemExit(f"concurrency {concurrency} failed")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        _print_level(result)
+    return results
+
+
+def saturation_point(results: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    The first concurrency level that adds little throughput over the one
+    before it
+    """
+    for previous, current in zip(results, results[1:]):
+        if current['requests_per_second'] < previous['requests_per_second'] * SATURATION_GAIN:
+            return current['concurrency']
+    return None
+
+
+def _print_level(result: Dict[str, Any]) -> None:
+    request = result['latency']['request']
+    print(f"concurrency={result['concurrency']:<4} {result['requests_per_second']} req/s  "
+          f"{result['specs_per_second']} specs/s  request p50={request['p50']}s "
+          f"p95={request['p95']}s p99={request['p99']}s  statuses={result['statuses']}")
+    for stage, summary in result['stages'].items():
+        print(f"    {stage:16} n={summary['count']:<6} p50={summary['p50']}s "
+              f"p95={summary['p95']}s p99={summary['p99']}s")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    previous = {result['concurrency']: result for result in baseline['results']}
+    print(f"\ncompared with {baseline.get('commit')} ({baseline.get('scale')}):")
+    for result in current['results']:
+        old = previous.get(result['concurrency'])
+        if old is None:
+            print(f"  concurrency={result['concurrency']:<4} no baseline")
+            continue
+        print(f"  concurrency={result['concurrency']:<4} "
+              f"throughput x{result['requests_per_second'] / old['requests_per_second']:.2f}  "
+              f"p95 x{result['latency']['request']['p95'] / old['latency']['request']['p95']:.2f}")
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arguments.add_argument('--scale', choices=sorted(SCALES), default='small')
+    arguments.add_argument('--repos', type=int, default=8,
+                           help="distinct repositories the requests are spread over")
+    arguments.add_argument('--requests', type=int, default=32,
+                           help="requests per concurrency level")
+    arguments.add_argument('--concurrency', default=[1, 4, 16],
+                           type=lambda value: [int(level) for level in value.split(',')],
+                           help="comma-separated numbers of requests in flight")
+    arguments.add_argument('--mix', type=parse_mix, default=parse_mix('parse=1'),
+                           help="weights of the request kinds: parse, stream, job")
+    arguments.add_argument('--llm-latency', type=float, default=0.05,
+                           help="seconds the stub model takes per call")
+    arguments.add_argument('--warm-caches', action='store_true',
+                           help="keep the parse, test case and result caches on, so "
+                                "repeated repositories are served from them")
+    arguments.add_argument('--seed', type=int, default=0)
+    arguments.add_argument('--output', default=os.path.join('benchmarks', 'results'),
+                           help="directory the JSON results are written to")
+    arguments.add_argument('--compare', help="earlier results file to compare against")
+    arguments.add_argument('--run-level', help=argparse.SUPPRESS)
+    args = arguments.parse_args()
+
+    if args.run_level:
+        print(json.dumps(run_level(json.loads(args.run_level))))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='load-test-') as root:
+        urls = make_repositories(os.path.join(root, 'repos'), SCALES[args.scale], args.repos)
+        results = run_levels(args, urls, root)
+
+    saturation = saturation_point(results)
+    if saturation is not None:
+        print(f"throughput stops scaling at concurrency {saturation}")
+
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'shape': SCALES[args.scale].to_dict(),
+        'repos': args.repos,
+        'mix': args.mix,
+        'llm_latency': args.llm_latency,
+        'warm_caches': args.warm_caches,
+        'seed': args.seed,
+        'saturation_concurrency': saturation,
+        'results': results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{commit or 'unknown'}-load-{args.scale}.json")
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
+
+
+if __name__ == '__main__':
+    main()
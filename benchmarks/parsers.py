@@ -0,0 +1,268 @@
+"""
+Parser benchmark on synthetic repositories.
+
+    python -m benchmarks.parsers [--scale small|medium|large] [--repeat N]
+                                 [--workers N] [--output DIR]
+                                 [--compare BASELINE.json]
+
+Generates Express and Django repositories (see benchmarks/synthetic.py), runs
+NodeJSParser.extract_apis and generate_api_specs_for_django against them and
+reports files/sec, routes/sec, peak memory and the time spent in each parser
+stage. Results are written to <output>/<commit>-<scale>.json so runs can be
+compared across commits with --compare.
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.parsers import controller_index
+from app.parsers.DjangoParser import DjangoParser
+from app.parsers.NodeParser import NodeJSParser
+from app.parsers.supervisor import ParseSupervisor
+from app.parsers.django_index import DjangoProjectIndex
+from app.services import parser as django_parser
+from benchmarks.synthetic import DjangoShape, ExpressShape, make_django_repo, make_express_repo
+
+SCALES = {
+    'small': (ExpressShape(route_files=20, controller_modules=5),
+              DjangoShape(apps=3, views_per_app=5)),
+    'medium': (ExpressShape(route_files=200, controller_modules=40),
+               DjangoShape(apps=10, views_per_app=10)),
+    'large': (ExpressShape(route_files=1000, controller_modules=200, handler_lines=30),
+              DjangoShape(apps=30, views_per_app=20, handler_lines=30)),
+}
+
+# (class or module, {method or function: stage it is accounted to})
+EXPRESS_STAGES = [(NodeJSParser, {
+    '_extract_controller_imports': 'import_extraction',
+    '_find_route_calls': 'route_matching',
+    '_extract_route_info': 'route_matching',
+    '_lookup_controller': 'controller_lookup',
+    '_extract_request_data': 'request_response_extraction',
+    '_extract_response_data': 'request_response_extraction',
+})]
+DJANGO_STAGES = [
+    (DjangoProjectIndex, {
+        'add_file': 'indexing',
+        'resolve_view': 'view_lookup',
+    }),
+    (DjangoParser, {
+        '_prefixes': 'include_resolution',
+        '_build_specs': 'request_response_extraction',
+    }),
+]
+
+
+class StageTimer:
+    """
+    Accumulates exclusive wall time per stage: time spent in a nested stage
+    (a controller lookup made while matching routes) is not also counted
+    toward the enclosing one.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self._stack: List[List[Any]] = []
+
+    def wrap(self, stage: str, function: Callable) -> Callable:
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            self._stack.append([stage, 0.0])
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _, nested = self._stack.pop()
+                elapsed = time.perf_counter() - start
+                self.totals[stage] = self.totals.get(stage, 0.0) + elapsed - nested
+                if self._stack:
+                    self._stack[-1][1] += elapsed
+        return timed
+
+
+@contextlib.contextmanager
+def _patched(targets: List[Tuple[Any, Dict[str, str]]], timer: StageTimer):
+    originals = [(target, name, getattr(target, name))
+                 for target, stages in targets for name in stages]
+    try:
+        for target, stages in targets:
+            for name, stage in stages.items():
+                setattr(target, name, timer.wrap(stage, getattr(target, name)))
+        yield
+    finally:
+        for target, name, original in originals:
+            setattr(target, name, original)
+
+
+def _count_files(root: str, suffixes: tuple) -> int:
+    return sum(
+        1 for _, _, files in os.walk(root) for name in files if name.endswith(suffixes)
+    )
+
+
+def _run_express(repo_path: str, routes_path: str,
+                 supervisor: Optional[ParseSupervisor]) -> List[Dict[str, Any]]:
+    # a cold controller index on every run
+    controller_index._indexes.clear()
+    parser = NodeJSParser(routes_path=routes_path, repo_path=repo_path,
+                          supervisor=supervisor, parallel_min_files=0,
+                          parallel_min_bytes=0)
+    return parser.extract_apis()
+
+
+def _run_django(project_root: str) -> List[Dict[str, Any]]:
+    return django_parser.generate_api_specs_for_django(project_root)
+
+
+def measure(run: Callable[[], List[Dict[str, Any]]],
+            targets: List[Tuple[Any, Dict[str, str]]], repeat: int) -> Dict[str, Any]:
+    """
+    Best wall time and stage split over `repeat` runs, then one more run
+    under tracemalloc for peak memory, which would skew the timings
+    """
+    best = None
+    for _ in range(repeat):
+        timer = StageTimer()
+        # the parsers print heavily; keep that out of the terminal but in the cost
+        with _patched(targets, timer), contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            specs = run()
+            elapsed = time.perf_counter() - start
+        if best is None or elapsed < best['seconds']:
+            split = dict(timer.totals)
+            # file walking, reading, tokenizing and building the specs
+            split['other'] = max(0.0, elapsed - sum(timer.totals.values()))
+            best = {'seconds': elapsed, 'routes': len(specs), 'stages': split}
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best['peak_memory_bytes'] = peak
+    return best
+
+
+def _summarize(name: str, shape: Any, files: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    seconds = result['seconds']
+    return {
+        'case': name,
+        'shape': shape.to_dict(),
+        'files': files,
+        'routes': result['routes'],
+        'seconds': round(seconds, 6),
+        'files_per_second': round(files / seconds, 2) if seconds else None,
+        'routes_per_second': round(result['routes'] / seconds, 2) if seconds else None,
+        'peak_memory_bytes': result['peak_memory_bytes'],
+        'stages': {stage: round(value, 6) for stage, value in sorted(result['stages'].items())},
+    }
+
+
+def run_benchmarks(scale: str, repeat: int, workers: int) -> List[Dict[str, Any]]:
+    express_shape, django_shape = SCALES[scale]
+    results = []
+    with tempfile.TemporaryDirectory(prefix='parser-bench-') as root:
+        express_root = os.path.join(root, 'express')
+        routes_path = make_express_repo(express_root, express_shape)
+        # workers are kept across runs, as they are by the server
+        supervisor = ParseSupervisor(workers, timeout=600) if workers > 1 else None
+        try:
+            express = measure(
+                functools.partial(_run_express, express_root, routes_path, supervisor),
+                EXPRESS_STAGES, repeat)
+        finally:
+            if supervisor is not None:
+                supervisor.shutdown()
+        results.append(_summarize('express', express_shape,
+                                  _count_files(routes_path, ('.js',)), express))
+
+        django_root = make_django_repo(os.path.join(root, 'django'), django_shape)
+        django = measure(functools.partial(_run_django, django_root),
+                         DJANGO_STAGES, repeat)
+        results.append(_summarize('django', django_shape,
+                                  _count_files(django_root, ('.py',)), django))
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    previous = {result['case']: result for result in baseline['results']}
+    print(f"\ncompared with {baseline.get('commit')} ({baseline.get('scale')}):")
+    for result in current['results']:
+        old = previous.get(result['case'])
+        if old is None or old['shape'] != result['shape']:
+            print(f"  {result['case']:8} no comparable baseline")
+            continue
+        print(f"  {result['case']:8} time x{result['seconds'] / old['seconds']:.2f}  "
+              f"peak memory x{result['peak_memory_bytes'] / max(old['peak_memory_bytes'], 1):.2f}")
+
+
+def main() -> None:
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arguments.add_argument('--scale', choices=sorted(SCALES), default='small')
+    arguments.add_argument('--repeat', type=int, default=3)
+    arguments.add_argument('--workers', type=int, default=1,
+                           help="supervised worker processes for the Express parser; "
+                                "1 parses in process. Stages run in the workers "
+                                "are not split out")
+    arguments.add_argument('--output', default=os.path.join('benchmarks', 'results'),
+                           help="directory the JSON results are written to")
+    arguments.add_argument('--compare', help="earlier results file to compare against")
+    args = arguments.parse_args()
+
+    results = run_benchmarks(args.scale, args.repeat, args.workers)
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'workers': args.workers,
+        'results': results,
+    }
+
+    for result in results:
+        stages = "  ".join(f"{stage}={seconds:.3f}s" for stage, seconds in result['stages'].items())
+        print(f"{result['case']:8} files={result['files']:<6} routes={result['routes']:<6} "
+              f"{result['seconds']:.3f}s  {result['files_per_second']} files/s  "
+              f"{result['routes_per_second']} routes/s  "
+              f"peak={result['peak_memory_bytes'] / 2 ** 20:.1f} MiB")
+        print(f"         {stages}")
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{commit or 'unknown'}-{args.scale}.json")
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Generators for synthetic Express and Django repositories, used to benchmark
+the parsers at a controlled scale.
+"""
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict
+
+METHODS = ('get', 'post', 'put', 'patch', 'delete')
+
+
+@dataclass
+class ExpressShape:
+    route_files: int = 100
+    controller_modules: int = 20
+    routes_per_file: int = 5
+    # statements in each handler body
+    handler_lines: int = 10
+    # depth of nested blocks inside each handler
+    nesting_depth: int = 3
+    # share of routes with an inline arrow handler instead of a controller
+    inline_ratio: float = 0.2
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class DjangoShape:
+    apps: int = 10
+    views_per_app: int = 10
+    serializer_fields: int = 6
+    handler_lines: int = 10
+    nesting_depth: int = 3
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def _js_handler_body(index: int, lines: int, depth: int) -> str:
+    body = [
+        "  const { id, name } = req.params;",
+        "  const { title, amount } = req.body;",
+    ]
+    for line in range(lines):
+        body.append(f"  const value{line} = compute(id, {index}, {line});")
+    indent = "  "
+    for level in range(depth):
+        body.append(f"{indent}if (value{level % max(lines, 1)}) {{")
+        indent += "  "
+    body.append(f"{indent}return res.status(200).json({{ id, name, title }});")
+    for level in range(depth):
+        indent = indent[:-2]
+        body.append(f"{indent}}}")
+    body.append("  res.status(404).json({ message: 'Not found' });")
+    return "\n".join(body)
+
+
+def _controller_name(module: int, handler: int) -> str:
+    return f"handler{module}x{handler}"
+
+
+def make_express_repo(root: str, shape: ExpressShape) -> str:
+    """
+    Write an Express app with routes/ and controllers/ under root and return
+    the routes directory. Route files import handlers from the controller
+    modules round-robin, so every module is shared by several route files.
+    """
+    handlers_per_module = max(1, -(-shape.route_files * shape.routes_per_file
+                                   // shape.controller_modules))
+    for module in range(shape.controller_modules):
+        parts = []
+        names = []
+        for handler in range(handlers_per_module):
+            name = _controller_name(module, handler)
+            names.append(name)
+            body = _js_handler_body(handler, shape.handler_lines, shape.nesting_depth)
+            parts.append(f"const {name} = async (req, res) => {{\n{body}\n}};\n")
+        parts.append("module.exports = { " + ", ".join(names) + " };\n")
+        _write(os.path.join(root, 'controllers', f'module{module}.js'), "\n".join(parts))
+
+    route = 0
+    for file_index in range(shape.route_files):
+        imports: Dict[int, list] = {}
+        calls = []
+        for position in range(shape.routes_per_file):
+            method = METHODS[route % len(METHODS)]
+            path = f"/resource{file_index}/item{position}/:id"
+            inline = shape.inline_ratio and route % round(1 / shape.inline_ratio) == 0
+            if inline:
+                body = _js_handler_body(route, shape.handler_lines, shape.nesting_depth)
+                calls.append(f"router.{method}('{path}', async (req, res) => {{\n{body}\n}});")
+            else:
+                module = route % shape.controller_modules
+                name = _controller_name(module, (route // shape.controller_modules)
+                                        % handlers_per_module)
+                imports.setdefault(module, []).append(name)
+                calls.append(f"router.{method}('{path}', authenticate, {name});")
+            route += 1
+
+        header = [
+            "const express = require('express');",
+            "const { authenticate } = require('../middleware/auth');",
+        ]
+        for module, names in sorted(imports.items()):
+            header.append(
+                f"const {{ {', '.join(sorted(set(names)))} }} = "
+                f"require('../controllers/module{module}');")
+        content = "\n".join(header) + "\nconst router = express.Router();\n\n" \
+            + "\n\n".join(calls) + "\n\nmodule.exports = router;\n"
+        _write(os.path.join(root, 'routes', f'routes{file_index}.js'), content)
+
+    _write(os.path.join(root, 'middleware', 'auth.js'),
+           "const authenticate = (req, res, next) => next();\n"
+           "module.exports = { authenticate };\n")
+    return os.path.join(root, 'routes')
+
+
+def _py_view_body(lines: int, depth: int, serializer: str) -> str:
+    body = [
+        "    name = request.data.get('name')",
+        "    amount = request.data.get('amount')",
+        f"    serializer = {serializer}(data=request.data)",
+    ]
+    for line in range(lines):
+        body.append(f"    value{line} = compute(name, {line})")
+    indent = "    "
+    for level in range(depth):
+        body.append(f"{indent}if value{level % max(lines, 1)}:")
+        indent += "    "
+    body.append(f"{indent}return Response(serializer.data, status=200)")
+    body.append("    return Response({'detail': 'Not found'}, status=404)")
+    return "\n".join(body)
+
+
+def make_django_repo(root: str, shape: DjangoShape) -> str:
+    """
+    Write a Django project of apps, each with urls.py, views.py,
+    serializers.py and models.py, and return the project root
+    """
+    for app in range(shape.apps):
+        app_dir = os.path.join(root, f'app{app}')
+        serializers = [
+            "from rest_framework import serializers\n",
+        ]
+        views = [
+            "from rest_framework.decorators import api_view, permission_classes",
+            "from rest_framework.permissions import IsAuthenticated",
+            "from rest_framework.response import Response",
+            "from .serializers import *\n\n",
+        ]
+        urls = ["from django.urls import path", "from .views import *\n", "urlpatterns = ["]
+        models = ["from django.db import models\n"]
+
+        for view in range(shape.views_per_app):
+            name = f"view{app}x{view}"
+            serializer = f"Item{app}x{view}Serializer"
+            methods = ", ".join(f"'{method.upper()}'" for method in METHODS[:1 + view % 3])
+
+            serializers.append(f"class {serializer}(serializers.Serializer):")
+            for field in range(shape.serializer_fields):
+                serializers.append(f"    field{field} = serializers.CharField(max_length=64)")
+            serializers.append("")
+
+            views.append(f"@api_view([{methods}])")
+            if view % 2:
+                views.append("@permission_classes([IsAuthenticated])")
+            views.append(f"def {name}(request):")
+            views.append(_py_view_body(shape.handler_lines, shape.nesting_depth, serializer))
+            views.append("\n")
+
+            urls.append(f"    path('app{app}/items{view}/<int:pk>/', {name}, name='{name}'),")
+
+            models.append(f"class Item{app}x{view}(models.Model):")
+            models.append("    name = models.CharField(max_length=64)\n")
+
+        urls.append("]")
+        _write(os.path.join(app_dir, 'serializers.py'), "\n".join(serializers))
+        _write(os.path.join(app_dir, 'views.py'), "\n".join(views))
+        _write(os.path.join(app_dir, 'urls.py'), "\n".join(urls) + "\n")
+        _write(os.path.join(app_dir, 'models.py'), "\n".join(models))
+    return root
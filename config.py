@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import List, Optional
 import os
 from dotenv import load_dotenv
 
@@ -9,6 +10,102 @@ load_dotenv()
 class Settings(BaseSettings):
     MONGO_URI: str
 
+    # logging; LOG_FORMAT is "text" or "json"
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+
+    # test case generation
+    TEST_CASE_MODEL: str = "gemini-1.5-flash"
+    GEMINI_API_KEY: Optional[str] = None
+    STUB_MODEL_LATENCY: float = 0.0
+    TEST_CASE_CONCURRENCY: int = 8
+    TEST_CASE_TIMEOUT: float = 60.0
+    TEST_CASE_MAX_RETRIES: int = 3
+    TEST_CASE_BACKOFF_BASE: float = 1.0
+    # endpoints of a route file are batched into prompts of about this many
+    # tokens, answer included; 0 sends one prompt per endpoint
+    TEST_CASE_BATCH_TOKEN_BUDGET: int = 8000
+
+    # cache of generated test cases
+    TEST_CASE_CACHE_ENABLED: bool = True
+    TEST_CASE_CACHE_TTL: int = 7 * 24 * 60 * 60
+    TEST_CASE_CACHE_LRU_SIZE: int = 2048
+    TEST_CASE_CACHE_MAX_ENTRIES: int = 100_000
+    # the Mongo tier behind the in-process LRU; a lookup or write slower than
+    # TEST_CASE_CACHE_STORE_TIMEOUT seconds counts as a miss
+    TEST_CASE_CACHE_PERSISTENT: bool = True
+    TEST_CASE_CACHE_STORE_TIMEOUT: float = 0.5
+
+    # repository cloning; repo URLs must be https, ssh or git, and file URLs
+    # are accepted only when CLONE_ALLOW_FILE_URLS is set
+    CLONE_DEPTH: int = 1
+    CLONE_FILTER_BLOBS: bool = True
+    CLONE_SPARSE: bool = False
+    CLONE_ALLOW_FILE_URLS: bool = False
+
+    # on-disk pool of repository checkouts
+    WORKSPACE_ROOT: Optional[str] = None
+    WORKSPACE_QUOTA_BYTES: int = 5 * 1024 ** 3
+
+    # route file parsing; 0 workers means one per CPU
+    PARSER_WORKERS: int = 0
+    # source files over this size are skipped rather than parsed
+    PARSER_MAX_FILE_BYTES: int = 2 * 1024 * 1024
+    # route files are parsed in parallel on PARSER_WORKERS watched worker
+    # processes, PARSER_FILES_PER_TASK at a time. A task past this many
+    # seconds or CPU seconds is killed and its files are parsed again one
+    # at a time; a file that overruns alone is recorded as skipped. Fewer
+    # than PARSER_PARALLEL_MIN_FILES route files, together smaller than
+    # PARSER_PARALLEL_MIN_BYTES, are parsed in process, as are all with a
+    # timeout of 0, one by one and without limits
+    PARSER_FILE_TIMEOUT: float = 30.0
+    PARSER_FILE_CPU_SECONDS: int = 20
+    PARSER_FILES_PER_TASK: int = 16
+    PARSER_PARALLEL_MIN_FILES: int = 200
+    PARSER_PARALLEL_MIN_BYTES: int = 1024 * 1024
+
+    # per-file parse results keyed by content hash, shared across repos
+    PARSE_CACHE_ENABLED: bool = True
+    PARSE_CACHE_PATH: Optional[str] = None
+    PARSE_CACHE_MAX_ENTRIES: int = 200_000
+
+    # concurrent parse requests for the same repository and HEAD commit share
+    # one pipeline run, whose result is then served for this many seconds;
+    # 0 turns the result cache off
+    PARSE_RESULT_CACHE_TTL: float = 60.0
+    PARSE_RESULT_CACHE_SIZE: int = 32
+
+    # uploaded archives and server-local source trees; local paths must lie
+    # within one of LOCAL_SOURCE_ROOTS, and none disables them
+    ARCHIVE_MAX_UPLOAD_BYTES: int = 200 * 1024 ** 2
+    ARCHIVE_MAX_EXTRACTED_BYTES: int = 500 * 1024 ** 2
+    ARCHIVE_MAX_ENTRIES: int = 200_000
+    LOCAL_SOURCE_ROOTS: List[str] = []
+
+    # background parse jobs; a job whose process stops renewing its lease
+    # for this many seconds is taken over by another
+    JOB_WORKERS: int = 2
+    JOB_LEASE_SECONDS: float = 60.0
+    # a job claimed this many times without finishing, e.g. because its
+    # process keeps dying, is failed
+    JOB_MAX_ATTEMPTS: int = 3
+    # larger results are not kept with the job, which fails; Mongo caps a
+    # document at 16 MiB
+    JOB_MAX_RESULT_BYTES: int = 12 * 1024 ** 2
+
+    # running generated test cases against a service; a rate limit of 0
+    # leaves requests per host unlimited. Base URLs must have one of
+    # TEST_RUNNER_ALLOWED_HOSTS as host, and none disables test runs
+    TEST_RUNNER_CONCURRENCY: int = 50
+    TEST_RUNNER_RATE_LIMIT: float = 0
+    TEST_RUNNER_TIMEOUT: float = 10.0
+    TEST_RUNNER_ALLOWED_HOSTS: List[str] = []
+    TEST_RUNNER_MAX_STORED_RESULTS: int = 20_000
+
+    # persisted API specs
+    SPEC_STORE_BATCH_SIZE: int = 500
+    SPEC_STORE_MAX_PENDING_BATCHES: int = 4
+
     class Config:
         env_file = ".env"
 
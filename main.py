@@ -1,14 +1,56 @@
-from fastapi import FastAPI
-from app.logging import setup_logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from app.logging import new_trace_id, setup_logging, trace_id_var
+from app.metrics import HTTP_REQUEST_DURATION
 from app.api.api import api_router
+from app.services.jobs import get_job_manager
+from app.services.spec_store import get_spec_store
+from app.services.test_runner import get_test_run_manager
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await get_spec_store().ensure_indexes()
+    # start the background parse workers, resuming interrupted jobs
+    job_manager = get_job_manager()
+    await job_manager.start()
+    test_run_manager = get_test_run_manager()
+    await test_run_manager.start()
+    yield
+    await test_run_manager.stop()
+    await job_manager.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # initialize logging
 setup_logging()
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # a caller-supplied request id ties our log lines to theirs
+    trace_id = request.headers.get("X-Request-ID") or new_trace_id()
+    token = trace_id_var.set(trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Trace-ID"] = trace_id
+        return response
+    finally:
+        # the route template, not the raw path, keeps label values bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - start)
+        trace_id_var.reset(token)
+
+
 @app.route("/")
 async def index():
     return "fastapi server running"
@@ -0,0 +1,5 @@
+import os
+
+# the app connects to MONGO_URI on import; tests run against the in-process
+# stand-in unless told otherwise
+os.environ.setdefault('MONGO_URI', 'memory://')
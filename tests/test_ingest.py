@@ -0,0 +1,112 @@
+import io
+import tarfile
+import zipfile
+import pytest
+from app.services.ingest import ArchiveExtractor, IngestError
+
+ROUTE = b"router.get('/users', listUsers);\n"
+
+
+def extractor(dest, max_entries=100):
+    return ArchiveExtractor(str(dest), 'express', max_bytes=1024 * 1024,
+                            max_entries=max_entries, max_file_bytes=64 * 1024)
+
+
+def tar_archive(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data, kind in members:
+            info = tarfile.TarInfo(name)
+            if kind == 'symlink':
+                info.type = tarfile.SYMTYPE
+                info.linkname = data
+                archive.addfile(info)
+            else:
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def zip_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def extracted(root):
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*')
+                  if path.is_file())
+
+
+ESCAPING_NAMES = ['../escape.js', 'routes/../../escape.js', '/tmp/absolute.js',
+                  'C:/absolute.js']
+
+
+def test_tar_members_stay_inside_dest(tmp_path):
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    archive = tar_archive([('routes/users.js', ROUTE, 'file')]
+                          + [(name, ROUTE, 'file') for name in ESCAPING_NAMES])
+    extractor(dest).extract(archive)
+    assert extracted(dest) == ['routes/users.js']
+    assert extracted(tmp_path) == ['dest/routes/users.js']
+
+
+def test_zip_members_stay_inside_dest(tmp_path):
+    dest = tmp_path / 'dest'
+    dest.mkdir()
+    archive = zip_archive([('routes/users.js', ROUTE)]
+                          + [(name, ROUTE) for name in ESCAPING_NAMES + ['..\\escape.js']])
+    extractor(dest).extract(archive)
+    assert extracted(dest) == ['routes/users.js']
+    assert extracted(tmp_path) == ['dest/routes/users.js']
+
+
+def test_tar_links_are_not_extracted(tmp_path):
+    archive = tar_archive([
+        ('routes/link.js', '/etc/passwd', 'symlink'),
+        ('routes/users.js', ROUTE, 'file'),
+    ])
+    extractor(tmp_path).extract(archive)
+    assert extracted(tmp_path) == ['routes/users.js']
+    assert not (tmp_path / 'routes' / 'link.js').is_symlink()
+
+
+def test_only_parser_files_are_extracted(tmp_path):
+    archive = zip_archive([
+        ('routes/users.js', ROUTE),
+        ('node_modules/express/index.js', ROUTE),
+        ('public/app.min.js', ROUTE),
+        ('README.md', b'# readme\n'),
+    ])
+    extractor(tmp_path).extract(archive)
+    assert extracted(tmp_path) == ['routes/users.js']
+
+
+def test_encrypted_zip_is_rejected(tmp_path):
+    data = bytearray(zip_archive([('routes/users.js', ROUTE)]).getvalue())
+    # set the encrypted flag bit of the local and the central directory header
+    for signature, offset in ((b'PK\x03\x04', 6), (b'PK\x01\x02', 8)):
+        index = data.index(signature) + offset
+        data[index] |= 0x1
+    with pytest.raises(IngestError) as raised:
+        extractor(tmp_path).extract(io.BytesIO(bytes(data)))
+    assert raised.value.status_code == 400
+    assert extracted(tmp_path) == []
+
+
+def test_too_many_entries_are_rejected(tmp_path):
+    archive = zip_archive([(f'docs/{index}.md', b'') for index in range(11)])
+    with pytest.raises(IngestError) as raised:
+        extractor(tmp_path, max_entries=10).extract(archive)
+    assert raised.value.status_code == 413
+
+
+def test_not_an_archive_is_rejected(tmp_path):
+    with pytest.raises(IngestError) as raised:
+        extractor(tmp_path).extract(io.BytesIO(b'not an archive'))
+    assert raised.value.status_code == 400
@@ -0,0 +1,74 @@
+from app.parsers.js_scanner import (
+    find_function_definitions, find_middleware_calls, find_route_calls,
+)
+
+
+def test_route_calls():
+    source = (
+        "router.get('/users', listUsers);\n"
+        "router.post(\"/users\", auth, validate(schema), createUser);\n"
+        "app.delete(`/users/:id`, async (req, res) => {\n"
+        "  res.status(204).end();\n"
+        "});\n"
+    )
+    routes = find_route_calls(source)
+    assert [(route['method'], route['endpoint']) for route in routes] == [
+        ('get', '/users'), ('post', '/users'), ('delete', '/users/:id'),
+    ]
+    assert routes[0]['handler'] == 'listUsers'
+    assert not routes[0]['inline']
+    assert routes[1]['middleware'] == ['auth', 'validate(schema)']
+    assert routes[1]['handler'] == 'createUser'
+    assert routes[2]['inline']
+    start, end = routes[2]['handler_span']
+    assert source[start:end] == routes[2]['handler']
+    assert routes[2]['handler'].startswith('async (req, res) =>')
+    assert routes[2]['handler'].endswith('}')
+
+
+def test_inline_function_handlers():
+    source = "router.put('/a', function (req, res) { res.json({ a: ')' }); });"
+    (route,) = find_route_calls(source)
+    assert route['inline']
+    assert route['handler'] == "function (req, res) { res.json({ a: ')' }); }"
+
+
+def test_route_calls_outside_code_are_ignored():
+    source = (
+        "// router.get('/line-comment', a);\n"
+        "/* router.get('/block-comment', b); */\n"
+        "const s = \"router.get('/string', c)\";\n"
+        "const t = `router.get('/template', ${d})`;\n"
+        "const r = /router.get\\('\\/regex', e\\)/;\n"
+        "router.get('/real', f);\n"
+    )
+    assert [route['endpoint'] for route in find_route_calls(source)] == ['/real']
+
+
+def test_route_calls_need_a_literal_path_and_a_handler():
+    source = "router.get(path, handler);\nrouter.get('/only-path');\n"
+    assert find_route_calls(source) == []
+
+
+def test_middleware_calls():
+    source = (
+        "app.use(express.json());\n"
+        "// app.use(commented);\n"
+        "router.use('/api', apiRouter);\n"
+        "app.use();\n"
+    )
+    assert find_middleware_calls(source) == ['express.json()', "'/api', apiRouter"]
+
+
+def test_function_definitions():
+    source = (
+        "function listUsers(req, res) { res.json([]); }\n"
+        "const createUser = async (req, res) => { res.status(201).json({}); };\n"
+        "// function commented(req, res) { }\n"
+        "function listUsers(req, res) { res.json(['shadowed']); }\n"
+    )
+    definitions = find_function_definitions(source)
+    assert [definition['name'] for definition in definitions] == ['listUsers', 'createUser']
+    first = definitions[0]
+    assert source[first['start']:first['end']] == (
+        "function listUsers(req, res) { res.json([]); }")
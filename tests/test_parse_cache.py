@@ -0,0 +1,77 @@
+from app.parsers import parse_cache
+from app.parsers.NodeParser import NodeJSParser
+from app.parsers.parse_cache import ParseCache
+
+ROUTES = (
+    "const { getUser } = require('../controllers/users');\n"
+    "router.get('/users/:id', getUser);\n"
+)
+CONTROLLER = (
+    "const getUser = async (req, res) => {\n"
+    "  const { id } = req.params;\n"
+    "  res.status(200).json({ id });\n"
+    "};\n"
+)
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ParseCache(path)
+    cache.set('route_file', 'content', {'routes': [1]})
+    cache.flush()
+
+    reopened = ParseCache(path)
+    assert reopened.get('route_file', 'content') == {'routes': [1]}
+    assert reopened.get('handler', 'content') is None
+    assert reopened.get('route_file', 'changed content') is None
+    assert (reopened.hits, reopened.misses) == (1, 2)
+
+
+def test_a_new_parser_version_misses(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ParseCache(path)
+    cache.set('route_file', 'content', {'routes': [1]})
+    cache.flush()
+
+    monkeypatch.setattr(parse_cache, 'PARSER_VERSION', parse_cache.PARSER_VERSION + '+1')
+    assert ParseCache(path).get('route_file', 'content') is None
+
+
+def test_evicts_least_recently_used_beyond_max_entries(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ParseCache(path, max_entries=50)
+    for index in range(200):
+        cache.set('handler', f'handler {index}', index)
+        cache.flush()
+    (count,) = cache._connection.execute('SELECT COUNT(*) FROM parse_cache').fetchone()
+    assert count <= 50 + 50 // 10
+    assert ParseCache(path).get('handler', 'handler 199') == 199
+
+
+def test_parser_reuses_and_invalidates_file_results(tmp_path):
+    repo = tmp_path / 'repo'
+    (repo / 'routes').mkdir(parents=True)
+    (repo / 'controllers').mkdir()
+    (repo / 'routes' / 'users.js').write_text(ROUTES)
+    (repo / 'controllers' / 'users.js').write_text(CONTROLLER)
+    path = str(tmp_path / 'cache.sqlite3')
+
+    def parse():
+        cache = ParseCache(path)
+        specs = NodeJSParser(str(repo / 'routes'), str(repo), cache=cache).extract_apis()
+        return cache, [(spec['method'], spec['endpoint']) for spec in specs]
+
+    first, specs = parse()
+    assert specs == [('get', '/users/:id')]
+    assert first.hits == 0
+
+    second, cached_specs = parse()
+    assert cached_specs == specs
+    assert second.hits > 0
+    assert second.misses == 0
+
+    (repo / 'routes' / 'users.js').write_text(
+        ROUTES + "router.delete('/users/:id', getUser);\n")
+    third, edited_specs = parse()
+    assert sorted(edited_specs) == [('delete', '/users/:id'), ('get', '/users/:id')]
+    assert third.misses > 0
@@ -0,0 +1,91 @@
+import asyncio
+import subprocess
+import pytest
+from config import settings
+from app.services.repo_utils import (
+    GitCommandError, check_repo_url, clone_repo, head_commit, remote_head_commit,
+)
+
+
+def git(*args, cwd):
+    subprocess.run(['git', '-c', 'user.email=test@example.com', '-c', 'user.name=test',
+                    *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def origin(tmp_path):
+    repo = tmp_path / 'origin'
+    (repo / 'routes').mkdir(parents=True)
+    (repo / 'controllers').mkdir()
+    (repo / 'docs').mkdir()
+    (repo / 'routes' / 'users.js').write_text(
+        "const { getUser } = require('../controllers/users');\n"
+        "router.get('/users/:id', getUser);\n")
+    (repo / 'controllers' / 'users.js').write_text(
+        "const getUser = async (req, res) => {\n"
+        "  res.status(200).json({ id: req.params.id });\n"
+        "};\n")
+    (repo / 'controllers' / 'unused.js').write_text("module.exports = {};\n")
+    (repo / 'docs' / 'index.md').write_text("# docs\n")
+    git('init', '-q', cwd=repo)
+    git('add', '.', cwd=repo)
+    git('commit', '-qm', 'init', cwd=repo)
+    return repo
+
+
+@pytest.fixture
+def allow_file_urls(monkeypatch):
+    monkeypatch.setattr(settings, 'CLONE_ALLOW_FILE_URLS', True)
+
+
+@pytest.mark.parametrize('url', [
+    'https://github.com/org/repo.git',
+    'ssh://git@github.com/org/repo.git',
+    'git://example.com/repo.git',
+])
+def test_check_repo_url_accepts_remote_schemes(url):
+    check_repo_url(url)
+
+
+@pytest.mark.parametrize('url', [
+    '--upload-pack=touch /tmp/pwned',
+    '-c core.sshCommand=id',
+    'ext::sh -c id',
+    'file:///etc',
+    '/srv/repo',
+])
+def test_check_repo_url_rejects(url):
+    with pytest.raises(ValueError):
+        check_repo_url(url)
+
+
+def test_check_repo_url_file_urls_when_allowed(allow_file_urls):
+    check_repo_url('file:///srv/repo')
+
+
+def test_option_urls_are_not_run(tmp_path):
+    marker = tmp_path / 'marker'
+    url = f'--upload-pack=touch {marker}'
+    with pytest.raises(GitCommandError):
+        asyncio.run(remote_head_commit(url))
+    with pytest.raises(GitCommandError):
+        asyncio.run(clone_repo(url, dest=tmp_path / 'clone'))
+    assert not marker.exists()
+
+
+def test_clone_checks_out_head(origin, tmp_path, allow_file_urls):
+    url = origin.as_uri()
+    dest = asyncio.run(clone_repo(url, depth=1, filter_blobs=False, sparse=False,
+                                  dest=tmp_path / 'clone'))
+    assert (dest / 'docs' / 'index.md').exists()
+    assert asyncio.run(head_commit(dest)) == asyncio.run(remote_head_commit(url))
+
+
+def test_sparse_clone_checks_out_routes_and_their_controllers(origin, tmp_path,
+                                                              allow_file_urls):
+    dest = asyncio.run(clone_repo(origin.as_uri(), depth=1, filter_blobs=False,
+                                  sparse=True, dest=tmp_path / 'clone'))
+    assert (dest / 'routes' / 'users.js').exists()
+    assert (dest / 'controllers' / 'users.js').exists()
+    assert not (dest / 'controllers' / 'unused.js').exists()
+    assert not (dest / 'docs').exists()
@@ -0,0 +1,78 @@
+import asyncio
+from app.database.memory import InMemoryClient
+from app.services.spec_store import SpecStore
+
+REPO = 'https://github.com/org/repo.git'
+COMMIT = 'a' * 40
+
+
+def make_store(batch_size=2):
+    return SpecStore(InMemoryClient()['orbit_api']['api_specs'],
+                     batch_size=batch_size, max_pending_batches=2)
+
+
+def spec(method, endpoint, file='routes/users.js', **fields):
+    return dict(method=method, endpoint=endpoint, files=file, **fields)
+
+
+def test_write_batch_is_idempotent():
+    async def main():
+        store = make_store()
+        specs = [spec('get', '/users'), spec('post', '/users')]
+        await store.write_batch(REPO, COMMIT, specs)
+        first = {document['_id'] for document in await store.find_page(REPO, COMMIT, 10)}
+        await store.write_batch(REPO, COMMIT, specs)
+        await store.write_batch(REPO, COMMIT, [spec('get', '/users', description='changed')])
+        # the same endpoint declared by another route file is a spec of its own
+        await store.write_batch(REPO, COMMIT, [spec('get', '/users', 'routes/admin.js')])
+        return first, await store.find_page(REPO, COMMIT, 10)
+
+    first, documents = asyncio.run(main())
+    assert len(first) == 2
+    assert len(documents) == 3
+    assert first < {document['_id'] for document in documents}
+    assert [document.get('description') for document in documents
+            if document['method'] == 'get' and document['files'] == 'routes/users.js'
+            ] == ['changed']
+
+
+def test_find_page_paginates_in_endpoint_order():
+    async def main():
+        store = make_store()
+        endpoints = [f'/items/{index:02d}' for index in range(7)]
+        await store.write_batch(REPO, COMMIT, [spec('get', endpoint) for endpoint in endpoints])
+        await store.write_batch(REPO, 'b' * 40, [spec('get', '/other')])
+        pages, after = [], None
+        while True:
+            page = await store.find_page(REPO, COMMIT, limit=3, after=after)
+            if not page:
+                break
+            pages.append([document['endpoint'] for document in page])
+            after = (page[-1]['endpoint'], page[-1]['_id'])
+        filtered = await store.find_page(REPO, COMMIT, limit=10, method='GET',
+                                         path_prefix='/items/0')
+        return endpoints, pages, filtered
+
+    endpoints, pages, filtered = asyncio.run(main())
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == endpoints
+    assert [document['endpoint'] for document in filtered] == endpoints
+
+
+def test_writer_stores_paths_relative_to_the_checkout():
+    async def main():
+        store = make_store()
+        writer = store.writer(REPO, COMMIT, repo_path='/tmp/checkout')
+        for index in range(5):
+            await writer.add(spec(
+                'get', f'/users/{index}', '/tmp/checkout/routes/users.js',
+                controller_location={'file': '/tmp/checkout/controllers/users.js',
+                                     'line': index}))
+        await writer.close()
+        return writer, await store.find_page(REPO, COMMIT, limit=10)
+
+    writer, documents = asyncio.run(main())
+    assert (writer.written, writer.failed) == (5, 0)
+    assert {document['files'] for document in documents} == {'routes/users.js'}
+    assert {document['controller_location']['file'] for document in documents} == {
+        'controllers/users.js'}
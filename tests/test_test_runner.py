@@ -0,0 +1,100 @@
+import asyncio
+import json
+import httpx
+import pytest
+from config import settings
+from app.database.memory import InMemoryClient
+from app.services.spec_store import SpecStore
+from app.services import test_runner
+from app.services.test_runner import PlannedRequest, check_base_url, plan_requests
+
+
+@pytest.fixture
+def allowed_hosts(monkeypatch):
+    monkeypatch.setattr(settings, 'TEST_RUNNER_ALLOWED_HOSTS', ['api.internal'])
+
+
+def recording_transport(seen):
+    def handle(request):
+        seen.append(request.url)
+        return httpx.Response(200, json={})
+    return httpx.MockTransport(handle)
+
+
+def planned(endpoint, **request):
+    return PlannedRequest({'method': 'get', 'endpoint': endpoint},
+                          {'request': request, 'expected_status': 200})
+
+
+def test_no_allowed_hosts_disables_test_runs(monkeypatch):
+    monkeypatch.setattr(settings, 'TEST_RUNNER_ALLOWED_HOSTS', [])
+    with pytest.raises(PermissionError, match='disabled'):
+        check_base_url('http://api.internal')
+
+
+def test_allowed_hosts(allowed_hosts):
+    check_base_url('http://api.internal:8080/v1')
+    check_base_url('https://API.internal')
+    for url in ('http://169.254.169.254/', 'http://api.internal.evil.com/',
+                'http://evil.com#@api.internal/'):
+        with pytest.raises(PermissionError):
+            check_base_url(url)
+
+
+@pytest.mark.parametrize('url', ['ftp://api.internal/', 'file:///etc/passwd', 'api.internal'])
+def test_base_url_must_be_http(allowed_hosts, url):
+    with pytest.raises(ValueError):
+        check_base_url(url)
+
+
+@pytest.mark.parametrize('endpoint', [
+    'http://169.254.169.254/latest/meta-data',
+    'HTTPS://evil.com/',
+    '//evil.com/path',
+    '\\\\evil.com/path',
+    ' //evil.com/path',
+    'javascript:alert(1)',
+])
+def test_absolute_endpoints_are_not_paths(endpoint):
+    spec = {'method': 'get', 'endpoint': endpoint,
+            'test_cases': json.dumps([{'name': 'case', 'expected_status': 200}])}
+    with pytest.raises(ValueError):
+        plan_requests(spec)
+
+
+def test_requests_stay_on_the_base_host():
+    seen = []
+    requests = [
+        planned('/users/:id', params={'id': '../../admin'}),
+        planned('/users/:id', params={'id': '@evil.com'}),
+        planned('users'),
+        planned('/@evil.com/x'),
+        planned('/a', query={'next': 'http://evil.com'}),
+    ]
+    runner = test_runner.TestRunner('http://api.internal:8080/v1/',
+                                    transport=recording_transport(seen))
+    results = asyncio.run(runner.run(requests))
+
+    assert all(result['error'] is None for result in results)
+    assert {(url.host, url.port) for url in seen} == {('api.internal', 8080)}
+    assert [url.raw_path.decode().split('?')[0] for url in seen] == [
+        '/v1/users/..%2F..%2Fadmin',
+        '/v1/users/%40evil.com',
+        '/v1/users',
+        '/v1/@evil.com/x',
+        '/v1/a',
+    ]
+
+
+def test_submit_checks_the_target_before_starting_a_run(allowed_hosts):
+    async def main():
+        collection = InMemoryClient()['orbit_api']['report']
+        store = SpecStore(InMemoryClient()['orbit_api']['api_specs'],
+                          batch_size=10, max_pending_batches=1)
+        manager = test_runner.TestRunManager(collection, spec_store=store)
+        with pytest.raises(PermissionError):
+            await manager.submit('https://github.com/org/repo.git',
+                                 'http://169.254.169.254/', commit='a' * 40)
+        return await collection.count_documents({})
+
+    assert asyncio.run(main()) == 0